@@ -53,6 +53,8 @@ MIDDLEWARE = [
     'django.middleware.csrf.CsrfViewMiddleware',
 
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Tokens JWT revocados (filtro de Bloom local delante de Redis)
+    'src.views.jwt_auth.TokenBlacklistMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
 
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -151,7 +153,8 @@ CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:5173,
 # ----------------------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Usuario desde los claims del token; sin claims, perfil con select_related (src/authentication.py)
+        'src.authentication.JWTAuthenticationClaims',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -183,6 +186,8 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": True,
     "ALGORITHM": "HS256",
     "SIGNING_KEY": os.getenv('SECRET_KEY'),
+    # rol, is_superuser y versión de permisos como claims (src/tokens.py)
+    "TOKEN_OBTAIN_SERIALIZER": "src.tokens.TokenObtainPairConClaimsSerializer",
 }
 
 # ----------------------------------------------------
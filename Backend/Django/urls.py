@@ -47,20 +47,36 @@ from src.views.calificaciones_mongo import (
     CalificacionCargaMasivaCSVView,
 )
 from src.views.calificaciones_update import CalificacionCorredorUpdateView
-from src.views.auditoria import AuditoriaView, AuditoriaEstadisticasView
+from src.views.auditoria import AuditoriaView, AuditoriaEstadisticasView, ExportarAuditoriaView
 from src.views.reportes import ReporteAuditoriaView, ReporteCalificacionesView, ComparativaAuditoriaView
-from src.views.exportar import ExportarPDFView, ExportarExcelView, ExportarCSVView
-from src.views.reglas_negocio import ReglasNegocioView, ReglaNegocioDetailView
+from src.views.exportar import (
+    ExportarPDFView,
+    ExportarExcelView,
+    ExportarCSVView,
+    ExportarParquetView,
+    ExportarArrowView,
+    TareasExportacionView,
+    TareaExportacionDetailView,
+    DescargarExportacionView,
+)
+from src.views.reglas_negocio import (
+    ReglasNegocioView,
+    ReglaNegocioDetailView,
+    SimulacionReglaDetailView,
+    SimularReglaView,
+)
 from src.views.historial_reglas import HistorialReglaView, RollbackReglaView, CompararVersionesView
 from src.views.usuarios import UsuariosView, UsuarioDetailView
 
 # ADMIN GLOBAL (Superusuario)
 from src.views.admin_global import (
     EstadoSistemaView,
+    PerfilReglasView,
     ResetPasswordView,
     BloquearDesbloquearUsuarioView,
     AuditoriaGlobalView,
     PurgaDatosView,
+    VerificarAuditoriaView,
 )
 
 # VALIDACIÓN
@@ -146,6 +162,7 @@ urlpatterns = [
     # AUDITORÍA
     path("api/auditoria/", AuditoriaView.as_view()),
     path("api/auditoria/estadisticas/", AuditoriaEstadisticasView.as_view()),
+    path("api/auditoria/exportar/", ExportarAuditoriaView.as_view()),
 
     # REPORTES
     path("api/reportes/auditoria/", ReporteAuditoriaView.as_view()),
@@ -156,10 +173,18 @@ urlpatterns = [
     path("api/exportar/pdf/", ExportarPDFView.as_view()),
     path("api/exportar/excel/", ExportarExcelView.as_view()),
     path("api/exportar/csv/", ExportarCSVView.as_view()),
+    path("api/exportar/parquet/", ExportarParquetView.as_view()),
+    path("api/exportar/arrow/", ExportarArrowView.as_view()),
+    path("api/exportar/tareas/", TareasExportacionView.as_view()),
+    path("api/exportar/tareas/<int:pk>/", TareaExportacionDetailView.as_view()),
+    path("api/exportar/tareas/<int:pk>/descargar/", DescargarExportacionView.as_view()),
 
     # REGLAS
     path("api/reglas-negocio/", ReglasNegocioView.as_view()),
+    path("api/reglas-negocio/simular/", SimularReglaView.as_view()),
+    path("api/reglas-negocio/simulaciones/<int:pk>/", SimulacionReglaDetailView.as_view()),
     path("api/reglas-negocio/<int:pk>/", ReglaNegocioDetailView.as_view()),
+    path("api/reglas-negocio/<int:pk>/simular/", SimularReglaView.as_view()),
     path("api/reglas-negocio/<int:pk>/historial/", HistorialReglaView.as_view()),
     path("api/reglas-negocio/<int:pk>/rollback/", RollbackReglaView.as_view()),
     path("api/reglas-negocio/<int:pk>/comparar/", CompararVersionesView.as_view()),
@@ -170,10 +195,12 @@ urlpatterns = [
 
     # ADMIN GLOBAL (Solo Superusuarios)
     path("api/admin-global/estado/", EstadoSistemaView.as_view()),
+    path("api/admin-global/reglas-perfil/", PerfilReglasView.as_view()),
     path("api/admin-global/reset-password/", ResetPasswordView.as_view()),
     path("api/admin-global/bloquear-usuario/", BloquearDesbloquearUsuarioView.as_view()),
     path("api/admin-global/auditoria/", AuditoriaGlobalView.as_view()),
     path("api/admin-global/purgar-datos/", PurgaDatosView.as_view()),
+    path("api/admin-global/verificar-auditoria/", VerificarAuditoriaView.as_view()),
 
     # VIEWSETS
     path("api/", include(router.urls)),
@@ -0,0 +1,86 @@
+"""
+Autenticación JWT del API.
+
+Igual a JWTAuthentication de simplejwt, pero el usuario se carga junto
+con su PerfilUsuario (select_related) en la misma consulta: el rol y el
+resto del perfil quedan disponibles para permisos y vistas sin consultas
+adicionales.
+
+JWTAuthenticationClaims no consulta la base de datos cuando el token trae
+los claims de autorización (src/tokens.py): el usuario se arma desde el
+payload y solo se verifica que la versión de permisos siga vigente.
+"""
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from src.tokens import version_permisos
+
+
+class JWTAuthenticationPerfil(JWTAuthentication):
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = (
+                self.user_model.objects
+                .select_related('perfil')
+                .get(**{api_settings.USER_ID_FIELD: user_id})
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+class JWTAuthenticationClaims(JWTAuthenticationPerfil):
+    """
+    Usuario liviano (id, username, is_superuser, is_active) desde los claims
+    del token, con el rol ya resuelto. Cambiar username o is_superuser sube
+    pv (src/signals.py), así que un token vigente nunca lleva valores
+    distintos a los guardados. Tokens sin claims (emitidos antes) o con
+    CHECK_REVOKE_TOKEN activo siguen el camino con consulta.
+    """
+
+    def get_user(self, validated_token):
+        if 'pv' not in validated_token or api_settings.CHECK_REVOKE_TOKEN:
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        # Sin perfil (usuario eliminado) o versión distinta: el token quedó obsoleto
+        if version_permisos(user_id) != validated_token['pv']:
+            raise AuthenticationFailed(
+                "Los permisos del usuario cambiaron. Renueva el token o inicia sesión nuevamente",
+                code="token_desactualizado",
+            )
+
+        valores = {
+            # El claim puede venir como texto; el usuario lleva el tipo del campo
+            api_settings.USER_ID_FIELD: self.user_model._meta.get_field(api_settings.USER_ID_FIELD).to_python(user_id),
+            'username': validated_token.get('username', ''),
+            'is_superuser': bool(validated_token.get('is_superuser')),
+            'is_active': True,
+        }
+        # from_db espera los valores en el orden de los campos del modelo
+        campos = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in valores]
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, campos, [valores[c] for c in campos])
+        user._rol_resuelto = validated_token.get('rol')
+        return user
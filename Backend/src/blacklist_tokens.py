@@ -0,0 +1,281 @@
+"""
+Blacklist de tokens JWT en Redis, por jti y agrupada por vencimiento.
+
+Un token revocado se guarda como su jti (32 caracteres) dentro de un set
+por tramo de vencimiento, "blacklist:jti:<tramo>", que vence solo al final
+del tramo. Como el tramo se calcula desde el claim exp del token, verificar
+un token es un SISMEMBER sobre un único set. Guardar el JWT completo como
+clave costaba cientos de bytes por entrada más una clave con TTL cada una;
+un miembro de set cuesta una fracción de eso.
+
+Delante de los sets hay un filtro de Bloom por hora de vencimiento,
+"blacklist:bloom:<hora>" (bitmap con SETBIT). Cada proceso guarda una
+copia local de los bitmaps y la vuelve a leer de Redis cada
+BLOOM_REFRESCO segundos: el caso común (token no revocado) se responde sin
+ir a Redis. Los tokens revocados en el mismo proceso entran a la copia
+local de inmediato; los de otros procesos pueden tardar hasta
+BLOOM_REFRESCO segundos en verse. Por eso el filtro solo se usa para los
+access tokens (TokenBlacklistMiddleware): la rotación de refresh tokens
+usa el resultado del SADD de revocar(), que es atómico y autoritativo.
+
+El conteo de revocados se mantiene aparte, fuera del prefijo "blacklist:":
+
+- tokens_revocados:total: revocados vigentes.
+- tokens_revocados:vencimientos: hash tramo -> cantidad de tokens que
+  vencen en ese tramo de TRAMO_SEGUNDOS.
+- tokens_revocados:pendientes: los mismos tramos en un sorted set por
+  vencimiento, para encontrar los vencidos sin recorrer el hash.
+
+Al revocar se incrementa el total y el tramo donde vence el token; al leer
+las estadísticas se descuentan los tramos ya vencidos (cada tramo una sola
+vez, con WATCH/MULTI). Leer el conteo cuesta unas pocas operaciones, sin
+importar cuántos tokens haya revocados.
+
+Si el contador se desvía (p. ej. un proceso caído entre el SADD y el
+incremento), reconciliar() lo reconstruye recorriendo los sets con SCAN
+por lotes, sin bloquear Redis: comando reconciliar_tokens_revocados.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = "blacklist:"
+PREFIJO_JTI = "blacklist:jti:"
+PREFIJO_BLOOM = "blacklist:bloom:"
+# Formato anterior: "blacklist:<refresh JWT>" (vence con REFRESH_TOKEN_LIFETIME)
+PATRON_FORMATO_ANTERIOR = "blacklist:eyJ*"
+CLAVE_TOTAL = "tokens_revocados:total"
+CLAVE_VENCIMIENTOS = "tokens_revocados:vencimientos"
+CLAVE_PENDIENTES = "tokens_revocados:pendientes"
+CLAVE_RECONCILIACION = "tokens_revocados:reconciliado"
+
+# Un token se cuenta hasta el final del tramo en que vence
+TRAMO_SEGUNDOS = 60
+LOTE_SCAN = 1000
+
+# Filtro de Bloom: 2^18 bits (32 KB) por hora con 7 hashes da ~1% de
+# falsos positivos con 27.000 tokens revocados que vencen en esa hora
+BLOOM_TRAMO_SEGUNDOS = 3600
+BLOOM_BITS = 2 ** 18
+BLOOM_HASHES = 7
+BLOOM_REFRESCO = 5      # segundos
+
+try:
+    import redis
+    r = redis.Redis(host='localhost', port=6379, db=1, decode_responses=True)
+    r.ping()
+    # Los bitmaps se leen como bytes
+    _r_binario = redis.Redis(host='localhost', port=6379, db=1)
+    REDIS_AVAILABLE = True
+except Exception:
+    r = None
+    _r_binario = None
+    REDIS_AVAILABLE = False
+
+_blooms = {}            # hora -> (bytearray, leido_en)
+_lock = threading.Lock()
+
+
+def _tramo(vence_en, segundos=TRAMO_SEGUNDOS):
+    """Tramo (en segundos epoch, al final del tramo) en que vence un token"""
+    return int(math.ceil(vence_en / segundos) * segundos)
+
+
+def _posiciones_bloom(jti):
+    """BLOOM_HASHES posiciones del jti (doble hashing sobre un blake2b)"""
+    digest = hashlib.blake2b(jti.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:], 'big') | 1
+    return [(h1 + i * h2) % BLOOM_BITS for i in range(BLOOM_HASHES)]
+
+
+def _bit_activo(bitmap, posicion):
+    # Mismo orden que SETBIT/GETBIT de Redis: el bit 0 es el más significativo
+    byte = posicion >> 3
+    return byte < len(bitmap) and bool(bitmap[byte] & (0x80 >> (posicion & 7)))
+
+
+def _bloom_local(hora):
+    """Bitmap de la hora desde la copia local, releído de Redis si está viejo"""
+    ahora = time.monotonic()
+    with _lock:
+        entrada = _blooms.get(hora)
+    if entrada is not None and ahora - entrada[1] < BLOOM_REFRESCO:
+        return entrada[0]
+
+    bitmap = bytearray(_r_binario.get(f"{PREFIJO_BLOOM}{hora}") or b'')
+    with _lock:
+        _blooms[hora] = (bitmap, ahora)
+        # Las horas ya vencidas no vuelven a consultarse
+        for vieja in [h for h in _blooms if h < time.time()]:
+            del _blooms[vieja]
+    return bitmap
+
+
+def _marcar_bloom_local(hora, posiciones):
+    with _lock:
+        entrada = _blooms.get(hora)
+        if entrada is None:
+            return
+        bitmap = entrada[0]
+        for posicion in posiciones:
+            byte = posicion >> 3
+            if byte >= len(bitmap):
+                bitmap.extend(bytes(byte + 1 - len(bitmap)))
+            bitmap[byte] |= 0x80 >> (posicion & 7)
+
+
+def esta_revocado(jti, exp):
+    """
+    El token (jti y claim exp) está en la blacklist. Si el filtro de Bloom
+    local descarta el jti, no se consulta Redis.
+    """
+    if not REDIS_AVAILABLE or not isinstance(jti, str) or not isinstance(exp, (int, float)):
+        return False
+    try:
+        bitmap = _bloom_local(_tramo(exp, BLOOM_TRAMO_SEGUNDOS))
+        if not all(_bit_activo(bitmap, p) for p in _posiciones_bloom(jti)):
+            return False
+        return bool(r.sismember(f"{PREFIJO_JTI}{_tramo(exp)}", jti))
+    except redis.RedisError:
+        logger.warning("Redis no disponible para verificar la blacklist de tokens")
+        return False
+
+
+def revocado_formato_anterior(token):
+    """Refresh token revocado antes del cambio a jti (clave con el JWT completo)"""
+    return REDIS_AVAILABLE and r.exists(f"{PREFIJO}{token}") > 0
+
+
+def revocar(jti, exp):
+    """Agrega el token (jti y claim exp) a la blacklist. Retorna False si ya estaba"""
+    if not REDIS_AVAILABLE or exp <= time.time():
+        return False
+
+    tramo = _tramo(exp)
+    hora = _tramo(exp, BLOOM_TRAMO_SEGUNDOS)
+    posiciones = _posiciones_bloom(jti)
+
+    pipe = r.pipeline()
+    pipe.sadd(f"{PREFIJO_JTI}{tramo}", jti)
+    pipe.expireat(f"{PREFIJO_JTI}{tramo}", tramo)
+    for posicion in posiciones:
+        pipe.setbit(f"{PREFIJO_BLOOM}{hora}", posicion, 1)
+    pipe.expireat(f"{PREFIJO_BLOOM}{hora}", hora)
+    agregado = pipe.execute()[0]
+    _marcar_bloom_local(hora, posiciones)
+    if not agregado:
+        return False
+
+    pipe = r.pipeline()
+    pipe.incr(CLAVE_TOTAL)
+    pipe.hincrby(CLAVE_VENCIMIENTOS, tramo, 1)
+    pipe.zadd(CLAVE_PENDIENTES, {tramo: tramo})
+    pipe.execute()
+    return True
+
+
+def _descontar_vencidos(ahora=None):
+    """Resta del total los tramos ya vencidos. Retorna cuántos tokens se descontaron"""
+    ahora = time.time() if ahora is None else ahora
+    descontados = 0
+
+    def _transaccion(pipe):
+        nonlocal descontados
+        tramos = pipe.zrangebyscore(CLAVE_PENDIENTES, '-inf', ahora)
+        if not tramos:
+            descontados = 0
+            return
+        cantidades = pipe.hmget(CLAVE_VENCIMIENTOS, tramos)
+        descontados = sum(int(c) for c in cantidades if c)
+        pipe.multi()
+        pipe.hdel(CLAVE_VENCIMIENTOS, *tramos)
+        pipe.zrem(CLAVE_PENDIENTES, *tramos)
+        if descontados:
+            pipe.decrby(CLAVE_TOTAL, descontados)
+
+    r.transaction(_transaccion, CLAVE_PENDIENTES, CLAVE_VENCIMIENTOS)
+    return descontados
+
+
+def estadisticas():
+    """Cantidad de tokens revocados vigentes y datos de la última reconciliación"""
+    _descontar_vencidos()
+    total, reconciliado = r.mget(CLAVE_TOTAL, CLAVE_RECONCILIACION)
+    return {
+        "tokens_blacklist_count": max(int(total or 0), 0),
+        "ultima_reconciliacion": reconciliado,
+    }
+
+
+def reconciliar(lote=LOTE_SCAN):
+    """
+    Reconstruye el contador y los tramos recorriendo los sets
+    "blacklist:jti:*" (y las claves del formato anterior) con SCAN.
+    Los tokens revocados mientras corre pueden quedar fuera del conteo
+    hasta la siguiente reconciliación. Retorna la cantidad contada.
+    """
+    ahora = time.time()
+    vencimientos = {}
+    total = (
+        _recorrer(f"{PREFIJO_JTI}*", lote, _contar_sets, ahora, vencimientos)
+        + _recorrer(PATRON_FORMATO_ANTERIOR, lote, _contar_claves, ahora, vencimientos)
+    )
+
+    pipe = r.pipeline()         # MULTI/EXEC: se reemplaza todo de una vez
+    pipe.delete(CLAVE_TOTAL, CLAVE_VENCIMIENTOS, CLAVE_PENDIENTES)
+    pipe.set(CLAVE_TOTAL, total)
+    if vencimientos:
+        pipe.hset(CLAVE_VENCIMIENTOS, mapping=vencimientos)
+        pipe.zadd(CLAVE_PENDIENTES, {tramo: tramo for tramo in vencimientos})
+    pipe.set(CLAVE_RECONCILIACION, timezone.now().isoformat())
+    pipe.execute()
+    logger.info("Blacklist de tokens reconciliada: %s tokens revocados", total)
+    return total
+
+
+def _recorrer(patron, lote, contar, ahora, vencimientos):
+    total = 0
+    claves = []
+    for clave in r.scan_iter(match=patron, count=lote):
+        claves.append(clave)
+        if len(claves) >= lote:
+            total += contar(claves, ahora, vencimientos)
+            claves = []
+    if claves:
+        total += contar(claves, ahora, vencimientos)
+    return total
+
+
+def _contar_sets(claves, ahora, vencimientos):
+    pipe = r.pipeline(transaction=False)
+    for clave in claves:
+        pipe.scard(clave)
+    contados = 0
+    for clave, cantidad in zip(claves, pipe.execute()):
+        tramo = int(clave[len(PREFIJO_JTI):])
+        if cantidad and tramo > ahora:
+            contados += cantidad
+            vencimientos[tramo] = vencimientos.get(tramo, 0) + cantidad
+    return contados
+
+
+def _contar_claves(claves, ahora, vencimientos):
+    pipe = r.pipeline(transaction=False)
+    for clave in claves:
+        pipe.pttl(clave)
+    contados = 0
+    for pttl in pipe.execute():
+        if pttl == -2:          # venció entre el SCAN y el PTTL
+            continue
+        contados += 1
+        if pttl >= 0:           # -1: sin TTL, cuenta pero no vence
+            tramo = _tramo(ahora + pttl / 1000)
+            vencimientos[tramo] = vencimientos.get(tramo, 0) + 1
+    return contados
@@ -0,0 +1,108 @@
+"""
+Caché por proceso de las reglas de negocio, invalidada por versión global.
+
+Cada cambio en reglas (crear, editar, eliminar, rollback) incrementa un
+contador global: en Postgres (VersionReglas, dentro de la misma transacción)
+y en Redis (INCR tras el commit). Cada proceso guarda junto a su caché la
+versión con la que la cargó; consultar la versión cuesta un GET en Redis
+(o una lectura por PK en Postgres si Redis no está disponible) y las reglas
+solo se recargan cuando cambió.
+
+Como red de seguridad (p. ej. un INCR perdido con Redis caído), la caché
+se revalida igual cada REVALIDAR_SEGUNDOS.
+"""
+import logging
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import F
+
+from src.models import VersionReglas
+
+logger = logging.getLogger(__name__)
+
+CLAVE_REDIS = "reglas_negocio:version"
+REVALIDAR_SEGUNDOS = 300
+
+try:
+    import redis
+    _redis = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True, socket_timeout=0.5)
+    _redis.ping()
+    REDIS_AVAILABLE = True
+except Exception:
+    _redis = None
+    REDIS_AVAILABLE = False
+
+
+def _version_postgres():
+    return VersionReglas.objects.filter(pk=1).values_list('contador', flat=True).first() or 0
+
+
+def version_reglas():
+    """Versión global actual de las reglas: ('redis', n) o ('postgres', n)"""
+    if _redis is not None:
+        try:
+            valor = _redis.get(CLAVE_REDIS)
+            if valor is not None:
+                return ('redis', int(valor))
+            # Clave ausente (reinicio de Redis): se siembra desde Postgres
+            valor = _version_postgres()
+            _redis.set(CLAVE_REDIS, valor, nx=True)
+            return ('postgres', valor)
+        except redis.RedisError:
+            logger.warning("Redis no disponible para la versión de reglas; se usa Postgres")
+    return ('postgres', _version_postgres())
+
+
+def _incrementar_redis():
+    try:
+        _redis.incr(CLAVE_REDIS)
+    except redis.RedisError:
+        logger.warning("No se pudo incrementar la versión de reglas en Redis")
+
+
+def incrementar_version_reglas():
+    """
+    Marca que las reglas cambiaron. Llamar en la misma transacción que el
+    cambio: el contador de Postgres se confirma con él y Redis se actualiza
+    después del commit.
+    """
+    if not VersionReglas.objects.filter(pk=1).update(contador=F('contador') + 1):
+        VersionReglas.objects.get_or_create(pk=1, defaults={'contador': 1})
+    if _redis is not None:
+        transaction.on_commit(_incrementar_redis)
+
+
+class CacheReglas:
+    """
+    Valor por proceso (p. ej. la red de reglas activas) que se recarga con
+    `cargar()` solo cuando cambia la versión global de las reglas.
+    """
+
+    def __init__(self, cargar):
+        self._cargar = cargar
+        self._lock = threading.Lock()
+        self._version = None
+        self._cargado_en = 0.0
+        self._valor = None
+
+    def obtener(self):
+        # La versión se lee antes de cargar: un cambio concurrente fuerza otra recarga
+        version = version_reglas()
+        if version == self._version and time.monotonic() - self._cargado_en < REVALIDAR_SEGUNDOS:
+            return self._valor
+        with self._lock:
+            if version != self._version or time.monotonic() - self._cargado_en >= REVALIDAR_SEGUNDOS:
+                self._valor = self._cargar()
+                self._version = version
+                self._cargado_en = time.monotonic()
+            return self._valor
+
+    def invalidar(self):
+        with self._lock:
+            self._version = None
+
+    @property
+    def version(self):
+        return self._version
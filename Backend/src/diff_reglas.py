@@ -0,0 +1,216 @@
+"""
+Diff de textos de reglas (condicion, accion, descripcion) para comparar versiones.
+
+- Diff por líneas con el algoritmo de Myers (O((N+M)·D), D = tamaño del
+  cambio), agrupado en hunks con contexto, como un diff unificado.
+- Las líneas reemplazadas se emparejan y se vuelven a comparar por
+  palabras para resaltar exactamente qué cambió dentro de la línea
+  (las condiciones suelen ser de una sola línea).
+
+Formato de un hunk:
+    {"inicio_1": 4, "lineas_1": 2, "inicio_2": 4, "lineas_2": 3,
+     "lineas": [{"tipo": "=", "texto": "..."},
+                {"tipo": "-", "texto": "...", "segmentos": [["=", "monto > "], ["-", "1000"]]},
+                {"tipo": "+", "texto": "...", "segmentos": [["=", "monto > "], ["+", "5000"]]}]}
+"""
+import re
+
+CONTEXTO = 3
+_TOKEN = re.compile(r"\w+|\s+|[^\w\s]")
+
+
+# ===============================
+# MYERS
+# ===============================
+def myers(a, b):
+    """
+    Script de edición mínimo entre las secuencias a y b.
+    Retorna una lista de ('=', i, j), ('-', i, None) y ('+', None, j).
+    """
+    # Prefijo y sufijo comunes no participan en la búsqueda
+    inicio = 0
+    while inicio < len(a) and inicio < len(b) and a[inicio] == b[inicio]:
+        inicio += 1
+    fin_a, fin_b = len(a), len(b)
+    while fin_a > inicio and fin_b > inicio and a[fin_a - 1] == b[fin_b - 1]:
+        fin_a -= 1
+        fin_b -= 1
+
+    medio = _myers(a[inicio:fin_a], b[inicio:fin_b])
+    ops = [('=', i, i) for i in range(inicio)]
+    for op, i, j in medio:
+        ops.append((op, None if i is None else i + inicio, None if j is None else j + inicio))
+    ops.extend(('=', fin_a + k, fin_b + k) for k in range(len(a) - fin_a))
+    return ops
+
+
+def _myers(a, b):
+    n, m = len(a), len(b)
+    if not n:
+        return [('+', None, j) for j in range(m)]
+    if not m:
+        return [('-', i, None) for i in range(n)]
+
+    maximo = n + m
+    v = {1: 0}
+    historia = []
+    for d in range(maximo + 1):
+        historia.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]          # inserción (baja)
+            else:
+                x = v[k - 1] + 1      # eliminación (derecha)
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _retroceder(historia, n, m)
+    raise AssertionError("Myers no terminó")  # inalcanzable
+
+
+def _retroceder(historia, n, m):
+    ops = []
+    x, y = n, m
+    for d in range(len(historia) - 1, -1, -1):
+        v = historia[d]
+        k = x - y
+        if k == -d or (k != d and v.get(k - 1, -1) < v.get(k + 1, -1)):
+            k_previo = k + 1
+        else:
+            k_previo = k - 1
+        x_previo = v.get(k_previo, 0)
+        y_previo = x_previo - k_previo
+
+        while x > x_previo and y > y_previo:
+            x -= 1
+            y -= 1
+            ops.append(('=', x, y))
+        if d > 0:
+            if x == x_previo:
+                y -= 1
+                ops.append(('+', None, y))
+            else:
+                x -= 1
+                ops.append(('-', x, None))
+    ops.reverse()
+    return ops
+
+
+# ===============================
+# DIFF POR PALABRAS
+# ===============================
+def diff_palabras(linea_1, linea_2):
+    """Segmentos (["=", texto] / ["-", texto] / ["+", texto]) de dos líneas"""
+    a, b = _TOKEN.findall(linea_1), _TOKEN.findall(linea_2)
+    segmentos = []
+    for op, i, j in myers(a, b):
+        texto = a[i] if op != '+' else b[j]
+        if segmentos and segmentos[-1][0] == op:
+            segmentos[-1][1] += texto
+        else:
+            segmentos.append([op, texto])
+    return segmentos
+
+
+def _solo(segmentos, excluido):
+    """Segmentos vistos desde un lado (sin las partes del otro)"""
+    return [segmento for segmento in segmentos if segmento[0] != excluido]
+
+
+# ===============================
+# DIFF POR LÍNEAS
+# ===============================
+def _opcodes(ops):
+    """Script de Myers -> [(tipo, i1, i2, j1, j2)] con tipo '=' o '~' (cambio)"""
+    opcodes = []
+    i = j = 0
+    for op, _, _ in ops:
+        tipo = '=' if op == '=' else '~'
+        if not opcodes or opcodes[-1][0] != tipo:
+            opcodes.append([tipo, i, i, j, j])
+        if op != '+':
+            i += 1
+        if op != '-':
+            j += 1
+        opcodes[-1][2], opcodes[-1][4] = i, j
+    return opcodes
+
+
+def _grupos(opcodes, contexto):
+    """Agrupa los cambios en hunks, con a lo sumo `contexto` líneas iguales alrededor"""
+    if not any(op[0] == '~' for op in opcodes):
+        return []
+    codigos = [list(op) for op in opcodes]
+    if codigos[0][0] == '=':
+        _, i1, i2, j1, j2 = codigos[0]
+        codigos[0] = ['=', max(i1, i2 - contexto), i2, max(j1, j2 - contexto), j2]
+    if codigos[-1][0] == '=':
+        _, i1, i2, j1, j2 = codigos[-1]
+        codigos[-1] = ['=', i1, min(i2, i1 + contexto), j1, min(j2, j1 + contexto)]
+
+    grupos = []
+    grupo = []
+    for tipo, i1, i2, j1, j2 in codigos:
+        # Un tramo igual largo cierra el hunk actual y abre el siguiente
+        if tipo == '=' and i2 - i1 > 2 * contexto:
+            grupo.append(('=', i1, i1 + contexto, j1, j1 + contexto))
+            grupos.append(grupo)
+            grupo = [('=', i2 - contexto, i2, j2 - contexto, j2)]
+            continue
+        grupo.append((tipo, i1, i2, j1, j2))
+    if any(op[0] == '~' for op in grupo):
+        grupos.append(grupo)
+    return grupos
+
+
+def _lineas_cambio(eliminadas, agregadas):
+    """Líneas de un bloque de cambio: eliminadas y luego agregadas, pareadas por palabras"""
+    lineas = [{"tipo": "-", "texto": texto} for texto in eliminadas]
+    lineas += [{"tipo": "+", "texto": texto} for texto in agregadas]
+
+    for k in range(min(len(eliminadas), len(agregadas))):
+        segmentos = diff_palabras(eliminadas[k], agregadas[k])
+        if any(op == '=' and texto.strip() for op, texto in segmentos):  # solo si comparten algo
+            lineas[k]["segmentos"] = _solo(segmentos, '+')
+            lineas[len(eliminadas) + k]["segmentos"] = _solo(segmentos, '-')
+    return lineas
+
+
+def diff_texto(texto_1, texto_2, contexto=CONTEXTO):
+    """
+    Diff de dos textos: {"cambio", "agregadas", "eliminadas", "hunks"}.
+    Sin cambios, hunks es una lista vacía.
+    """
+    a = (texto_1 or "").splitlines()
+    b = (texto_2 or "").splitlines()
+    opcodes = _opcodes(myers(a, b))
+
+    hunks = []
+    for grupo in _grupos(opcodes, contexto):
+        lineas = []
+        for tipo, i1, i2, j1, j2 in grupo:
+            if tipo == '=':
+                lineas.extend({"tipo": "=", "texto": texto} for texto in a[i1:i2])
+            else:
+                lineas.extend(_lineas_cambio(a[i1:i2], b[j1:j2]))
+        lineas_1 = grupo[-1][2] - grupo[0][1]
+        lineas_2 = grupo[-1][4] - grupo[0][3]
+        hunks.append({
+            # Convención de diff unificado: un rango vacío indica la línea previa
+            "inicio_1": grupo[0][1] + 1 if lineas_1 else grupo[0][1],
+            "lineas_1": lineas_1,
+            "inicio_2": grupo[0][3] + 1 if lineas_2 else grupo[0][3],
+            "lineas_2": lineas_2,
+            "lineas": lineas,
+        })
+
+    cambios = [op for op in opcodes if op[0] == '~']
+    return {
+        "cambio": bool(cambios),
+        "agregadas": sum(j2 - j1 for _, _, _, j1, j2 in cambios),
+        "eliminadas": sum(i2 - i1 for _, i1, i2, _, _ in cambios),
+        "hunks": hunks,
+    }
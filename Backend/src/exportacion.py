@@ -0,0 +1,311 @@
+"""
+Lectura compartida por los exportadores de calificaciones (PDF, Excel, CSV).
+
+Dos fuentes, con las mismas columnas (COLUMNAS):
+
+- mongo (por defecto): la colección `calificaciones` de CalificacionMongo,
+  con tipo de certificado, período y monto reales. Cursor proyectado
+  (solo las columnas exportadas), en orden de _id y con batch_size
+  BATCH_MONGO. El título del registro y el usuario creador se resuelven en
+  bloque por cada lote de documentos con in_bulk, a través de un mapa
+  id -> objeto que se reutiliza durante toda la exportación.
+- postgres (legado, `fuente=postgres`): el modelo Calificacion, con
+  select_related('registro', 'creado_por'), only() e iterator().
+
+Filtros (query params): estado, periodo, tipo_certificado (los mismos de
+las vistas de calificaciones), dias (creadas en los últimos N días) y
+fecha_desde / fecha_hasta (YYYY-MM-DD, ambas inclusive).
+"""
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from src.models import Calificacion, Registro
+from src.mongodb_utils import get_mongo_db
+
+CHUNK = 2000
+BATCH_MONGO = 2000
+FILAS_POR_LATIDO = 5000
+FUENTES = ('mongo', 'postgres')
+
+COLUMNAS = ['RUT', 'Registro', 'Tipo Certificado', 'Período', 'Monto', 'Estado', 'Auditoría', 'Creado por', 'Creado']
+
+PROYECCION_MONGO = {
+    'rut': 1, 'registro_id': 1, 'tipo_certificado': 1, 'periodo': 1, 'monto': 1,
+    'estado': 1, 'solicitar_auditoria': 1, 'creado_por_id': 1, 'usuario_id': 1, 'fecha_creacion': 1,
+}
+
+
+class ExportacionInvalida(ValueError):
+    pass
+
+
+# ===============================
+# PARÁMETROS
+# ===============================
+def _fecha(query_params, nombre):
+    valor = query_params.get(nombre)
+    if not valor:
+        return None
+    try:
+        fecha = parse_date(valor)
+    except ValueError:  # formato correcto pero fecha imposible (p. ej. mes 13)
+        fecha = None
+    if fecha is None:
+        raise ExportacionInvalida(f"{nombre} debe tener formato YYYY-MM-DD")
+    return fecha
+
+
+def parametros_exportacion(query_params):
+    """
+    Filtros de exportación desde los query params:
+    {fuente, estado, periodo, tipo_certificado, desde, hasta} con
+    desde/hasta como datetime con zona horaria (hasta exclusivo).
+    """
+    fuente = query_params.get('fuente') or 'mongo'
+    if fuente not in FUENTES:
+        raise ExportacionInvalida(f"fuente debe ser una de: {', '.join(FUENTES)}")
+
+    parametros = {
+        'fuente': fuente,
+        'estado': query_params.get('estado') or None,
+        'periodo': query_params.get('periodo') or None,
+        'tipo_certificado': query_params.get('tipo_certificado') or None,
+        'desde': None,
+        'hasta': None,
+    }
+    if fuente == 'postgres' and (parametros['periodo'] or parametros['tipo_certificado']):
+        raise ExportacionInvalida("periodo y tipo_certificado solo aplican a la fuente mongo")
+
+    zona = timezone.get_current_timezone()
+    desde = _fecha(query_params, 'fecha_desde')
+    hasta = _fecha(query_params, 'fecha_hasta')
+    if desde:
+        parametros['desde'] = datetime.combine(desde, time.min, tzinfo=zona)
+    if hasta:
+        parametros['hasta'] = datetime.combine(hasta + timedelta(days=1), time.min, tzinfo=zona)
+    if desde and hasta and desde > hasta:
+        raise ExportacionInvalida("fecha_desde no puede ser posterior a fecha_hasta")
+
+    dias = query_params.get('dias')
+    if dias not in (None, ''):
+        try:
+            dias = int(dias)
+        except ValueError:
+            raise ExportacionInvalida("dias debe ser un número entero")
+        if dias < 1:
+            raise ExportacionInvalida("dias debe ser mayor o igual a 1")
+        limite = timezone.now() - timedelta(days=dias)
+        parametros['desde'] = max(parametros['desde'], limite) if parametros['desde'] else limite
+    return parametros
+
+
+# ===============================
+# POSTGRES (legado)
+# ===============================
+def queryset_exportacion(estado=None, desde=None, hasta=None):
+    """Calificaciones (Postgres) a exportar, sin evaluar, en orden de id"""
+    calificaciones = (
+        Calificacion.objects
+        .select_related('registro', 'creado_por')
+        .only(
+            'id', 'estado', 'solicitar_auditoria', 'fecha_creacion',
+            'registro__id', 'registro__titulo', 'creado_por__id', 'creado_por__username',
+        )
+        .order_by('id')
+    )
+    if estado:
+        calificaciones = calificaciones.filter(estado=estado)
+    if desde:
+        calificaciones = calificaciones.filter(fecha_creacion__gte=desde)
+    if hasta:
+        calificaciones = calificaciones.filter(fecha_creacion__lt=hasta)
+    return calificaciones
+
+
+def _filas_postgres(calificaciones):
+    for cal in calificaciones.iterator(chunk_size=CHUNK):
+        yield (
+            getattr(cal.registro, 'rut', ''),     # Registro no tiene RUT
+            cal.registro.titulo,
+            'N/A',                                # Tipo certificado no está en modelo Calificacion
+            'N/A',
+            'N/A',
+            cal.estado,
+            cal.solicitar_auditoria,
+            cal.creado_por.username if cal.creado_por else '',
+            cal.fecha_creacion,
+        )
+
+
+# ===============================
+# MONGO
+# ===============================
+def filtro_mongo(estado=None, periodo=None, tipo_certificado=None, desde=None, hasta=None):
+    filtro = {}
+    if estado:
+        filtro['estado'] = estado
+    if periodo:
+        filtro['periodo'] = periodo
+    if tipo_certificado:
+        filtro['tipo_certificado'] = tipo_certificado
+    # Mongo guarda fechas UTC sin zona (datetime.utcnow())
+    fechas = {}
+    if desde:
+        fechas['$gte'] = desde.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    if hasta:
+        fechas['$lt'] = hasta.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    if fechas:
+        filtro['fecha_creacion'] = fechas
+    return filtro
+
+
+def _id_entero(valor):
+    try:
+        return int(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+class MapaIds:
+    """
+    Mapa id -> objeto de Postgres que se completa en bloque: cargar(ids)
+    trae con una sola consulta todos los ids que aún no están en el mapa.
+    """
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._objetos = {}
+
+    def cargar(self, ids):
+        faltantes = {i for i in ids if i is not None} - self._objetos.keys()
+        if faltantes:
+            encontrados = self.queryset.in_bulk(list(faltantes))
+            for i in faltantes:
+                self._objetos[i] = encontrados.get(i)
+
+    def get(self, i):
+        return self._objetos.get(i)
+
+
+def _lotes(cursor, tamano):
+    lote = []
+    for documento in cursor:
+        lote.append(documento)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def _filas_mongo(filtro, limite=None):
+    cursor = (
+        get_mongo_db()['calificaciones']
+        .find(filtro, PROYECCION_MONGO)
+        .sort('_id', 1)
+        .batch_size(BATCH_MONGO)
+    )
+    if limite is not None:
+        cursor = cursor.limit(limite)
+
+    registros = MapaIds(Registro.objects.only('id', 'titulo'))
+    usuarios = MapaIds(User.objects.only('id', 'username'))
+    for lote in _lotes(cursor, BATCH_MONGO):
+        registros.cargar(_id_entero(doc.get('registro_id')) for doc in lote)
+        usuarios.cargar(_id_entero(doc.get('creado_por_id') or doc.get('usuario_id')) for doc in lote)
+        for doc in lote:
+            registro = registros.get(_id_entero(doc.get('registro_id')))
+            usuario = usuarios.get(_id_entero(doc.get('creado_por_id') or doc.get('usuario_id')))
+            yield (
+                doc.get('rut') or '',
+                registro.titulo if registro else '',
+                doc.get('tipo_certificado') or '',
+                doc.get('periodo') or '',
+                doc.get('monto'),
+                doc.get('estado') or '',
+                bool(doc.get('solicitar_auditoria')),
+                usuario.username if usuario else '',
+                doc.get('fecha_creacion'),
+            )
+
+
+# ===============================
+# API
+# ===============================
+def _filtro_rango(inicio, fin):
+    rango = {}
+    if inicio is not None:
+        rango['$gte'] = inicio
+    if fin is not None:
+        rango['$lt'] = fin
+    return rango
+
+
+def _con_latido(filas, latido):
+    for numero, fila in enumerate(filas, 1):
+        if numero % FILAS_POR_LATIDO == 0:
+            latido()
+        yield fila
+
+
+def filas_exportacion(parametros, limite=None, rango=None, latido=None):
+    """
+    Una tupla por calificación, en el orden de COLUMNAS (monto como número
+    o None, auditoría como bool y fecha como datetime).
+    rango: (inicio, fin) de ids (ObjectId en mongo), fin exclusivo; None = sin límite.
+    latido: función que se llama cada FILAS_POR_LATIDO filas leídas.
+    """
+    filas = _filas_exportacion(parametros, limite, rango)
+    return filas if latido is None else _con_latido(filas, latido)
+
+
+def _filas_exportacion(parametros, limite, rango):
+    inicio, fin = rango or (None, None)
+    if parametros['fuente'] == 'postgres':
+        calificaciones = queryset_exportacion(parametros['estado'], parametros['desde'], parametros['hasta'])
+        if inicio is not None:
+            calificaciones = calificaciones.filter(id__gte=inicio)
+        if fin is not None:
+            calificaciones = calificaciones.filter(id__lt=fin)
+        if limite is not None:
+            calificaciones = calificaciones[:limite]
+        return _filas_postgres(calificaciones)
+
+    filtro = filtro_mongo(**{k: v for k, v in parametros.items() if k != 'fuente'})
+    if rango:
+        filtro['_id'] = _filtro_rango(inicio, fin)
+    return _filas_mongo(filtro, limite=limite)
+
+
+def limites_exportacion(parametros, posiciones):
+    """
+    Id de la fila en cada posición (0-based) del orden de exportación, para
+    partir las filas en rangos contiguos. Posiciones fuera de rango se omiten.
+    """
+    limites = []
+    if parametros['fuente'] == 'postgres':
+        ids = queryset_exportacion(parametros['estado'], parametros['desde'], parametros['hasta']).values_list('id', flat=True)
+        for posicion in posiciones:
+            limite = next(iter(ids[posicion:posicion + 1]), None)
+            if limite is not None:
+                limites.append(limite)
+        return limites
+
+    filtro = filtro_mongo(**{k: v for k, v in parametros.items() if k != 'fuente'})
+    coleccion = get_mongo_db()['calificaciones']
+    for posicion in posiciones:
+        documento = next(coleccion.find(filtro, {'_id': 1}).sort('_id', 1).skip(posicion).limit(1), None)
+        if documento is not None:
+            limites.append(documento['_id'])
+    return limites
+
+
+def contar_exportacion(parametros):
+    if parametros['fuente'] == 'postgres':
+        return queryset_exportacion(parametros['estado'], parametros['desde'], parametros['hasta']).count()
+
+    filtro = filtro_mongo(**{k: v for k, v in parametros.items() if k != 'fuente'})
+    return get_mongo_db()['calificaciones'].count_documents(filtro)
@@ -0,0 +1,252 @@
+"""
+Generación de exportaciones grandes en varios procesos.
+
+openpyxl y reportlab consumen CPU en Python puro y usan un solo núcleo.
+Para exportaciones de muchas filas, las tareas en segundo plano
+(src/tareas_exportacion.py) parten las filas en rangos contiguos de ids
+(en el orden de exportación), generan cada parte en un pool de procesos y
+luego las unen:
+
+- csv: las partes (solo la primera con encabezado) se concatenan.
+- xlsx: cada parte es una hoja. Las hojas de openpyxl write-only usan
+  cadenas inline y todas las partes registran los mismos estilos, así que
+  el XML de cada hoja se copia tal cual al libro final (sin releerlo).
+- pdf: las partes se alinean a páginas completas, las siguientes a la
+  primera van sin cabecera y con la numeración desplazada, y se unen con
+  pypdf (opcional; sin pypdf el PDF se genera en un solo proceso).
+
+Este módulo no importa modelos al cargarse: los procesos hijos (spawn) lo
+importan antes de inicializar Django.
+"""
+import io
+import math
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import accumulate
+
+try:
+    from pypdf import PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+# Procesos del pool (por defecto, uno por núcleo)
+PROCESOS = int(os.getenv('EXPORTACION_PROCESOS', os.cpu_count() or 1))
+
+# Pools que pueden correr a la vez en este proceso: cada tarea en segundo
+# plano corre en su propio hilo y, sin este límite, N tareas simultáneas
+# lanzarían N pools de PROCESOS hijos cada uno
+POOLS_SIMULTANEOS = int(os.getenv('EXPORTACION_POOLS_SIMULTANEOS', 1))
+_pools = threading.BoundedSemaphore(POOLS_SIMULTANEOS)
+
+# Bajo este tamaño por parte no compensa el costo de lanzar procesos
+FILAS_MINIMAS_POR_PARTE = 20000
+
+# spawn: seguro aunque el ejecutor corra en un hilo (fork duplica solo el hilo actual)
+METODO_INICIO = 'spawn'
+
+LONGITUD_COPIA = 1024 * 1024
+
+# Segundos entre latidos mientras se esperan las partes
+INTERVALO_LATIDO = 30
+
+
+# ===============================
+# PROCESOS HIJOS
+# ===============================
+def _inicializar_proceso():
+    import django
+    django.setup()
+
+
+def _generar_parte(formato, ruta, parametros, rango, opciones):
+    from src.formatos_exportacion import FORMATOS
+
+    escribir = FORMATOS[formato][2]
+    with open(ruta, 'wb') as archivo:
+        return escribir(archivo, parametros, rango=rango, **opciones)
+
+
+# ===============================
+# PLANIFICACIÓN
+# ===============================
+def planificar_partes(formato, total, procesos=None):
+    """
+    Cantidad de filas de cada parte. En pdf cada parte ocupa páginas
+    completas (la primera incluye la cabecera del reporte).
+    """
+    partes = min(procesos or PROCESOS, total // FILAS_MINIMAS_POR_PARTE)
+    if partes < 2 or formato not in UNIONES or (formato == 'pdf' and not PYPDF_AVAILABLE):
+        return [total]
+
+    if formato == 'pdf':
+        from src.formatos_exportacion import capacidad_pdf
+
+        primera, siguientes = capacidad_pdf()
+        paginas = 1 + math.ceil(max(total - primera, 0) / siguientes)
+        por_parte = math.ceil(paginas / partes)
+        tamanos = [primera + (por_parte - 1) * siguientes] + [por_parte * siguientes] * (partes - 1)
+    else:
+        tamanos = [math.ceil(total / partes)] * partes
+
+    resultado = []
+    restantes = total
+    for tamano in tamanos:
+        if restantes <= 0:
+            break
+        resultado.append(min(tamano, restantes))
+        restantes -= resultado[-1]
+    return resultado
+
+
+def _opciones_partes(formato, tamanos, total):
+    """Opciones de escritura de cada parte para que se puedan unir"""
+    if formato == 'csv':
+        return [{'encabezados': i == 0} for i in range(len(tamanos))]
+
+    if formato == 'xlsx':
+        from src.formatos_exportacion import HOJA_EXCEL
+        return [{'hoja': f"{HOJA_EXCEL} {i + 1}"} for i in range(len(tamanos))]
+
+    from src.formatos_exportacion import capacidad_pdf
+
+    primera, siguientes = capacidad_pdf()
+    opciones = []
+    pagina = 1
+    for i, tamano in enumerate(tamanos):
+        opciones.append({'cabecera': i == 0, 'pagina_inicial': pagina, 'total': total})
+        if i == 0:
+            pagina += 1 + math.ceil(max(tamano - primera, 0) / siguientes)
+        else:
+            pagina += math.ceil(tamano / siguientes)
+    return opciones
+
+
+# ===============================
+# UNIÓN DE PARTES
+# ===============================
+def _unir_csv(archivo, rutas):
+    for ruta in rutas:
+        with open(ruta, 'rb') as parte:
+            shutil.copyfileobj(parte, archivo, LONGITUD_COPIA)
+
+
+def _unir_excel(archivo, rutas):
+    """
+    Libro con una hoja por parte: workbook.xml, relaciones y content types
+    salen de un libro vacío con N hojas; el XML de cada hoja y los estilos,
+    de las partes.
+    """
+    import openpyxl
+    from src.formatos_exportacion import HOJA_EXCEL
+
+    esqueleto = openpyxl.Workbook(write_only=True)
+    for i in range(len(rutas)):
+        esqueleto.create_sheet(f"{HOJA_EXCEL} {i + 1}")
+    buffer = io.BytesIO()
+    esqueleto.save(buffer)
+
+    partes = [zipfile.ZipFile(ruta) for ruta in rutas]
+    try:
+        with zipfile.ZipFile(buffer) as base, zipfile.ZipFile(archivo, 'w', zipfile.ZIP_DEFLATED) as destino:
+            for info in base.infolist():
+                hoja = re.fullmatch(r'xl/worksheets/sheet(\d+)\.xml', info.filename)
+                if hoja:
+                    origen, nombre = partes[int(hoja.group(1)) - 1], 'xl/worksheets/sheet1.xml'
+                elif info.filename == 'xl/styles.xml':
+                    origen, nombre = partes[0], info.filename
+                else:
+                    origen, nombre = base, info.filename
+                with origen.open(nombre) as lectura, destino.open(info.filename, 'w', force_zip64=True) as escritura:
+                    shutil.copyfileobj(lectura, escritura, LONGITUD_COPIA)
+    finally:
+        for parte in partes:
+            parte.close()
+
+
+def _unir_pdf(archivo, rutas):
+    escritor = PdfWriter()
+    for ruta in rutas:
+        escritor.append(ruta)
+    escritor.write(archivo)
+
+
+UNIONES = {
+    'csv': _unir_csv,
+    'xlsx': _unir_excel,
+    'pdf': _unir_pdf,
+}
+
+
+@contextmanager
+def _turno_pool(latido=None):
+    """Espera un lugar entre los POOLS_SIMULTANEOS, sin dejar de latir"""
+    while not _pools.acquire(timeout=INTERVALO_LATIDO):
+        if latido is not None:
+            latido()
+    try:
+        yield
+    finally:
+        _pools.release()
+
+
+# ===============================
+# API
+# ===============================
+def generar_exportacion(formato, archivo, parametros, procesos=None, latido=None):
+    """
+    Escribe la exportación completa en `archivo`, en paralelo si las filas
+    alcanzan para más de una parte (un pool a la vez por proceso, ver
+    POOLS_SIMULTANEOS). Retorna la cantidad de filas escritas (la suma de
+    las partes, no el conteo con que se planificó).
+    latido: función sin argumentos que se llama periódicamente mientras
+    se escribe (por filas en un solo proceso; por tiempo mientras se
+    esperan las partes y tras unirlas).
+    """
+    from django.db import connections
+    from src.exportacion import contar_exportacion, limites_exportacion
+    from src.formatos_exportacion import FORMATOS
+
+    escribir = FORMATOS[formato][2]
+    total = contar_exportacion(parametros)
+    tamanos = planificar_partes(formato, total, procesos)
+
+    limites = limites_exportacion(parametros, list(accumulate(tamanos[:-1]))) if len(tamanos) > 1 else []
+    if len(tamanos) < 2 or len(limites) != len(tamanos) - 1:
+        # Una sola parte (o las filas cambiaron al planificar): en este proceso
+        return escribir(archivo, parametros, latido=latido, **({'total': total} if formato == 'pdf' else {}))
+
+    rangos = list(zip([None, *limites], [*limites, None]))
+    with tempfile.TemporaryDirectory(prefix='exportacion-') as directorio:
+        rutas = [os.path.join(directorio, f"parte-{i}") for i in range(len(rangos))]
+
+        # Las partes pueden tardar: no se retienen conexiones del padre mientras tanto
+        connections.close_all()
+        with _turno_pool(latido), ProcessPoolExecutor(
+            max_workers=len(rangos),
+            mp_context=multiprocessing.get_context(METODO_INICIO),
+            initializer=_inicializar_proceso,
+        ) as pool:
+            pendientes = {
+                pool.submit(_generar_parte, formato, ruta, parametros, rango, opciones)
+                for ruta, rango, opciones in zip(rutas, rangos, _opciones_partes(formato, tamanos, total))
+            }
+            escritas = 0
+            while pendientes:
+                terminadas, pendientes = wait(pendientes, timeout=INTERVALO_LATIDO, return_when=FIRST_COMPLETED)
+                for parte in terminadas:
+                    escritas += parte.result()      # propaga el error de la parte
+                if latido is not None:
+                    latido()
+
+        UNIONES[formato](archivo, rutas)
+    if latido is not None:
+        latido()
+    return escritas
@@ -0,0 +1,234 @@
+"""
+Escritores de los formatos de exportación de calificaciones (CSV, Excel, PDF,
+Parquet y Arrow IPC).
+
+Los usan tanto las vistas síncronas (src/views/exportar.py) como las tareas
+de exportación en segundo plano (src/tareas_exportacion.py). Todos leen las
+filas en streaming desde src/exportacion.py y escriben a un archivo binario.
+
+Firma común: escribir(archivo, parametros, rango=None, **opciones). Con
+rango (ids inicio/fin) escriben solo una parte de las filas; las opciones
+dejan cada parte lista para unirse a las demás (src/exportacion_paralela.py).
+Retornan la cantidad de filas escritas.
+Con latido (función sin argumentos) avisan periódicamente que siguen
+escribiendo (ver filas_exportacion).
+"""
+from datetime import datetime
+
+from src import columnar
+from src.exportacion import COLUMNAS, contar_exportacion, filas_exportacion
+from src.reporte_pdf import REPORTLAB_AVAILABLE, generar_pdf, filas_por_pagina
+from src.streaming import bloques_csv
+
+try:
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+    from openpyxl.utils import get_column_letter
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+ANCHO_COLUMNA_EXCEL = 15
+HOJA_EXCEL = "Calificaciones"
+TITULO_PDF = "📊 Reporte de Calificaciones"
+
+
+class _FilasContadas:
+    """Iterable sobre las filas que cuenta las que se consumieron"""
+
+    def __init__(self, filas):
+        self.filas = filas
+        self.total = 0
+
+    def __iter__(self):
+        for fila in self.filas:
+            self.total += 1
+            yield fila
+
+
+# ===============================
+# CSV
+# ===============================
+def _bloques_csv(filas, encabezados):
+    return bloques_csv(
+        ['RUT', 'Registro', 'Tipo Certificado', 'Periodo', 'Monto', 'Estado', 'Auditoria', 'Creado por', 'Creado']
+        if encabezados else None,
+        (
+            [
+                rut, registro, tipo, periodo,
+                monto if monto is not None else '',
+                estado,
+                'SI' if auditoria else 'NO',
+                creado_por,
+                creado.strftime('%Y-%m-%d') if creado else ''
+            ]
+            for rut, registro, tipo, periodo, monto, estado, auditoria, creado_por, creado
+            in filas
+        )
+    )
+
+
+def bloques_csv_calificaciones(parametros, rango=None, encabezados=True, latido=None):
+    """CSV en bloques de texto (para StreamingHttpResponse o para escribir a archivo)"""
+    return _bloques_csv(filas_exportacion(parametros, rango=rango, latido=latido), encabezados)
+
+
+def escribir_csv(archivo, parametros, rango=None, encabezados=True, latido=None):
+    """encabezados=False para las partes que se concatenan tras la primera"""
+    filas = _FilasContadas(filas_exportacion(parametros, rango=rango, latido=latido))
+    for bloque in _bloques_csv(filas, encabezados):
+        archivo.write(bloque.encode('utf-8'))
+    return filas.total
+
+
+# ===============================
+# EXCEL
+# ===============================
+def _estilos_excel(wb):
+    """Estilos con nombre (uno para encabezado y otro para datos), creados una vez por workbook"""
+    borde = Side(style='thin')
+    encabezado = NamedStyle(
+        name="encabezado",
+        font=Font(bold=True, color="FFFFFF", size=11),
+        fill=PatternFill(start_color="3b82f6", end_color="3b82f6", fill_type="solid"),
+        alignment=Alignment(horizontal="center", vertical="center"),
+        border=Border(left=borde, right=borde, top=borde, bottom=borde),
+    )
+    dato = NamedStyle(
+        name="dato",
+        alignment=Alignment(horizontal="center"),
+        border=Border(left=borde, right=borde, top=borde, bottom=borde),
+    )
+    wb.add_named_style(encabezado)
+    wb.add_named_style(dato)
+
+
+def escribir_excel(archivo, parametros, rango=None, hoja=HOJA_EXCEL, latido=None):
+    """
+    Workbook en modo write-only: las filas se escriben en streaming y los
+    estilos son NamedStyle registrados una sola vez, así que la memoria no
+    crece con la cantidad de filas.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    _estilos_excel(wb)
+    ws = wb.create_sheet(hoja)
+
+    # Ajustar ancho de columnas (antes de escribir filas)
+    for col in range(1, len(COLUMNAS) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = ANCHO_COLUMNA_EXCEL
+
+    def fila(valores, estilo):
+        celdas = []
+        for valor in valores:
+            celda = WriteOnlyCell(ws, value=valor)
+            celda.style = estilo
+            celdas.append(celda)
+        return celdas
+
+    # Encabezados
+    ws.append(fila(COLUMNAS, "encabezado"))
+
+    # Datos
+    total = 0
+    for *valores, auditoria, creado_por, creado in filas_exportacion(parametros, rango=rango, latido=latido):
+        ws.append(fila([
+            *valores,
+            'Sí' if auditoria else 'No',
+            creado_por,
+            creado.strftime('%d/%m/%Y') if creado else ''
+        ], "dato"))
+        total += 1
+
+    wb.save(archivo)
+    return total
+
+
+# ===============================
+# PDF
+# ===============================
+def info_pdf(total):
+    fecha_actual = datetime.now().strftime('%d/%m/%Y %H:%M')
+    return f"Generado: {fecha_actual} | Total: {total} calificaciones"
+
+
+def capacidad_pdf():
+    """(filas de la primera página, filas de las siguientes) del reporte"""
+    return filas_por_pagina(TITULO_PDF, info_pdf(0))
+
+
+def escribir_pdf(archivo, parametros, rango=None, cabecera=True, pagina_inicial=1, total=None, latido=None):
+    """
+    Todas las filas, en tablas del tamaño de una página (src/reporte_pdf.py).
+    Las partes que continúan el reporte van sin cabecera y con la
+    numeración de páginas desplazada.
+    """
+    encabezados = ['RUT', 'Tipo Cert.', 'Período', 'Monto', 'Estado', 'Auditoría', 'Creado por', 'Creado']
+    contadas = _FilasContadas(filas_exportacion(parametros, rango=rango, latido=latido))
+    filas = (
+        [
+            rut or '-',
+            tipo or '-',
+            periodo or '-',
+            monto if monto is not None else '-',
+            estado,
+            '✓' if auditoria else '-',
+            creado_por or '-',
+            creado.strftime('%d/%m/%Y') if creado else '-'
+        ]
+        for rut, _, tipo, periodo, monto, estado, auditoria, creado_por, creado
+        in contadas
+    )
+
+    # Información del reporte
+    if cabecera and total is None:
+        total = contar_exportacion(parametros)
+
+    generar_pdf(
+        archivo,
+        TITULO_PDF,
+        info_pdf(total),
+        encabezados,
+        filas,
+        anchos=[ancho * 72 for ancho in (1, 0.8, 0.6, 0.9, 0.9, 0.6, 0.9, 0.8)],  # pulgadas -> puntos
+        cabecera=cabecera,
+        pagina_inicial=pagina_inicial,
+    )
+    return contadas.total
+
+
+# ===============================
+# PARQUET / ARROW
+# ===============================
+def escribir_parquet(archivo, parametros, rango=None, latido=None):
+    """Columnas tipadas en row groups (src/columnar.py)"""
+    filas = columnar.filas_calificaciones(filas_exportacion(parametros, rango=rango, latido=latido))
+    return columnar.escribir_columnar(archivo, 'parquet', columnar.ESQUEMA_CALIFICACIONES, filas)
+
+
+def escribir_arrow(archivo, parametros, rango=None, latido=None):
+    """Arrow IPC (formato archivo), por record batches (src/columnar.py)"""
+    filas = columnar.filas_calificaciones(filas_exportacion(parametros, rango=rango, latido=latido))
+    return columnar.escribir_columnar(archivo, 'arrow', columnar.ESQUEMA_CALIFICACIONES, filas)
+
+
+# formato -> (extensión, content type, escribir(archivo, parametros), disponible, mensaje si no lo está)
+FORMATOS = {
+    'csv': ('csv', 'text/csv; charset=utf-8', escribir_csv, True, None),
+    'xlsx': (
+        'xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', escribir_excel,
+        OPENPYXL_AVAILABLE, "openpyxl no está instalado. Instala con: pip install openpyxl",
+    ),
+    'pdf': (
+        'pdf', 'application/pdf', escribir_pdf,
+        REPORTLAB_AVAILABLE, "ReportLab no está instalado. Instala con: pip install reportlab",
+    ),
+    'parquet': (
+        'parquet', 'application/vnd.apache.parquet', escribir_parquet,
+        columnar.PYARROW_AVAILABLE, columnar.MENSAJE_PYARROW,
+    ),
+    'arrow': (
+        'arrow', 'application/vnd.apache.arrow.file', escribir_arrow,
+        columnar.PYARROW_AVAILABLE, columnar.MENSAJE_PYARROW,
+    ),
+}
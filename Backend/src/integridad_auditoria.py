@@ -0,0 +1,265 @@
+"""
+Cadena de hashes sobre Auditoria (evidencia de manipulación).
+
+Cada fila guarda hash_anterior (el hash de la fila previa en orden de id)
+y hash = SHA-256(hash_anterior | contenido canónico de la fila). Modificar,
+eliminar o intercalar una fila rompe la cadena desde ese punto.
+
+Inserción: un advisory lock de transacción serializa a los escritores para
+que dos filas no se encadenen sobre el mismo hash anterior. El costo es una
+lectura por PK y un hash por fila.
+
+El INSERT ocurre dentro de la transacción del llamador: la fila de
+auditoría se confirma (o se revierte) junto con el cambio auditado, y el
+lock se libera al terminar esa transacción. Como id y fecha se asignan con
+el lock tomado, el orden (fecha, id) coincide con el orden de la cadena.
+
+Verificación: incremental. Parte del último checkpoint OK
+(VerificacionAuditoria) y solo recalcula las filas nuevas.
+"""
+import hashlib
+import json
+import logging
+from datetime import timezone as dt_timezone
+
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from src.models import Auditoria, TareaPurga, VerificacionAuditoria
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que protege el final de la cadena
+LOCK_CADENA = 4_170_201_326
+LOTE_VERIFICACION = 5000
+
+
+# ===============================
+# HASH DE UNA FILA
+# ===============================
+# Campos que forman parte del hash, en orden
+CAMPOS_HASH = ('usuario', 'rol', 'accion', 'modelo', 'objeto_id', 'descripcion', 'fecha', 'ip_address', 'metadatos')
+
+
+def _valor_canonico(auditoria, nombre):
+    """
+    Valor del campo tal como queda en la base: to_python + get_prep_value
+    del campo del modelo (p. ej. objeto_id "5" desde un form queda 5).
+    """
+    campo = Auditoria._meta.get_field(nombre)
+    valor = getattr(auditoria, campo.attname)
+    if campo.is_relation:
+        campo = campo.target_field
+    if nombre == 'metadatos':
+        # Ida y vuelta por JSON: tuplas, llaves numéricas, etc. quedan como en jsonb
+        return json.loads(json.dumps(valor or {}))
+    if valor is None:
+        return None
+
+    valor = campo.get_prep_value(campo.to_python(valor))
+    if nombre == 'fecha':
+        if timezone.is_aware(valor):
+            valor = valor.astimezone(dt_timezone.utc)
+        return valor.isoformat()
+    return valor
+
+
+def contenido_canonico(auditoria):
+    """
+    Representación estable de la fila: la misma antes del INSERT y al
+    leerla desde la base (valores normalizados por su campo, fecha en UTC,
+    JSON con llaves ordenadas).
+    """
+    valores = [_valor_canonico(auditoria, nombre) for nombre in CAMPOS_HASH]
+    return json.dumps(valores, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+def calcular_hash(auditoria, hash_anterior):
+    datos = f"{hash_anterior}|{contenido_canonico(auditoria)}"
+    return hashlib.sha256(datos.encode('utf-8')).hexdigest()
+
+
+# ===============================
+# ESCRITURA ENCADENADA
+# ===============================
+def _bloquear_cadena(using):
+    """Lock exclusivo hasta el fin de la transacción (solo PostgreSQL)"""
+    conexion = connections[using]
+    if conexion.vendor == 'postgresql':
+        with conexion.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [LOCK_CADENA])
+
+
+def _ultimo_hash(using):
+    return Auditoria.objects.using(using).order_by('-id').values_list('hash', flat=True).first() or ""
+
+
+def _encadenar(auditorias, using):
+    """
+    Asigna fecha, hash_anterior y hash en orden. Requiere el lock de la
+    cadena: la fecha se fija aquí para que crezca junto con el id.
+    """
+    anterior = _ultimo_hash(using)
+    ahora = timezone.now()
+    for auditoria in auditorias:
+        auditoria.fecha = ahora
+        auditoria.hash_anterior = anterior
+        auditoria.hash = calcular_hash(auditoria, anterior)
+        anterior = auditoria.hash
+
+
+def guardar_encadenado(auditoria, guardar, *args, **kwargs):
+    """INSERT de una fila nueva encadenada (usado por Auditoria.save)"""
+    using = kwargs.get('using') or router.db_for_write(Auditoria, instance=auditoria)
+    with transaction.atomic(using=using):
+        _bloquear_cadena(using)
+        _encadenar([auditoria], using)
+        return guardar(*args, **kwargs)
+
+
+def registrar_auditorias(auditorias, batch_size=1000, using='default'):
+    """
+    Escritor por lotes: encadena y guarda varias filas con un solo lock
+    y bulk_create (que no pasa por Auditoria.save).
+    """
+    auditorias = list(auditorias)
+    if not auditorias:
+        return []
+    with transaction.atomic(using=using):
+        _bloquear_cadena(using)
+        _encadenar(auditorias, using)
+        return Auditoria.objects.using(using).bulk_create(auditorias, batch_size=batch_size)
+
+
+# ===============================
+# VERIFICACIÓN INCREMENTAL
+# ===============================
+class _CadenaRota(Exception):
+    def __init__(self, fila_id, motivo):
+        super().__init__(motivo)
+        self.fila_id = fila_id
+        self.motivo = motivo
+
+
+def ultimo_checkpoint():
+    return VerificacionAuditoria.objects.filter(estado="OK").order_by('-hasta_id', '-id').first()
+
+
+def _fila_purgada(fila_id):
+    """La fila falta porque una purga la eliminó (y todo lo anterior a ella)"""
+    if Auditoria.objects.filter(pk__lte=fila_id).exists():
+        return False
+    return TareaPurga.objects.filter(
+        estado__in=["EN_CURSO", "COMPLETADA", "FALLIDA"],
+        ultimo_id__gte=fila_id,
+    ).exists()
+
+
+def _punto_de_partida(checkpoint):
+    """
+    Retorna (desde_id, hash_esperado). hash_esperado None significa que la
+    primera fila con hash se toma como ancla (inicio de la cadena o tras una purga).
+    """
+    if checkpoint is None:
+        return 0, None
+
+    fila = Auditoria.objects.filter(pk=checkpoint.hasta_id).first()
+    if fila is None:
+        if checkpoint.hasta_id and not _fila_purgada(checkpoint.hasta_id):
+            raise _CadenaRota(checkpoint.hasta_id, "La fila del checkpoint fue eliminada")
+        return checkpoint.hasta_id, None
+
+    if fila.hash != checkpoint.ultimo_hash or calcular_hash(fila, fila.hash_anterior) != fila.hash:
+        raise _CadenaRota(fila.id, "La fila del checkpoint fue modificada")
+    return fila.id, fila.hash
+
+
+def verificar_cadena(usuario=None, completa=False, lote=LOTE_VERIFICACION, reportar=None, verificacion=None):
+    """
+    Verifica la cadena desde el último checkpoint OK (o completa).
+    Recorre por lotes ordenados por PK hasta el id máximo al iniciar.
+    Retorna la VerificacionAuditoria con el resultado.
+    """
+    checkpoint = None if completa else ultimo_checkpoint()
+    if verificacion is None:
+        verificacion = VerificacionAuditoria.objects.create(
+            completa=completa,
+            desde_id=checkpoint.hasta_id if checkpoint else 0,
+            ejecutada_por=usuario,
+        )
+    else:
+        verificacion.desde_id = checkpoint.hasta_id if checkpoint else 0
+
+    tope = Auditoria.objects.aggregate(maximo=Max('id'))['maximo'] or 0
+    verificacion.hasta_id = checkpoint.hasta_id if checkpoint else 0
+    verificacion.ultimo_hash = checkpoint.ultimo_hash if checkpoint else ""
+
+    try:
+        ultimo_id, esperado = _punto_de_partida(checkpoint)
+        en_cadena = bool(checkpoint and checkpoint.ultimo_hash)
+
+        while ultimo_id < tope:
+            filas = list(Auditoria.objects.filter(pk__gt=ultimo_id, pk__lte=tope).order_by('pk')[:lote])
+            if not filas:
+                break
+
+            for fila in filas:
+                ultimo_id = fila.id
+
+                # Filas previas a la cadena (creadas antes de introducir el hash)
+                if not en_cadena and not fila.hash:
+                    verificacion.filas_legado += 1
+                    continue
+
+                if esperado is None:
+                    esperado = fila.hash_anterior
+                if fila.hash_anterior != esperado:
+                    raise _CadenaRota(fila.id, "Eslabón roto: falta o sobra una fila antes de esta")
+                if calcular_hash(fila, fila.hash_anterior) != fila.hash:
+                    raise _CadenaRota(fila.id, "El contenido de la fila no coincide con su hash")
+
+                en_cadena = True
+                esperado = fila.hash
+                verificacion.hasta_id = fila.id
+                verificacion.ultimo_hash = fila.hash
+                verificacion.filas_verificadas += 1
+
+            if reportar:
+                reportar(verificacion)
+
+        verificacion.estado = "OK"
+    except _CadenaRota as exc:
+        verificacion.estado = "FALLIDA"
+        verificacion.id_fallido = exc.fila_id
+        verificacion.motivo = exc.motivo
+        logger.error("Cadena de auditoría rota en id %s: %s", exc.fila_id, exc.motivo)
+    except Exception as exc:
+        # Error inesperado: no dejar la verificación EN_CURSO indefinidamente
+        verificacion.estado = "FALLIDA"
+        verificacion.motivo = f"Error durante la verificación: {exc}"
+        verificacion.fecha_fin = timezone.now()
+        verificacion.save()
+        raise
+
+    verificacion.fecha_fin = timezone.now()
+    verificacion.save()
+    return verificacion
+
+
+def serializar_verificacion(verificacion):
+    return {
+        "id": verificacion.id,
+        "estado": verificacion.estado,
+        "completa": verificacion.completa,
+        "desde_id": verificacion.desde_id,
+        "hasta_id": verificacion.hasta_id,
+        "ultimo_hash": verificacion.ultimo_hash,
+        "filas_verificadas": verificacion.filas_verificadas,
+        "filas_legado": verificacion.filas_legado,
+        "id_fallido": verificacion.id_fallido,
+        "motivo": verificacion.motivo,
+        "ejecutada_por": verificacion.ejecutada_por.username if verificacion.ejecutada_por else None,
+        "fecha_inicio": verificacion.fecha_inicio,
+        "fecha_fin": verificacion.fecha_fin,
+    }
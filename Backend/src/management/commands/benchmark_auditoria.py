@@ -0,0 +1,104 @@
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from src.models import Auditoria
+from src.utils_auditoria import filtro_dia, filtro_rango_fechas, inicio_del_dia
+
+
+class Command(BaseCommand):
+    help = """
+    EXPLAIN ANALYZE de los caminos de acceso a Auditoria.
+
+    Compara los filtros antiguos (fecha__date, que aplican un cast a la columna)
+    con los rangos semiabiertos actuales. Ejecutar antes y después de aplicar
+    la migración de índices para comparar los planes:
+
+      python manage.py benchmark_auditoria
+      python manage.py benchmark_auditoria --dias 7 --planes
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, default=30, help='Rango de días a consultar (default: 30)')
+        parser.add_argument('--planes', action='store_true', help='Mostrar el plan completo de cada consulta')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("El benchmark requiere PostgreSQL")
+
+        hasta = timezone.localdate()
+        desde = hasta - timedelta(days=options['dias'])
+        ayer = hasta - timedelta(days=1)
+
+        ultima = Auditoria.objects.exclude(objeto_id=None).order_by('-id').first()
+        objeto = (ultima.modelo, ultima.objeto_id) if ultima else ('Calificacion', 1)
+
+        casos = [
+            (
+                f"Listado últimos {options['dias']} días ordenado por -fecha",
+                Auditoria.objects.filter(fecha__date__gte=desde, fecha__date__lte=hasta).order_by('-fecha')[:50],
+                Auditoria.objects.filter(**filtro_rango_fechas(desde, hasta)).order_by('-fecha')[:50],
+            ),
+            (
+                "Conteo de un día (tendencia)",
+                Auditoria.objects.filter(fecha__date=ayer),
+                Auditoria.objects.filter(**filtro_dia(ayer)),
+            ),
+            (
+                "Totales por acción en el rango",
+                Auditoria.objects.filter(fecha__date__gte=desde).values('accion').annotate(total=Count('id')),
+                Auditoria.objects.filter(fecha__gte=inicio_del_dia(desde)).values('accion').annotate(total=Count('id')),
+            ),
+            (
+                "Eventos LOGIN del rango",
+                Auditoria.objects.filter(accion='LOGIN', fecha__date__gte=desde).values('fecha', 'modelo'),
+                Auditoria.objects.filter(accion='LOGIN', **filtro_rango_fechas(desde, hasta)).values('fecha', 'modelo'),
+            ),
+            (
+                "Eventos por rol en el rango",
+                Auditoria.objects.filter(rol='ANALISTA', fecha__date__gte=desde).values('accion'),
+                Auditoria.objects.filter(rol='ANALISTA', **filtro_rango_fechas(desde, hasta)).values('accion'),
+            ),
+            (
+                f"Historia de {objeto[0]} #{objeto[1]}",
+                None,
+                Auditoria.objects.filter(modelo=objeto[0], objeto_id=objeto[1]).values('fecha', 'accion'),
+            ),
+        ]
+
+        self.stdout.write(self.style.WARNING(
+            f"\n▶ Auditoria: ~{self._filas_estimadas()} filas | rango {desde} → {hasta}\n"
+        ))
+
+        for nombre, antes, despues in casos:
+            self.stdout.write(self.style.HTTP_INFO(f"● {nombre}"))
+            if antes is not None:
+                self._explicar("fecha__date", antes, options['planes'])
+            self._explicar("rango", despues, options['planes'])
+            self.stdout.write("")
+
+    def _explicar(self, etiqueta, queryset, mostrar_plan):
+        plan = queryset.explain(analyze=True, buffers=True)
+        tiempo = re.search(r"Execution Time: ([\d.]+) ms", plan)
+        nodo = plan.splitlines()[0].split("  (")[0].strip()
+        indices = sorted(set(re.findall(r"(?:using|on) (\w+_(?:idx|brin|pkey))", plan)))
+
+        self.stdout.write(
+            f"  {etiqueta:<12} {tiempo.group(1) if tiempo else '?':>10} ms  "
+            f"{nodo}{'  [' + ', '.join(indices) + ']' if indices else ''}"
+        )
+        if mostrar_plan:
+            for linea in plan.splitlines():
+                self.stdout.write(f"      {linea}")
+
+    def _filas_estimadas(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [Auditoria._meta.db_table]
+            )
+            return cursor.fetchone()[0]
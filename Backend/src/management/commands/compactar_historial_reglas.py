@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from src.models import ReglaNegocio
+from src.versiones_reglas import KEYFRAME_CADA, compactar_historial
+
+
+class Command(BaseCommand):
+    help = f"""
+    Recodifica el historial de reglas existente como keyframes + deltas
+    (un keyframe cada {KEYFRAME_CADA} snapshots). Se puede ejecutar más de una vez.
+
+    Ejemplos:
+      python manage.py compactar_historial_reglas
+      python manage.py compactar_historial_reglas --regla 3
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regla', type=int, help='Compactar solo esta regla')
+
+    def handle(self, *args, **options):
+        reglas = ReglaNegocio.objects.order_by('id')
+        if options['regla']:
+            reglas = reglas.filter(pk=options['regla'])
+
+        self.stdout.write(self.style.WARNING("\n▶ Compactando historial de reglas"))
+        total_filas = total_keyframes = 0
+        for regla in reglas.iterator():
+            filas, keyframes = compactar_historial(regla)
+            total_filas += filas
+            total_keyframes += keyframes
+            if filas:
+                self.stdout.write(f"  [{regla.id}] {regla.nombre}: {filas} snapshots, {keyframes} keyframes")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {total_filas} snapshots compactados ({total_keyframes} keyframes, "
+            f"{total_filas - total_keyframes} deltas)"
+        ))
@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.tareas_exportacion import (
+    TTL,
+    ejecutar_tarea_exportacion,
+    limpiar_expiradas,
+    tareas_reanudables,
+)
+
+
+class Command(BaseCommand):
+    help = """
+    Exportaciones de calificaciones en segundo plano (MEDIA_ROOT/exports/).
+
+    Ejemplos:
+      python manage.py procesar_exportaciones --reanudar   # genera tareas pendientes o interrumpidas
+      python manage.py procesar_exportaciones --tarea 12   # genera una tarea específica
+      python manage.py procesar_exportaciones --limpiar    # elimina artefactos expirados (cron)
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reanudar', action='store_true', help='Procesar tareas pendientes o interrumpidas')
+        parser.add_argument('--tarea', type=int, help='ID de la tarea a procesar')
+        parser.add_argument('--limpiar', action='store_true', help=f'Eliminar artefactos con más de {TTL} de antigüedad')
+
+    def handle(self, *args, **options):
+        if not (options['reanudar'] or options['tarea'] or options['limpiar']):
+            raise CommandError("Indique --reanudar, --tarea o --limpiar")
+
+        if options['limpiar']:
+            expiradas = limpiar_expiradas()
+            self.stdout.write(self.style.SUCCESS(f"✔ {expiradas} exportaciones expiradas eliminadas"))
+
+        if options['tarea']:
+            tareas = list(tareas_reanudables().filter(pk=options['tarea']))
+            if not tareas:
+                raise CommandError(f"La tarea {options['tarea']} no existe o no es reanudable")
+        elif options['reanudar']:
+            tareas = list(tareas_reanudables())
+            if not tareas:
+                self.stdout.write("ℹ No hay exportaciones pendientes")
+                return
+        else:
+            return
+
+        for tarea in tareas:
+            self.stdout.write(self.style.WARNING(
+                f"\n▶ Exportación {tarea.id}: {tarea.formato} {tarea.parametros}"
+            ))
+
+            resultado = ejecutar_tarea_exportacion(tarea.id)
+            if resultado is None:
+                self.stdout.write(f"ℹ La tarea {tarea.id} está siendo procesada por otro ejecutor")
+                continue
+
+            self.stdout.write(self.style.SUCCESS(
+                f"✔ Exportación {resultado.id} completada: {resultado.filas} filas, "
+                f"{resultado.tamanio} bytes en {resultado.archivo}"
+            ))
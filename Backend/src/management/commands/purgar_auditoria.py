@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.purga import (
+    LOTE_DEFECTO,
+    PAUSA_MS_DEFECTO,
+    PurgaEnCurso,
+    crear_tarea_purga,
+    ejecutar_tarea_purga,
+    tareas_reanudables,
+)
+
+
+class Command(BaseCommand):
+    help = """
+    Purga de auditoría por lotes ordenados por PK, con pausa entre lotes.
+
+    Ejemplos:
+      python manage.py purgar_auditoria --dias 90
+      python manage.py purgar_auditoria --reanudar          # retoma tareas interrumpidas o fallidas
+      python manage.py purgar_auditoria --tarea 12          # retoma una tarea específica
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dias', type=int, help='Eliminar registros anteriores a N días')
+        parser.add_argument('--lote', type=int, default=LOTE_DEFECTO, help=f'Filas por lote (default: {LOTE_DEFECTO})')
+        parser.add_argument('--pausa-ms', type=int, default=PAUSA_MS_DEFECTO, help=f'Pausa entre lotes en ms (default: {PAUSA_MS_DEFECTO})')
+        parser.add_argument('--reanudar', action='store_true', help='Retomar tareas pendientes, interrumpidas o fallidas')
+        parser.add_argument('--tarea', type=int, help='ID de la tarea a retomar')
+
+    def handle(self, *args, **options):
+        if options['tarea']:
+            tareas = list(tareas_reanudables().filter(pk=options['tarea']))
+            if not tareas:
+                raise CommandError(f"La tarea {options['tarea']} no existe o no es reanudable")
+        elif options['reanudar']:
+            tareas = list(tareas_reanudables())
+            if not tareas:
+                self.stdout.write("ℹ No hay tareas de purga para reanudar")
+                return
+        elif options['dias']:
+            try:
+                tareas = [crear_tarea_purga(None, options['dias'], options['lote'], options['pausa_ms'])]
+            except PurgaEnCurso:
+                raise CommandError("Ya existe una purga en curso. Use --reanudar o --tarea")
+        else:
+            raise CommandError("Indique --dias, --reanudar o --tarea")
+
+        for tarea in tareas:
+            self.stdout.write(self.style.WARNING(
+                f"\n▶ Purga {tarea.id}: anteriores a {tarea.fecha_limite:%Y-%m-%d %H:%M} "
+                f"(~{tarea.total_estimado} filas, lote {tarea.tamanio_lote}, pausa {tarea.pausa_ms} ms)"
+            ))
+
+            resultado = ejecutar_tarea_purga(tarea.id, reportar=self._reportar)
+            if resultado is None:
+                self.stdout.write(f"ℹ La tarea {tarea.id} está siendo procesada por otro ejecutor o hay otra purga activa")
+                continue
+
+            self.stdout.write(self.style.SUCCESS(
+                f"✔ Purga {resultado.id} completada: {resultado.eliminados} registros en {resultado.lotes} lotes"
+            ))
+
+    def _reportar(self, tarea):
+        self.stdout.write(
+            f"  lote {tarea.lotes}: {tarea.eliminados}/{tarea.total_estimado} "
+            f"({tarea.progreso()}%) ultimo_id={tarea.ultimo_id}"
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.blacklist_tokens import LOTE_SCAN, REDIS_AVAILABLE, estadisticas, reconciliar
+
+
+class Command(BaseCommand):
+    help = """
+    Reconstruye el contador de tokens revocados recorriendo la blacklist
+    de Redis con SCAN (por lotes, sin bloquear a otros clientes).
+
+    Ejemplos:
+      python manage.py reconciliar_tokens_revocados              # cron, p. ej. cada hora
+      python manage.py reconciliar_tokens_revocados --lote 5000
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_SCAN, help='Claves por iteración de SCAN')
+
+    def handle(self, *args, **options):
+        if not REDIS_AVAILABLE:
+            raise CommandError("Redis no disponible")
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor que 0")
+
+        anterior = estadisticas()['tokens_blacklist_count']
+        self.stdout.write(self.style.WARNING(f"\n▶ Contador actual: {anterior} tokens revocados"))
+
+        total = reconciliar(lote=options['lote'])
+        if total == anterior:
+            self.stdout.write(self.style.SUCCESS(f"✔ Contador correcto: {total} tokens revocados"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"✔ Contador corregido: {anterior} → {total} tokens revocados"
+            ))
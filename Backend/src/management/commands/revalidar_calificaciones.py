@@ -0,0 +1,84 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from src.mongodb_utils import get_mongo_db
+from src.red_reglas import red_activa
+from src.reglas_vectorizadas import LOTE_DEFECTO, NUMPY_AVAILABLE, evaluar_lote, proyeccion_mongo
+
+
+class Command(BaseCommand):
+    help = """
+    Reevalúa las reglas ACTIVAS sobre las calificaciones existentes en MongoDB.
+
+    Lee solo los campos que usan las reglas y las evalúa por lotes
+    (vectorizado con NumPy si está instalado). No cambia el estado de las
+    calificaciones; con --marcar guarda las reglas que coinciden en
+    reglas_revalidacion / fecha_revalidacion.
+
+    Ejemplos:
+      python manage.py revalidar_calificaciones
+      python manage.py revalidar_calificaciones --estado PENDIENTE --marcar
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=LOTE_DEFECTO, help=f'Documentos por lote (default: {LOTE_DEFECTO})')
+        parser.add_argument('--estado', help='Revalidar solo calificaciones en este estado')
+        parser.add_argument('--marcar', action='store_true', help='Guardar el resultado en cada calificación')
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError("--lote debe ser mayor que 0")
+
+        red = red_activa()
+        reglas = red.reglas
+        if red.invalidas:
+            self.stdout.write(self.style.WARNING(f"⚠ {len(red.invalidas)} reglas inválidas omitidas: {sorted(red.invalidas)}"))
+        if not reglas:
+            self.stdout.write(self.style.WARNING("No hay reglas activas"))
+            return
+
+        modo = "vectorizado (NumPy)" if NUMPY_AVAILABLE else "fila por fila (NumPy no instalado)"
+        self.stdout.write(self.style.WARNING(f"\n▶ Revalidando {len(reglas)} reglas, modo {modo}"))
+
+        coleccion = get_mongo_db()['calificaciones']
+        filtro = {'estado': options['estado']} if options['estado'] else {}
+        cursor = coleccion.find(filtro, {'_id': 1, **proyeccion_mongo(reglas)}).batch_size(options['lote'])
+
+        totales = {regla.id: 0 for regla in reglas}
+        procesadas = 0
+        lote = []
+        for documento in cursor:
+            lote.append(documento)
+            if len(lote) >= options['lote']:
+                procesadas += self._procesar(coleccion, reglas, red, lote, totales, options['marcar'])
+                lote = []
+        if lote:
+            procesadas += self._procesar(coleccion, reglas, red, lote, totales, options['marcar'])
+
+        self.stdout.write(self.style.SUCCESS(f"✔ {procesadas} calificaciones revalidadas"))
+        for regla in reglas:
+            self.stdout.write(f"  [{regla.id}] {regla.nombre} (v{regla.version}): {totales[regla.id]}")
+
+    def _procesar(self, coleccion, reglas, red, documentos, totales, marcar):
+        resultado = evaluar_lote(reglas, documentos, red=red)
+        for regla_id, cantidad in resultado.conteos().items():
+            totales[regla_id] += cantidad
+
+        if marcar:
+            # Un update_many por combinación de reglas, no uno por documento
+            por_id = {regla.id: regla for regla in reglas}
+            fecha = timezone.now()
+            for regla_ids, filas in resultado.grupos().items():
+                coleccion.update_many(
+                    {'_id': {'$in': [documentos[fila]['_id'] for fila in filas]}},
+                    {'$set': {
+                        'reglas_revalidacion': [
+                            {'regla_id': i, 'version': por_id[i].version, 'nombre': por_id[i].nombre}
+                            for i in regla_ids
+                        ],
+                        'fecha_revalidacion': fecha,
+                    }}
+                )
+
+        self.stdout.write(f"  {len(documentos)} calificaciones evaluadas")
+        return len(documentos)
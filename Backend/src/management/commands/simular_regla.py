@@ -0,0 +1,74 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.models import ReglaNegocio
+from src.motor_reglas import ReglaInvalida
+from src.reglas_vectorizadas import LOTE_DEFECTO
+from src.simulacion_reglas import PROCESOS_DEFECTO, SimulacionInvalida, simular_regla
+
+
+class Command(BaseCommand):
+    help = """
+    Simula una regla sobre las calificaciones existentes sin modificarlas.
+
+    Con --regla compara contra la versión actual de esa regla
+    (--condicion es opcional y por defecto es la condición actual).
+
+    Ejemplos:
+      python manage.py simular_regla --condicion "monto > 1000000 AND periodo == '2025'"
+      python manage.py simular_regla --regla 3 --condicion "monto > 500000" --muestra 0.05
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regla', type=int, help='ID de la ReglaNegocio a comparar')
+        parser.add_argument('--condicion', help='Condición candidata')
+        parser.add_argument('--muestra', type=float, default=1.0, help='Fracción a muestrear (0-1, default: 1)')
+        parser.add_argument('--procesos', type=int, default=PROCESOS_DEFECTO, help=f'Procesos en paralelo (default: {PROCESOS_DEFECTO})')
+        parser.add_argument('--estado', help='Simular solo sobre calificaciones en este estado')
+        parser.add_argument('--lote', type=int, default=LOTE_DEFECTO, help=f'Documentos por lote (default: {LOTE_DEFECTO})')
+
+    def handle(self, *args, **options):
+        regla = None
+        if options['regla']:
+            try:
+                regla = ReglaNegocio.objects.get(pk=options['regla'])
+            except ReglaNegocio.DoesNotExist:
+                raise CommandError(f"No existe la regla {options['regla']}")
+
+        condicion = options['condicion'] or (regla.condicion if regla else None)
+        if not condicion:
+            raise CommandError("Debe indicar --condicion o --regla")
+
+        self.stdout.write(self.style.WARNING(f"\n▶ Simulando: {condicion}"))
+        try:
+            resultado = simular_regla(
+                condicion,
+                regla=regla,
+                muestra=options['muestra'],
+                procesos=options['procesos'],
+                estado=options['estado'],
+                lote=options['lote'],
+            )
+        except (ReglaInvalida, SimulacionInvalida) as exc:
+            raise CommandError(f"✖ {exc}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ {resultado['coincidencias']} de {resultado['evaluadas']} calificaciones coinciden "
+            f"({resultado['porcentaje']}%) en {resultado['duracion_ms']} ms "
+            f"con {resultado['procesos']} procesos"
+        ))
+        if 'estimado_coincidencias' in resultado:
+            self.stdout.write(
+                f"  Estimado para toda la colección (muestra {resultado['muestra']}): "
+                f"{resultado['estimado_coincidencias']} de {resultado['estimado_evaluadas']}"
+            )
+        if resultado.get('comparacion'):
+            comparacion = resultado['comparacion']
+            self.stdout.write(
+                f"  Versión actual v{resultado['version_actual']}: {comparacion['coincidencias_actual']} coincidencias "
+                f"(+{comparacion['nuevas']} nuevas, -{comparacion['dejan']} dejan de coincidir)"
+            )
+
+        for titulo, grupo in (("Por estado", 'por_estado'), ("Por periodo", 'por_periodo')):
+            self.stdout.write(f"\n  {titulo}:")
+            for clave, celda in resultado[grupo].items():
+                self.stdout.write(f"    {clave}: {celda['coincidencias']} / {celda['evaluadas']}")
@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from src.integridad_auditoria import LOTE_VERIFICACION, ultimo_checkpoint, verificar_cadena
+
+
+class Command(BaseCommand):
+    help = """
+    Verifica la cadena de hashes de Auditoria.
+
+    Por defecto parte del último checkpoint OK y solo recalcula las filas nuevas.
+
+    Ejemplos:
+      python manage.py verificar_auditoria
+      python manage.py verificar_auditoria --completa
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--completa', action='store_true', help='Verificar toda la tabla, ignorando el checkpoint')
+        parser.add_argument('--lote', type=int, default=LOTE_VERIFICACION, help=f'Filas por lote (default: {LOTE_VERIFICACION})')
+
+    def handle(self, *args, **options):
+        checkpoint = None if options['completa'] else ultimo_checkpoint()
+        if checkpoint:
+            self.stdout.write(self.style.WARNING(f"\n▶ Verificación incremental desde id {checkpoint.hasta_id}"))
+        else:
+            self.stdout.write(self.style.WARNING("\n▶ Verificación completa de la cadena"))
+
+        verificacion = verificar_cadena(
+            completa=options['completa'],
+            lote=options['lote'],
+            reportar=self._reportar
+        )
+
+        if verificacion.estado != "OK":
+            raise CommandError(
+                f"✖ Cadena rota en id {verificacion.id_fallido}: {verificacion.motivo} "
+                f"(verificación {verificacion.id})"
+            )
+
+        legado = f", {verificacion.filas_legado} filas previas a la cadena" if verificacion.filas_legado else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"✔ Cadena íntegra hasta id {verificacion.hasta_id}: "
+            f"{verificacion.filas_verificadas} filas verificadas{legado}"
+        ))
+
+    def _reportar(self, verificacion):
+        self.stdout.write(f"  {verificacion.filas_verificadas} filas verificadas (id {verificacion.hasta_id})")
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0015_calificacion_solicitar_auditoria'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaPurga',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha_limite', models.DateTimeField(help_text='Se eliminan registros anteriores a esta fecha')),
+                ('dias', models.PositiveIntegerField()),
+                ('tamanio_lote', models.PositiveIntegerField(default=5000)),
+                ('pausa_ms', models.PositiveIntegerField(default=250)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida')], default='PENDIENTE', max_length=20)),
+                ('id_maximo', models.BigIntegerField(blank=True, null=True)),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('eliminados', models.BigIntegerField(default=0)),
+                ('total_estimado', models.BigIntegerField(default=0)),
+                ('lotes', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tareas_purga', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:21
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY no puede ejecutarse dentro de una transacción;
+    # evita bloquear las escrituras sobre una tabla de auditoría grande
+    atomic = False
+
+    dependencies = [
+        ('src', '0016_tareapurga'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='auditoria',
+            index=django.contrib.postgres.indexes.BrinIndex(fields=['fecha'], name='auditoria_fecha_brin'),
+        ),
+        AddIndexConcurrently(
+            model_name='auditoria',
+            index=models.Index(fields=['accion', 'fecha'], include=('modelo', 'rol'), name='auditoria_accion_fecha_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='auditoria',
+            index=models.Index(fields=['modelo', 'objeto_id'], include=('fecha', 'accion'), name='auditoria_modelo_obj_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='auditoria',
+            index=models.Index(fields=['rol', 'fecha'], include=('accion',), name='auditoria_rol_fecha_idx'),
+        ),
+    ]
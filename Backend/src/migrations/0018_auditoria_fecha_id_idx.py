@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:23
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('src', '0017_auditoria_indices_fecha'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='auditoria',
+            index=models.Index(fields=['fecha', 'id'], name='auditoria_fecha_id_idx'),
+        ),
+    ]
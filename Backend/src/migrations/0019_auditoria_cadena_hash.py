@@ -0,0 +1,53 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0018_auditoria_fecha_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditoria',
+            name='hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='auditoria',
+            name='hash_anterior',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name='auditoria',
+            name='fecha',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.CreateModel(
+            name='VerificacionAuditoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado', models.CharField(choices=[('EN_CURSO', 'En curso'), ('OK', 'Cadena íntegra'), ('FALLIDA', 'Cadena rota')], default='EN_CURSO', max_length=20)),
+                ('completa', models.BooleanField(default=False, help_text='Recorrió la tabla completa en lugar de partir del checkpoint')),
+                ('desde_id', models.BigIntegerField(default=0)),
+                ('hasta_id', models.BigIntegerField(default=0)),
+                ('ultimo_hash', models.CharField(blank=True, max_length=64)),
+                ('filas_verificadas', models.BigIntegerField(default=0)),
+                ('filas_legado', models.BigIntegerField(default=0, help_text='Filas anteriores a la cadena (sin hash)')),
+                ('id_fallido', models.BigIntegerField(blank=True, null=True)),
+                ('motivo', models.TextField(blank=True)),
+                ('fecha_inicio', models.DateTimeField(auto_now_add=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('ejecutada_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='verificaciones_auditoria', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha_inicio'],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:43
+
+from django.db import migrations, models
+
+
+def crear_contador(apps, schema_editor):
+    VersionReglas = apps.get_model('src', 'VersionReglas')
+    VersionReglas.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0019_auditoria_cadena_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionReglas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contador', models.BigIntegerField(default=0)),
+                ('fecha_modificacion', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(crear_contador, migrations.RunPython.noop),
+    ]
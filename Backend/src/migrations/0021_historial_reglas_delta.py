@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0020_reglas_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historialreglanegocio',
+            name='delta',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='historialreglanegocio',
+            name='es_keyframe',
+            field=models.BooleanField(default=True),
+        ),
+    ]
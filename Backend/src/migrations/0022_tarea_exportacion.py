@@ -0,0 +1,39 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0021_historial_reglas_delta'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaExportacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('formato', models.CharField(max_length=10)),
+                ('parametros', models.JSONField(default=dict, help_text='Filtros de la exportación (query params normalizados)')),
+                ('version_datos', models.CharField(blank=True, max_length=100)),
+                ('clave', models.CharField(db_index=True, help_text='sha256 de formato + filtros + versión de datos', max_length=64)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('EN_CURSO', 'En curso'), ('COMPLETADA', 'Completada'), ('FALLIDA', 'Fallida'), ('EXPIRADA', 'Expirada')], default='PENDIENTE', max_length=20)),
+                ('archivo', models.CharField(blank=True, max_length=255)),
+                ('tamanio', models.BigIntegerField(default=0)),
+                ('filas', models.BigIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('expira_en', models.DateTimeField(blank=True, null=True)),
+                ('solicitado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='tareas_exportacion', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-fecha_creacion'],
+            },
+        ),
+    ]
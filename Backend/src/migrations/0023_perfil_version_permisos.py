@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0022_tarea_exportacion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='perfilusuario',
+            name='version_permisos',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
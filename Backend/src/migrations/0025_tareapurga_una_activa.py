@@ -0,0 +1,17 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('src', '0024_simulacion_regla'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='tareapurga',
+            constraint=models.UniqueConstraint(models.Value(True), condition=models.Q(('estado__in', ['PENDIENTE', 'EN_CURSO'])), name='tareapurga_una_activa'),
+        ),
+    ]
@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.contrib.postgres.indexes import BrinIndex
 import secrets
 from datetime import timedelta
 from django.utils import timezone
@@ -107,6 +108,10 @@ class PerfilUsuario(models.Model):
     # Control de cambio de rol
     cambio_rol_solicitado = models.BooleanField(default=False)
 
+    # Versión de permisos: se incrementa al cambiar rol, estado o contraseña
+    # y deja sin efecto los access tokens emitidos antes (src/tokens.py)
+    version_permisos = models.PositiveIntegerField(default=0)
+
     # Ubicación
     pais = models.CharField(max_length=20, choices=PAISES_CHOICES, default='CHILE')
 
@@ -154,7 +159,11 @@ class ReglaNegocio(models.Model):
 # HISTORIAL DE VERSIONES DE REGLAS
 # ===============================
 class HistorialReglaNegocio(models.Model):
-    """Guarda snapshot completo de cada versión de regla"""
+    """
+    Snapshot de cada versión de regla. Los keyframes guardan los textos
+    completos; el resto guarda en `delta` solo las diferencias contra el
+    snapshot anterior (ver src/versiones_reglas.py).
+    """
     regla_actual = models.ForeignKey(
         ReglaNegocio,
         on_delete=models.CASCADE,
@@ -169,6 +178,10 @@ class HistorialReglaNegocio(models.Model):
     version = models.IntegerField()
     estado = models.CharField(max_length=20)
 
+    # Compresión: sin keyframe, los textos vacíos se reconstruyen desde delta
+    es_keyframe = models.BooleanField(default=True)
+    delta = models.JSONField(default=dict, blank=True)
+
     # Metadata del cambio
     modificado_por = models.ForeignKey(
         User,
@@ -186,6 +199,19 @@ class HistorialReglaNegocio(models.Model):
         return f"{self.nombre} v{self.version} (snapshot {self.fecha_snapshot.strftime('%Y-%m-%d %H:%M')})"
 
 
+class VersionReglas(models.Model):
+    """
+    Contador global de cambios en reglas de negocio (fila única, id=1).
+    Cada proceso compara este contador con el de su caché de reglas
+    (src/cache_reglas.py) y solo recarga cuando cambió.
+    """
+    contador = models.BigIntegerField(default=0)
+    fecha_modificacion = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Reglas v{self.contador}"
+
+
 # ===============================
 # CERTIFICADOS
 # ===============================
@@ -297,20 +323,240 @@ class Auditoria(models.Model):
     modelo = models.CharField(max_length=100)
     objeto_id = models.PositiveIntegerField(null=True, blank=True)
     descripcion = models.TextField()
-    fecha = models.DateTimeField(auto_now_add=True)
+    # default en lugar de auto_now_add: la fecha debe existir antes del
+    # INSERT porque forma parte del hash de la fila
+    fecha = models.DateTimeField(default=timezone.now, editable=False)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     metadatos = models.JSONField(default=dict, blank=True)
 
+    # Cadena de integridad (ver src/integridad_auditoria.py)
+    hash_anterior = models.CharField(max_length=64, blank=True, default="", editable=False)
+    hash = models.CharField(max_length=64, blank=True, default="", editable=False)
+
     class Meta:
         ordering = ['-fecha']
         indexes = [
             models.Index(fields=['usuario', 'fecha']),
             models.Index(fields=['accion', 'modelo']),
+            # BRIN: la tabla es append-only y fecha crece con el id físico,
+            # así que un índice de rangos de bloques cubre los filtros por fecha
+            # ocupando una fracción del tamaño de un btree
+            BrinIndex(fields=['fecha'], name='auditoria_fecha_brin'),
+            # Btree (fecha, id): orden total para la paginación por cursor (keyset)
+            models.Index(fields=['fecha', 'id'], name='auditoria_fecha_id_idx'),
+            # Compuestos con columnas INCLUDE para index-only scans en reportes
+            models.Index(fields=['accion', 'fecha'], include=['modelo', 'rol'], name='auditoria_accion_fecha_idx'),
+            models.Index(fields=['modelo', 'objeto_id'], include=['fecha', 'accion'], name='auditoria_modelo_obj_idx'),
+            models.Index(fields=['rol', 'fecha'], include=['accion'], name='auditoria_rol_fecha_idx'),
         ]
 
+    def save(self, *args, **kwargs):
+        # Las filas nuevas se encadenan al hash de la fila anterior
+        if self._state.adding:
+            from src.integridad_auditoria import guardar_encadenado
+            return guardar_encadenado(self, super().save, *args, **kwargs)
+        return super().save(*args, **kwargs)
+
     def __str__(self):
         return f"[{self.fecha}] {self.accion} - {self.modelo}"
 
+
+# ===============================
+# PURGA DE AUDITORÍA POR LOTES
+# ===============================
+class TareaPurga(models.Model):
+    """
+    Purga de auditoría en segundo plano, por lotes ordenados por PK.
+    Guarda un checkpoint (ultimo_id) tras cada lote para poder reanudar.
+    """
+    ESTADO_CHOICES = [
+        ("PENDIENTE", "Pendiente"),
+        ("EN_CURSO", "En curso"),
+        ("COMPLETADA", "Completada"),
+        ("FALLIDA", "Fallida"),
+    ]
+
+    fecha_limite = models.DateTimeField(help_text="Se eliminan registros anteriores a esta fecha")
+    dias = models.PositiveIntegerField()
+    tamanio_lote = models.PositiveIntegerField(default=5000)
+    pausa_ms = models.PositiveIntegerField(default=250)
+
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default="PENDIENTE")
+
+    # Checkpoint y progreso
+    id_maximo = models.BigIntegerField(null=True, blank=True)
+    ultimo_id = models.BigIntegerField(default=0)
+    eliminados = models.BigIntegerField(default=0)
+    total_estimado = models.BigIntegerField(default=0)
+    lotes = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    solicitado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="tareas_purga"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+        constraints = [
+            # Una sola purga activa a la vez, aunque dos solicitudes lleguen juntas
+            models.UniqueConstraint(
+                models.Value(True),
+                condition=models.Q(estado__in=["PENDIENTE", "EN_CURSO"]),
+                name="tareapurga_una_activa",
+            ),
+        ]
+
+    def progreso(self):
+        """Porcentaje aproximado completado"""
+        if self.estado == "COMPLETADA":
+            return 100.0
+        if not self.total_estimado:
+            return 0.0
+        return round(min(self.eliminados / self.total_estimado * 100, 99.9), 1)
+
+    def __str__(self):
+        return f"Purga {self.id} ({self.estado}) - {self.eliminados} eliminados"
+
+
+# ===============================
+# EXPORTACIONES EN SEGUNDO PLANO
+# ===============================
+class TareaExportacion(models.Model):
+    """
+    Exportación de calificaciones generada fuera del request.
+    El archivo queda en MEDIA_ROOT/exports/ y se reutiliza mientras no
+    expire y los datos filtrados no cambien (misma clave).
+    """
+    ESTADO_CHOICES = [
+        ("PENDIENTE", "Pendiente"),
+        ("EN_CURSO", "En curso"),
+        ("COMPLETADA", "Completada"),
+        ("FALLIDA", "Fallida"),
+        ("EXPIRADA", "Expirada"),
+    ]
+
+    formato = models.CharField(max_length=10)
+    parametros = models.JSONField(default=dict, help_text="Filtros de la exportación (query params normalizados)")
+    version_datos = models.CharField(max_length=100, blank=True)
+    clave = models.CharField(max_length=64, db_index=True, help_text="sha256 de formato + filtros + versión de datos")
+
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default="PENDIENTE")
+
+    # Artefacto (ruta relativa a MEDIA_ROOT)
+    archivo = models.CharField(max_length=255, blank=True)
+    tamanio = models.BigIntegerField(default=0)
+    filas = models.BigIntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    solicitado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="tareas_exportacion"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    expira_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Exportación {self.id} ({self.formato}, {self.estado})"
+
+
+class SimulacionRegla(models.Model):
+    """
+    Simulación de una regla en varios procesos, ejecutada fuera del request
+    (src/simulacion_reglas.py). El resultado queda en `resultado`.
+    """
+    ESTADO_CHOICES = [
+        ("EN_CURSO", "En curso"),
+        ("COMPLETADA", "Completada"),
+        ("FALLIDA", "Fallida"),
+    ]
+
+    condicion = models.TextField()
+    regla = models.ForeignKey(
+        'ReglaNegocio',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="simulaciones"
+    )
+    parametros = models.JSONField(default=dict, help_text="muestra, procesos y estado")
+
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default="EN_CURSO")
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    solicitado_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="simulaciones_reglas"
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_creacion']
+
+    def __str__(self):
+        return f"Simulación {self.id} ({self.estado})"
+
+
+class VerificacionAuditoria(models.Model):
+    """
+    Ejecución de la verificación de la cadena de hashes de Auditoria.
+    La última verificación OK es el checkpoint desde donde parte la siguiente.
+    """
+    ESTADO_CHOICES = [
+        ("EN_CURSO", "En curso"),
+        ("OK", "Cadena íntegra"),
+        ("FALLIDA", "Cadena rota"),
+    ]
+
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default="EN_CURSO")
+    completa = models.BooleanField(default=False, help_text="Recorrió la tabla completa en lugar de partir del checkpoint")
+
+    # Tramo verificado: (desde_id, hasta_id]
+    desde_id = models.BigIntegerField(default=0)
+    hasta_id = models.BigIntegerField(default=0)
+    ultimo_hash = models.CharField(max_length=64, blank=True)
+    filas_verificadas = models.BigIntegerField(default=0)
+    filas_legado = models.BigIntegerField(default=0, help_text="Filas anteriores a la cadena (sin hash)")
+
+    id_fallido = models.BigIntegerField(null=True, blank=True)
+    motivo = models.TextField(blank=True)
+
+    ejecutada_por = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="verificaciones_auditoria"
+    )
+    fecha_inicio = models.DateTimeField(auto_now_add=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-fecha_inicio']
+
+    def __str__(self):
+        return f"Verificación {self.id} ({self.estado}) hasta id {self.hasta_id}"
+
+
 class Feedback(models.Model):
     """Retroalimentación general del sistema"""
     usuario = models.ForeignKey(
@@ -8,6 +8,14 @@ from pymongo.errors import OperationFailure
 from django.conf import settings
 from bson.objectid import ObjectId
 
+# Flujo de estados de una calificación en Mongo (ELIMINADA es el borrado lógico, fuera del flujo)
+TRANSICIONES_ESTADO = {
+    'BORRADOR': ['PENDIENTE'],
+    'PENDIENTE': ['APROBADA', 'OBSERVADA', 'RECHAZADA'],
+    'OBSERVADA': ['BORRADOR', 'PENDIENTE'],
+}
+ESTADOS_CALIFICACION = ('BORRADOR', 'PENDIENTE', 'APROBADA', 'OBSERVADA', 'RECHAZADA')
+
 
 class MongoDBConnection:
     """Singleton para conexión MongoDB"""
@@ -114,6 +122,8 @@ class CalificacionMongo:
         # Índice compuesto para consultas frecuentes
         self.collection.create_index([('usuario_id', 1), ('estado', 1)])
         self.collection.create_index([('registro_id', 1), ('estado', 1)])
+        # Versión de datos de las exportaciones (máxima fecha_actualizacion)
+        self.collection.create_index('fecha_actualizacion')
 
     def crear(self, data):
         """
@@ -127,8 +137,10 @@ class CalificacionMongo:
 
         ahora = datetime.utcnow()
         estado_inicial = data.get('estado', 'BORRADOR')
+        # Transiciones aplicadas por reglas de negocio antes de crear (motor_reglas.aplicar_efectos)
+        transiciones = data.get('historial_estados', [])
         historial_estado = {
-            'estado': estado_inicial,
+            'estado': transiciones[0]['estado_anterior'] if transiciones else estado_inicial,
             'usuario': data.get('creado_por_id') or data.get('usuario_id'),
             'timestamp': ahora,
             'comentario': 'Creación'
@@ -148,10 +160,13 @@ class CalificacionMongo:
             'comentario': data.get('comentario', ''),
             'documentos': data.get('documentos', []),
             'ocr_resultados': data.get('ocr_resultados', []),
+            'reglas_aplicadas': data.get('reglas_aplicadas', []),  # Motor de reglas
+            'alertas': data.get('alertas', []),
+            'solicitar_auditoria': bool(data.get('solicitar_auditoria', False)),
             'fecha_creacion': ahora,
             'fecha_actualizacion': ahora,
             'historial': [],
-            'historial_estados': [historial_estado]
+            'historial_estados': [historial_estado, *transiciones]
         }
 
         result = self.collection.insert_one(documento)
@@ -178,9 +193,10 @@ class CalificacionMongo:
 
         return list(self.collection.find(query).sort('fecha_creacion', -1))
 
-    def actualizar(self, calificacion_id, data, usuario_modificador):
+    def actualizar(self, calificacion_id, data, usuario_modificador, transiciones=None):
         """
-        Actualizar calificación con historial de cambios
+        Actualizar calificación con historial de cambios.
+        transiciones: entradas para historial_estados (cambios de estado de reglas)
         """
         doc_actual = self.obtener_por_id(calificacion_id)
         if not doc_actual:
@@ -202,6 +218,8 @@ class CalificacionMongo:
                 'historial': historial_entry
             }
         }
+        if transiciones:
+            update_data['$push']['historial_estados'] = {'$each': transiciones}
 
         result = self.collection.update_one(
             {'_id': ObjectId(calificacion_id)},
@@ -212,9 +230,10 @@ class CalificacionMongo:
 
     def eliminar(self, calificacion_id):
         """Eliminar calificación (soft delete)"""
+        ahora = datetime.utcnow()
         result = self.collection.update_one(
             {'_id': ObjectId(calificacion_id)},
-            {'$set': {'estado': 'ELIMINADA', 'fecha_eliminacion': datetime.utcnow()}}
+            {'$set': {'estado': 'ELIMINADA', 'fecha_eliminacion': ahora, 'fecha_actualizacion': ahora}}
         )
         return result.modified_count > 0
 
@@ -225,13 +244,7 @@ class CalificacionMongo:
             return False, "Calificación no encontrada"
 
         estado_actual = doc_actual.get('estado')
-        transiciones_permitidas = {
-            'BORRADOR': ['PENDIENTE'],
-            'PENDIENTE': ['APROBADA', 'OBSERVADA', 'RECHAZADA'],
-            'OBSERVADA': ['BORRADOR', 'PENDIENTE'],
-        }
-
-        if nuevo_estado not in transiciones_permitidas.get(estado_actual, []):
+        if nuevo_estado not in TRANSICIONES_ESTADO.get(estado_actual, []):
             return False, f"Transición {estado_actual} -> {nuevo_estado} no permitida"
 
         historial_estado = {
@@ -0,0 +1,802 @@
+"""
+Motor de reglas de negocio (ReglaNegocio.condicion / ReglaNegocio.accion).
+
+Lenguaje de expresiones pequeño y seguro (sin eval):
+
+    condicion:  monto > 1000000 AND periodo == '2025'
+                tipo_certificado IN ('AFP', 'APV') OR NOT existe(rut)
+                monto BETWEEN 100 AND 5000 && detalles.factor >= 0.5
+    accion:     asignar_estado('OBSERVADA')
+                observar('Monto fuera de rango'); alerta('Revisar RUT')
+
+La condición se parsea una sola vez a un AST de tuplas y se compila a
+closures de Python. Los compilados se cachean por (id, version) de la regla,
+así que evaluar un documento cuesta unos pocos microsegundos por regla.
+
+AST (tuplas, hashables):
+    ('lit', valor)                    ('campo', ('detalles', 'factor'))
+    ('func', nombre, (args...))       ('arit', op, a, b) / ('neg', a)
+    ('cmp', op, a, b)                 ('in', a, (valores...))
+    ('and', (hijos...)) / ('or', (hijos...)) / ('not', hijo) / ('bool', a)
+"""
+import logging
+import operator
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from django.utils import timezone
+
+from src.mongodb_utils import ESTADOS_CALIFICACION, TRANSICIONES_ESTADO
+
+logger = logging.getLogger(__name__)
+
+
+class ReglaInvalida(Exception):
+    """Error de sintaxis o semántica en la condición/acción de una regla"""
+
+    def __init__(self, mensaje, posicion=None):
+        if posicion is not None:
+            mensaje = f"{mensaje} (posición {posicion})"
+        super().__init__(mensaje)
+        self.posicion = posicion
+
+
+# ===============================
+# TOKENIZADOR
+# ===============================
+_TOKEN = re.compile(r"""
+    (?P<espacio>\s+)
+  | (?P<numero>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<texto>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<nombre>[^\W\d]\w*)
+  | (?P<op>==|!=|<>|<=|>=|&&|\|\||[<>=!()\[\],.;+\-*/%])
+""", re.VERBOSE)
+
+_PALABRAS = {
+    'and': 'AND', 'or': 'OR', 'not': 'NOT', 'in': 'IN', 'between': 'BETWEEN',
+    'true': 'TRUE', 'false': 'FALSE', 'null': 'NULL', 'none': 'NULL',
+}
+_SIMBOLOS = {'&&': 'AND', '||': 'OR', '!': 'NOT', '=': '==', '<>': '!='}
+
+
+def _tokenizar(texto):
+    tokens = []
+    posicion = 0
+    while posicion < len(texto):
+        match = _TOKEN.match(texto, posicion)
+        if not match:
+            raise ReglaInvalida(f"Carácter inesperado '{texto[posicion]}'", posicion)
+        tipo = match.lastgroup
+        valor = match.group()
+        if tipo == 'numero':
+            valor = float(valor) if any(c in valor for c in '.eE') else int(valor)
+            tokens.append(('lit', valor, posicion))
+        elif tipo == 'texto':
+            crudo = valor[1:-1]
+            tokens.append(('lit', re.sub(r"\\(.)", r"\1", crudo), posicion))
+        elif tipo == 'nombre':
+            palabra = _PALABRAS.get(valor.lower())
+            if palabra in ('TRUE', 'FALSE', 'NULL'):
+                tokens.append(('lit', {'TRUE': True, 'FALSE': False, 'NULL': None}[palabra], posicion))
+            elif palabra:
+                tokens.append((palabra, valor, posicion))
+            else:
+                tokens.append(('nombre', valor, posicion))
+        elif tipo == 'op':
+            tokens.append((_SIMBOLOS.get(valor, valor), valor, posicion))
+        posicion = match.end()
+    tokens.append(('fin', None, len(texto)))
+    return tokens
+
+
+# ===============================
+# PARSER (descenso recursivo)
+# ===============================
+_COMPARADORES = ('==', '!=', '<', '<=', '>', '>=')
+_INVERSO = {'<': '>', '<=': '>=', '>': '<', '>=': '<=', '==': '==', '!=': '!='}
+
+# nombre -> cantidad de argumentos
+FUNCIONES = {
+    'existe': 1,
+    'largo': 1,
+    'contiene': 2,
+    'empieza_con': 2,
+    'termina_con': 2,
+}
+
+
+class _Parser:
+    def __init__(self, texto):
+        self.tokens = _tokenizar(texto)
+        self.i = 0
+
+    @property
+    def actual(self):
+        return self.tokens[self.i]
+
+    def _avanzar(self):
+        token = self.tokens[self.i]
+        self.i += 1
+        return token
+
+    def _esperar(self, tipo, descripcion=None):
+        if self.actual[0] != tipo:
+            raise ReglaInvalida(f"Se esperaba {descripcion or tipo}", self.actual[2])
+        return self._avanzar()
+
+    def _es(self, *tipos):
+        return self.actual[0] in tipos
+
+    # --- condición ---
+    def condicion(self):
+        nodo = self._o()
+        if not self._es('fin'):
+            raise ReglaInvalida(f"Símbolo inesperado '{self.actual[1]}'", self.actual[2])
+        return nodo
+
+    def _o(self):
+        hijos = [self._y()]
+        while self._es('OR'):
+            self._avanzar()
+            hijos.append(self._y())
+        return _agrupar('or', hijos)
+
+    def _y(self):
+        hijos = [self._no()]
+        while self._es('AND'):
+            self._avanzar()
+            hijos.append(self._no())
+        return _agrupar('and', hijos)
+
+    def _no(self):
+        if self._es('NOT'):
+            self._avanzar()
+            return _negar(self._no())
+        return self._comparacion()
+
+    def _comparacion(self):
+        izquierda = self._suma()
+
+        if self._es(*_COMPARADORES):
+            op = self._avanzar()[0]
+            return _comparar(op, izquierda, self._suma())
+
+        negado = False
+        if self._es('NOT') and self.tokens[self.i + 1][0] in ('IN', 'BETWEEN'):
+            self._avanzar()
+            negado = True
+
+        if self._es('IN'):
+            self._avanzar()
+            nodo = ('in', izquierda, self._lista())
+            return _negar(nodo) if negado else nodo
+
+        if self._es('BETWEEN'):
+            self._avanzar()
+            minimo = self._suma()
+            self._esperar('AND', "AND en BETWEEN")
+            maximo = self._suma()
+            nodo = _agrupar('and', [_comparar('>=', izquierda, minimo), _comparar('<=', izquierda, maximo)])
+            return _negar(nodo) if negado else nodo
+
+        if izquierda[0] in ('cmp', 'and', 'or', 'not', 'in', 'bool'):
+            return izquierda
+        return ('bool', izquierda)
+
+    def _lista(self):
+        cierre = {'(': ')', '[': ']'}.get(self.actual[0])
+        if not cierre:
+            raise ReglaInvalida("Se esperaba una lista después de IN", self.actual[2])
+        self._avanzar()
+        valores = []
+        while True:
+            negativo = self._es('-') and self._avanzar()
+            token = self._esperar('lit', "un literal en la lista")
+            if negativo and not _es_numero(token[1]):
+                raise ReglaInvalida("Se esperaba un número después de '-'", token[2])
+            valores.append(-token[1] if negativo else token[1])
+            if self._es(','):
+                self._avanzar()
+                continue
+            self._esperar(cierre, f"'{cierre}'")
+            return tuple(valores)
+
+    def _suma(self):
+        nodo = self._termino()
+        while self._es('+', '-'):
+            op = self._avanzar()[0]
+            nodo = _aritmetica(op, nodo, self._termino())
+        return nodo
+
+    def _termino(self):
+        nodo = self._unario()
+        while self._es('*', '/', '%'):
+            op = self._avanzar()[0]
+            nodo = _aritmetica(op, nodo, self._unario())
+        return nodo
+
+    def _unario(self):
+        if self._es('-'):
+            self._avanzar()
+            nodo = self._unario()
+            if nodo[0] == 'lit' and _es_numero(nodo[1]):
+                return ('lit', -nodo[1])
+            return ('neg', nodo)
+        return self._primario()
+
+    def _primario(self):
+        tipo, valor, posicion = self.actual
+
+        if tipo == 'lit':
+            self._avanzar()
+            return ('lit', valor)
+
+        if tipo == '(':
+            self._avanzar()
+            nodo = self._o()
+            self._esperar(')', "')'")
+            return nodo
+
+        if tipo == 'nombre':
+            self._avanzar()
+            if self._es('('):
+                return self._funcion(valor, posicion)
+            ruta = [valor]
+            while self._es('.'):
+                self._avanzar()
+                ruta.append(self._esperar('nombre', "un nombre de campo")[1])
+            return ('campo', tuple(ruta))
+
+        raise ReglaInvalida(f"Símbolo inesperado '{valor if valor is not None else 'fin de texto'}'", posicion)
+
+    def _funcion(self, nombre, posicion):
+        if nombre not in FUNCIONES:
+            raise ReglaInvalida(f"Función desconocida '{nombre}'", posicion)
+        self._esperar('(')
+        argumentos = []
+        if not self._es(')'):
+            argumentos.append(self._suma())
+            while self._es(','):
+                self._avanzar()
+                argumentos.append(self._suma())
+        self._esperar(')', "')'")
+        if len(argumentos) != FUNCIONES[nombre]:
+            raise ReglaInvalida(f"{nombre}() recibe {FUNCIONES[nombre]} argumento(s)", posicion)
+        return ('func', nombre, tuple(argumentos))
+
+    # --- acción ---
+    def acciones(self):
+        acciones = []
+        while not self._es('fin'):
+            tipo, nombre, posicion = self._esperar('nombre', "el nombre de una acción")
+            if nombre not in ACCIONES:
+                raise ReglaInvalida(f"Acción desconocida '{nombre}'", posicion)
+            self._esperar('(')
+            argumentos = []
+            if not self._es(')'):
+                argumentos.append(self._esperar('lit', "un literal como argumento")[1])
+                while self._es(','):
+                    self._avanzar()
+                    argumentos.append(self._esperar('lit', "un literal como argumento")[1])
+            self._esperar(')', "')'")
+
+            minimo, maximo = ACCIONES[nombre]
+            if not minimo <= len(argumentos) <= maximo:
+                raise ReglaInvalida(f"{nombre}() recibe entre {minimo} y {maximo} argumento(s)", posicion)
+            acciones.append((nombre, tuple(argumentos)))
+
+            while self._es(';', ',', 'AND'):
+                self._avanzar()
+
+        if not acciones:
+            raise ReglaInvalida("La acción está vacía")
+        return tuple(acciones)
+
+
+def _es_numero(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+def _agrupar(tipo, hijos):
+    """and/or aplanados: (a AND (b AND c)) -> and(a, b, c)"""
+    if len(hijos) == 1:
+        return hijos[0]
+    planos = []
+    for hijo in hijos:
+        planos.extend(hijo[1] if hijo[0] == tipo else (hijo,))
+    return (tipo, tuple(planos))
+
+
+def _negar(nodo):
+    if nodo[0] == 'not':
+        return nodo[1]
+    return ('not', nodo)
+
+
+def _comparar(op, izquierda, derecha):
+    """Forma normal: el literal siempre a la derecha (1000 < monto -> monto > 1000)"""
+    if izquierda[0] == 'lit' and derecha[0] != 'lit':
+        return ('cmp', _INVERSO[op], derecha, izquierda)
+    return ('cmp', op, izquierda, derecha)
+
+
+def _aritmetica(op, izquierda, derecha):
+    return ('arit', op, izquierda, derecha)
+
+
+def parsear_condicion(texto):
+    if not texto or not texto.strip():
+        raise ReglaInvalida("La condición está vacía")
+    return _Parser(texto).condicion()
+
+
+def parsear_accion(texto):
+    if not texto or not texto.strip():
+        raise ReglaInvalida("La acción está vacía")
+    return _Parser(texto).acciones()
+
+
+# ===============================
+# COMPILACIÓN A CLOSURES
+# ===============================
+_OPERADORES = {
+    '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '+': operator.add, '-': operator.sub, '*': operator.mul,
+    '/': operator.truediv, '%': operator.mod,
+}
+_NUMERICOS = (int, float)
+
+
+def a_numero(valor):
+    """Número o None: acepta números, Decimal y textos numéricos ('1500.5')"""
+    clase = valor.__class__
+    if clase is int or clase is float:
+        return valor
+    if clase is str:
+        try:
+            return float(valor.replace(',', '.')) if valor.strip() else None
+        except ValueError:
+            return None
+    if clase is Decimal:
+        return float(valor)
+    return None
+
+
+def a_texto(valor):
+    """Texto comparable: 2025 y 2025.0 -> '2025'"""
+    clase = valor.__class__
+    if clase is str:
+        return valor
+    if clase is float and valor.is_integer():
+        return str(int(valor))
+    if clase is int or clase is float:
+        return str(valor)
+    if isinstance(valor, datetime):
+        return valor.isoformat()
+    return None if valor is None else str(valor)
+
+
+def compilar_campo(ruta):
+    if len(ruta) == 1:
+        clave = ruta[0]
+        return lambda doc: doc.get(clave)
+
+    def obtener(doc):
+        valor = doc
+        for clave in ruta:
+            if not isinstance(valor, dict):
+                return None
+            valor = valor.get(clave)
+        return valor
+    return obtener
+
+
+def _compilar_valor(nodo):
+    tipo = nodo[0]
+
+    if tipo == 'lit':
+        valor = nodo[1]
+        return lambda doc: valor
+
+    if tipo == 'campo':
+        return compilar_campo(nodo[1])
+
+    if tipo == 'neg':
+        interno = _compilar_valor(nodo[1])
+
+        def negativo(doc):
+            valor = a_numero(interno(doc))
+            return None if valor is None else -valor
+        return negativo
+
+    if tipo == 'arit':
+        op = _OPERADORES[nodo[1]]
+        izquierda, derecha = _compilar_valor(nodo[2]), _compilar_valor(nodo[3])
+
+        def aritmetica(doc):
+            a, b = a_numero(izquierda(doc)), a_numero(derecha(doc))
+            if a is None or b is None:
+                return None
+            try:
+                return op(a, b)
+            except ZeroDivisionError:
+                return None
+        return aritmetica
+
+    if tipo == 'func':
+        return _compilar_funcion(nodo[1], [_compilar_valor(a) for a in nodo[2]])
+
+    # Expresión booleana usada como valor (p. ej. dentro de paréntesis)
+    return compilar_booleano(nodo)
+
+
+def _compilar_funcion(nombre, argumentos):
+    if nombre == 'existe':
+        (campo,) = argumentos
+        return lambda doc: campo(doc) not in (None, '')
+
+    if nombre == 'largo':
+        (campo,) = argumentos
+
+        def largo(doc):
+            valor = campo(doc)
+            return len(valor) if isinstance(valor, (str, list, dict)) else 0
+        return largo
+
+    a, b = argumentos
+
+    if nombre == 'contiene':
+        def contiene(doc):
+            contenedor, buscado = a(doc), b(doc)
+            if isinstance(contenedor, str):
+                buscado = a_texto(buscado)
+                return buscado is not None and buscado in contenedor
+            if isinstance(contenedor, (list, dict)):
+                return buscado in contenedor
+            return False
+        return contiene
+
+    metodo = str.startswith if nombre == 'empieza_con' else str.endswith
+
+    def prefijo_sufijo(doc):
+        texto, parte = a_texto(a(doc)), a_texto(b(doc))
+        return texto is not None and parte is not None and metodo(texto, parte)
+    return prefijo_sufijo
+
+
+def _compilar_comparacion(op_txt, izquierda_nodo, derecha_nodo):
+    op = _OPERADORES[op_txt]
+    izquierda = _compilar_valor(izquierda_nodo)
+
+    if derecha_nodo[0] == 'lit':
+        literal = derecha_nodo[1]
+
+        # NULL: solo tienen sentido == y !=
+        if literal is None:
+            if op_txt == '==':
+                return lambda doc: izquierda(doc) is None
+            if op_txt == '!=':
+                return lambda doc: izquierda(doc) is not None
+            return lambda doc: False
+
+        # Literal numérico: los textos numéricos del documento se convierten
+        if _es_numero(literal):
+            def comparar_numero(doc):
+                valor = izquierda(doc)
+                if valor.__class__ not in _NUMERICOS:
+                    valor = a_numero(valor)
+                    if valor is None:
+                        return op_txt == '!='
+                return op(valor, literal)
+            return comparar_numero
+
+        # Literal de texto: los números del documento se comparan como texto
+        if isinstance(literal, str):
+            def comparar_texto(doc):
+                valor = izquierda(doc)
+                if valor.__class__ is not str:
+                    valor = a_texto(valor)
+                    if valor is None:
+                        return op_txt == '!='
+                return op(valor, literal)
+            return comparar_texto
+
+        return lambda doc: op(izquierda(doc), literal)
+
+    derecha = _compilar_valor(derecha_nodo)
+
+    def comparar(doc):
+        a, b = izquierda(doc), derecha(doc)
+        if a.__class__ is not b.__class__:
+            if _es_numero(a) or _es_numero(b):
+                a, b = a_numero(a), a_numero(b)
+            elif isinstance(a, str) or isinstance(b, str):
+                a, b = a_texto(a), a_texto(b)
+        if a is None or b is None:
+            return op(a, b) if op_txt in ('==', '!=') else False
+        try:
+            return op(a, b)
+        except TypeError:
+            return False
+    return comparar
+
+
+def compilar_booleano(nodo):
+    tipo = nodo[0]
+
+    if tipo == 'and':
+        hijos = tuple(compilar_booleano(h) for h in nodo[1])
+        if len(hijos) == 2:
+            a, b = hijos
+            return lambda doc: a(doc) and b(doc)
+        return lambda doc: all(h(doc) for h in hijos)
+
+    if tipo == 'or':
+        hijos = tuple(compilar_booleano(h) for h in nodo[1])
+        if len(hijos) == 2:
+            a, b = hijos
+            return lambda doc: a(doc) or b(doc)
+        return lambda doc: any(h(doc) for h in hijos)
+
+    if tipo == 'not':
+        interno = compilar_booleano(nodo[1])
+        return lambda doc: not interno(doc)
+
+    if tipo == 'cmp':
+        return _compilar_comparacion(nodo[1], nodo[2], nodo[3])
+
+    if tipo == 'in':
+        valor = _compilar_valor(nodo[1])
+        conjunto = frozenset(nodo[2])
+        textos = frozenset(a_texto(v) for v in nodo[2] if v is not None)
+
+        def pertenece(doc):
+            actual = valor(doc)
+            try:
+                if actual in conjunto:
+                    return True
+            except TypeError:  # no hashable (listas, dicts)
+                return False
+            return a_texto(actual) in textos if actual is not None else False
+        return pertenece
+
+    if tipo == 'bool':
+        valor = _compilar_valor(nodo[1])
+        return lambda doc: bool(valor(doc))
+
+    if tipo == 'lit':
+        constante = bool(nodo[1])
+        return lambda doc: constante
+
+    # campo/func/arit usados directamente como condición
+    valor = _compilar_valor(nodo)
+    return lambda doc: bool(valor(doc))
+
+
+def compilar_condicion(texto):
+    """Parsea y compila una condición: retorna (ast, funcion(doc) -> bool)"""
+    ast = parsear_condicion(texto)
+    return ast, compilar_booleano(ast)
+
+
+# ===============================
+# ACCIONES
+# ===============================
+# nombre -> (mínimo, máximo) de argumentos
+ACCIONES = {
+    'asignar_estado': (1, 1),
+    'observar': (0, 1),
+    'alerta': (1, 1),
+    'marcar_auditoria': (0, 0),
+}
+
+
+def validar_regla(condicion, accion):
+    """Lanza ReglaInvalida si la condición o la acción no son válidas"""
+    try:
+        compilar_condicion(condicion)
+    except ReglaInvalida as exc:
+        raise ReglaInvalida(f"Condición: {exc}") from exc
+    try:
+        acciones = parsear_accion(accion)
+    except ReglaInvalida as exc:
+        raise ReglaInvalida(f"Acción: {exc}") from exc
+    for nombre, argumentos in acciones:
+        if nombre == 'asignar_estado' and argumentos[0] not in ESTADOS_CALIFICACION:
+            raise ReglaInvalida(
+                f"Acción: estado '{argumentos[0]}' desconocido, debe ser uno de: {', '.join(ESTADOS_CALIFICACION)}"
+            )
+
+
+# Campos del documento que pueden cambiar al aplicar reglas
+CAMPOS_EFECTO = ('estado', 'comentario', 'alertas', 'reglas_aplicadas', 'solicitar_auditoria')
+
+
+def aplicar_efectos(documento, coincidencias):
+    """
+    Aplica sobre el documento (dict) las acciones de las reglas que
+    coincidieron, en orden de id: si dos reglas asignan estado, gana la última.
+    alertas y reglas_aplicadas reflejan siempre la última evaluación.
+
+    Un cambio de estado respeta TRANSICIONES_ESTADO desde el estado con que
+    llegó el documento: una transición no permitida no se aplica y queda
+    como alerta. La transición aplicada se agrega a historial_estados.
+    """
+    ahora = timezone.now()
+    estado_inicial = documento.get('estado')
+    estado = None
+    regla_estado = None
+    alertas = []
+    aplicadas = []
+    for regla in coincidencias:
+        for nombre, argumentos in regla.acciones:
+            if nombre in ('asignar_estado', 'observar'):
+                nuevo = argumentos[0] if nombre == 'asignar_estado' else 'OBSERVADA'
+                if nuevo == estado_inicial or nuevo in TRANSICIONES_ESTADO.get(estado_inicial, []):
+                    estado, regla_estado = nuevo, regla
+                else:
+                    alertas.append({
+                        'regla_id': regla.id,
+                        'mensaje': f"Transición {estado_inicial} -> {nuevo} no permitida; estado sin cambios",
+                    })
+                if nombre == 'observar' and argumentos:
+                    documento['comentario'] = argumentos[0]
+            elif nombre == 'alerta':
+                alertas.append({'regla_id': regla.id, 'mensaje': argumentos[0]})
+            elif nombre == 'marcar_auditoria':
+                documento['solicitar_auditoria'] = True
+
+        aplicadas.append({
+            'regla_id': regla.id,
+            'version': regla.version,
+            'nombre': regla.nombre,
+            'accion': regla.accion_texto,
+            'fecha': ahora,
+        })
+
+    if estado is not None and estado != estado_inicial:
+        documento['estado'] = estado
+        documento['historial_estados'] = [*documento.get('historial_estados', []), {
+            'estado': estado,
+            'estado_anterior': estado_inicial,
+            'usuario': 'REGLAS',
+            'timestamp': ahora,
+            'comentario': f"Regla {regla_estado.id} '{regla_estado.nombre}' v{regla_estado.version}",
+        }]
+    documento['alertas'] = alertas
+    documento['reglas_aplicadas'] = aplicadas
+    return documento
+
+
+# ===============================
+# REGLAS COMPILADAS Y CACHÉ
+# ===============================
+class ReglaCompilada:
+    """Regla lista para evaluar: evaluar(doc) -> bool, acciones como tuplas"""
+    __slots__ = ('id', 'version', 'nombre', 'condicion_texto', 'accion_texto', 'ast', 'evaluar', 'acciones')
+
+    def __init__(self, regla, ast, evaluar, acciones):
+        self.id = regla.id
+        self.version = regla.version
+        self.nombre = regla.nombre
+        self.condicion_texto = regla.condicion
+        self.accion_texto = regla.accion
+        self.ast = ast
+        self.evaluar = evaluar
+        self.acciones = acciones
+
+    def __repr__(self):
+        return f"<ReglaCompilada {self.id} v{self.version} '{self.nombre}'>"
+
+
+# (id, version) -> (condicion, accion, ast, evaluar, acciones)
+_CACHE_MAXIMO = 1024
+_cache_compiladas = OrderedDict()
+_lock_compiladas = threading.Lock()
+
+
+def compilar_regla(regla):
+    """
+    ReglaCompilada desde un ReglaNegocio (o snapshot con los mismos campos).
+    Cacheada por (id, version); el texto se compara para detectar ediciones
+    que no incrementaron la versión.
+    """
+    clave = (regla.id, regla.version)
+    with _lock_compiladas:
+        entrada = _cache_compiladas.get(clave)
+        if entrada is not None and entrada[0] == regla.condicion and entrada[1] == regla.accion:
+            _cache_compiladas.move_to_end(clave)
+        else:
+            entrada = None
+    if entrada is None:
+        # Se compila fuera del lock; si dos hilos compilan la misma regla, gana el último
+        try:
+            ast, evaluar = compilar_condicion(regla.condicion)
+            entrada = (regla.condicion, regla.accion, ast, evaluar, parsear_accion(regla.accion))
+        except ReglaInvalida as exc:
+            # También se cachea el error: una regla inválida no se reparsea en cada evaluación
+            entrada = (regla.condicion, regla.accion, exc, None, None)
+        with _lock_compiladas:
+            _cache_compiladas[clave] = entrada
+            _cache_compiladas.move_to_end(clave)
+            if len(_cache_compiladas) > _CACHE_MAXIMO:
+                _cache_compiladas.popitem(last=False)
+
+    if entrada[3] is None:
+        raise entrada[2]
+    return ReglaCompilada(regla, entrada[2], entrada[3], entrada[4])
+
+
+class MotorReglas:
+    """
+    Conjunto de reglas compiladas sobre una red de discriminación compartida
+    (src/red_reglas.py). Construirlo una vez y reutilizarlo para muchos
+    documentos (p. ej. una carga masiva).
+    """
+
+    def __init__(self, reglas=(), red=None):
+        from src.red_reglas import RedReglas
+        if red is None:
+            red = RedReglas()
+            red.sincronizar(reglas)
+        self.red = red
+
+    @classmethod
+    def activo(cls):
+        """Motor con las reglas ACTIVAS (red compartida del proceso)"""
+        from src.red_reglas import red_activa
+        return cls(red=red_activa())
+
+    @property
+    def reglas(self):
+        return self.red.reglas
+
+    @property
+    def invalidas(self):
+        return self.red.invalidas
+
+    def evaluar(self, documento):
+        """Reglas (ReglaCompilada) cuya condición se cumple para el documento"""
+        return self.red.evaluar(documento)
+
+    def aplicar(self, documento):
+        """Evalúa y aplica los efectos sobre el documento; retorna las coincidencias"""
+        coincidencias = self.evaluar(documento)
+        aplicar_efectos(documento, coincidencias)
+        return coincidencias
+
+    def evaluar_lote(self, documentos):
+        """Evalúa muchos documentos a la vez (src/reglas_vectorizadas.py); retorna un ResultadoLote"""
+        from src.reglas_vectorizadas import NUMPY_AVAILABLE, evaluar_lote
+        resultado = evaluar_lote(self.reglas, documentos, red=self.red)
+        if self.red.perfilar and NUMPY_AVAILABLE:  # sin NumPy ya se registró documento por documento
+            from src.perfil_reglas import perfilador
+            perfilador.registrar_lote(resultado.reglas, resultado.filas, resultado.conteos())
+        return resultado
+
+    def __len__(self):
+        return len(self.red)
+
+
+def auditorias_de_reglas(coincidencias, calificacion_id, usuario=None, rol="SISTEMA"):
+    """Filas de Auditoria (sin guardar) con accion RULE por cada regla aplicada"""
+    from src.models import Auditoria
+    return [
+        Auditoria(
+            usuario=usuario,
+            rol=rol,
+            accion="RULE",
+            modelo="CalificacionMongo",
+            descripcion=f"Regla '{regla.nombre}' v{regla.version} aplicada a calificación {calificacion_id}: {regla.accion_texto}",
+            metadatos={
+                "regla_id": regla.id,
+                "version": regla.version,
+                "calificacion_id": str(calificacion_id),
+            }
+        )
+        for regla in coincidencias
+    ]
@@ -0,0 +1,282 @@
+"""
+Perfilador de la evaluación de reglas: conteos, tasa de coincidencia y
+p50/p99 del tiempo de evaluación por ReglaNegocio.
+
+La red compartida (src/red_reglas.py) evalúa todas las reglas en una sola
+pasada, así que su tiempo no se puede repartir por regla. Por eso:
+
+- Evaluaciones y coincidencias se cuentan en todos los documentos. Para no
+  recorrer todas las reglas en cada documento, se cuentan documentos por
+  plan de la red y se expanden a reglas al volcar.
+- El tiempo se mide por muestreo: 1 de cada MUESTREO documentos se evalúa
+  además regla por regla (ReglaCompilada.evaluar), midiendo el costo propio
+  de cada regla, que es lo que sirve para encontrar las caras.
+
+Los tiempos van a histogramas logarítmicos (BUCKETS_POR_OCTAVA buckets por
+potencia de 2, ~9% de error relativo) que se suman sin pérdida entre
+procesos. Cada proceso agrega en memoria y un hilo daemon lo vuelca cada
+VOLCAR_SEGUNDOS a Redis (HINCRBY sobre un hash por regla), así que ningún
+request paga el volcado; sin Redis, las métricas quedan en el proceso.
+"""
+import atexit
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+MUESTREO = 100
+VOLCAR_SEGUNDOS = 30
+BUCKETS_POR_OCTAVA = 4
+PREFIJO_REDIS = "reglas_negocio:perfil:"
+
+try:
+    import redis
+    _redis = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True, socket_timeout=0.5)
+    _redis.ping()
+    REDIS_AVAILABLE = True
+except Exception:
+    _redis = None
+    REDIS_AVAILABLE = False
+
+
+# ===============================
+# HISTOGRAMA
+# ===============================
+def bucket(nanosegundos):
+    return int(math.log2(max(nanosegundos, 1)) * BUCKETS_POR_OCTAVA)
+
+
+def valor_bucket(indice):
+    """Centro geométrico del bucket, en nanosegundos"""
+    return 2 ** ((indice + 0.5) / BUCKETS_POR_OCTAVA)
+
+
+def percentil(histograma, fraccion):
+    """Percentil (en ns) de un histograma {bucket: cantidad}; None si está vacío"""
+    total = sum(histograma.values())
+    if not total:
+        return None
+    objetivo = fraccion * total
+    acumulado = 0
+    for indice in sorted(histograma):
+        acumulado += histograma[indice]
+        if acumulado >= objetivo:
+            return valor_bucket(indice)
+    return valor_bucket(max(histograma))
+
+
+class _Metricas:
+    __slots__ = ('evaluaciones', 'coincidencias', 'muestras', 'suma_ns', 'histograma')
+
+    def __init__(self):
+        self.evaluaciones = 0
+        self.coincidencias = 0
+        self.muestras = 0
+        self.suma_ns = 0
+        self.histograma = Counter()
+
+    def sumar(self, otra):
+        self.evaluaciones += otra.evaluaciones
+        self.coincidencias += otra.coincidencias
+        self.muestras += otra.muestras
+        self.suma_ns += otra.suma_ns
+        self.histograma.update(otra.histograma)
+
+    def campos(self):
+        """Campos del hash de Redis"""
+        campos = {
+            "evaluaciones": self.evaluaciones,
+            "coincidencias": self.coincidencias,
+            "muestras": self.muestras,
+            "suma_ns": self.suma_ns,
+        }
+        campos.update({f"h{indice}": cantidad for indice, cantidad in self.histograma.items()})
+        return campos
+
+    @classmethod
+    def desde_campos(cls, campos):
+        metricas = cls()
+        for campo, valor in campos.items():
+            if campo.startswith("h"):
+                metricas.histograma[int(campo[1:])] = int(valor)
+            elif campo in cls.__slots__:
+                setattr(metricas, campo, int(valor))
+        return metricas
+
+
+# ===============================
+# PERFILADOR (por proceso)
+# ===============================
+class Perfilador:
+    def __init__(self, muestreo=MUESTREO, volcar_cada=VOLCAR_SEGUNDOS):
+        self.muestreo = muestreo
+        self.volcar_cada = volcar_cada
+        self._lock = threading.Lock()
+        self._documentos = 0
+        self._hilo_pid = None                   # proceso donde corre el hilo de volcado
+        self._reiniciar_pendiente()
+        self._local = defaultdict(_Metricas)    # acumulado cuando no hay Redis
+
+    def _reiniciar_pendiente(self):
+        self._por_plan = Counter()              # plan -> documentos evaluados
+        self._pendiente = defaultdict(_Metricas)
+
+    # --- registro ---
+    def registrar(self, plan, documento, coincidencias):
+        """Un documento evaluado por la red (`plan` = _Plan usado)"""
+        self._iniciar_volcado()
+        with self._lock:
+            self._documentos += 1
+            self._por_plan[plan] += 1
+            for regla in coincidencias:
+                self._pendiente[regla.id].coincidencias += 1
+            muestrear = self.muestreo and self._documentos % self.muestreo == 0
+        if muestrear:
+            self._medir(plan, documento)
+
+    def registrar_lote(self, reglas, filas, conteos):
+        """Un lote evaluado en forma vectorizada (src/reglas_vectorizadas.py)"""
+        self._iniciar_volcado()
+        with self._lock:
+            for regla in reglas:
+                metricas = self._pendiente[regla.id]
+                metricas.evaluaciones += filas
+                metricas.coincidencias += conteos.get(regla.id, 0)
+
+    def _medir(self, plan, documento):
+        """Costo propio de cada regla sobre un documento de muestra"""
+        tiempos = []
+        reloj = time.perf_counter_ns
+        for _, _, regla in plan.reglas:
+            inicio = reloj()
+            try:
+                regla.evaluar(documento)
+            except Exception:
+                pass  # los errores ya se registran en la evaluación normal
+            tiempos.append((regla.id, reloj() - inicio))
+        with self._lock:
+            for regla_id, nanosegundos in tiempos:
+                metricas = self._pendiente[regla_id]
+                metricas.muestras += 1
+                metricas.suma_ns += nanosegundos
+                metricas.histograma[bucket(nanosegundos)] += 1
+
+    # --- volcado ---
+    def _iniciar_volcado(self):
+        """
+        Arranca el hilo de volcado la primera vez que se registra algo en
+        este proceso (también en cada worker creado con fork, que no hereda
+        los hilos del padre).
+        """
+        if self._hilo_pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo_pid == os.getpid():
+                return
+            self._hilo_pid = os.getpid()
+        threading.Thread(target=self._volcar_periodicamente, name="perfil-reglas", daemon=True).start()
+
+    def _volcar_periodicamente(self):
+        while True:
+            time.sleep(self.volcar_cada)
+            try:
+                self.volcar()
+            except Exception:
+                logger.exception("Error volcando el perfil de reglas")
+
+    def _tomar_pendiente(self):
+        with self._lock:
+            por_plan, pendiente = self._por_plan, self._pendiente
+            self._reiniciar_pendiente()
+        for plan, documentos in por_plan.items():
+            for _, _, regla in plan.reglas:
+                pendiente[regla.id].evaluaciones += documentos
+        return pendiente
+
+    def volcar(self):
+        """Mueve lo acumulado en el proceso a Redis (o al acumulado local)"""
+        pendiente = self._tomar_pendiente()
+        if not pendiente:
+            return
+        if _redis is not None:
+            try:
+                pipe = _redis.pipeline(transaction=False)
+                for regla_id, metricas in pendiente.items():
+                    for campo, valor in metricas.campos().items():
+                        if valor:
+                            pipe.hincrby(f"{PREFIJO_REDIS}{regla_id}", campo, valor)
+                pipe.execute()
+                return
+            except redis.RedisError:
+                logger.warning("No se pudo volcar el perfil de reglas a Redis; queda en el proceso")
+        with self._lock:
+            for regla_id, metricas in pendiente.items():
+                self._local[regla_id].sumar(metricas)
+
+    @property
+    def origen(self):
+        return "redis" if _redis is not None else "proceso"
+
+    def totales(self):
+        """{regla_id: _Metricas} agregadas (todos los procesos si hay Redis)"""
+        self.volcar()
+        with self._lock:
+            totales = defaultdict(_Metricas)
+            for regla_id, metricas in self._local.items():
+                totales[regla_id].sumar(metricas)
+        if _redis is not None:
+            try:
+                claves = list(_redis.scan_iter(match=f"{PREFIJO_REDIS}*", count=500))
+                pipe = _redis.pipeline(transaction=False)
+                for clave in claves:
+                    pipe.hgetall(clave)
+                for clave, campos in zip(claves, pipe.execute()):
+                    totales[int(clave[len(PREFIJO_REDIS):])].sumar(_Metricas.desde_campos(campos))
+            except redis.RedisError:
+                logger.warning("No se pudo leer el perfil de reglas desde Redis")
+        return totales
+
+    def reiniciar(self):
+        with self._lock:
+            self._reiniciar_pendiente()
+            self._local.clear()
+        if _redis is not None:
+            try:
+                claves = list(_redis.scan_iter(match=f"{PREFIJO_REDIS}*", count=500))
+                if claves:
+                    _redis.delete(*claves)
+            except redis.RedisError:
+                logger.warning("No se pudo reiniciar el perfil de reglas en Redis")
+
+
+perfilador = Perfilador()
+atexit.register(perfilador.volcar)
+
+
+# ===============================
+# REPORTE
+# ===============================
+def resumen(metricas):
+    """Métricas de una regla listas para mostrar (tiempos en microsegundos)"""
+    p50 = percentil(metricas.histograma, 0.50)
+    p99 = percentil(metricas.histograma, 0.99)
+    promedio_ns = metricas.suma_ns / metricas.muestras if metricas.muestras else None
+    return {
+        "evaluaciones": metricas.evaluaciones,
+        "coincidencias": metricas.coincidencias,
+        "tasa_coincidencia": (
+            round(metricas.coincidencias / metricas.evaluaciones, 6) if metricas.evaluaciones else None
+        ),
+        "muestras_tiempo": metricas.muestras,
+        "p50_us": round(p50 / 1000, 3) if p50 is not None else None,
+        "p99_us": round(p99 / 1000, 3) if p99 is not None else None,
+        "promedio_us": round(promedio_ns / 1000, 3) if promedio_ns is not None else None,
+        # Tiempo total estimado que la regla le costaría al sistema evaluada sola
+        "costo_estimado_ms": (
+            round(promedio_ns * metricas.evaluaciones / 1e6, 3) if promedio_ns is not None else None
+        ),
+    }
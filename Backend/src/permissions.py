@@ -1,5 +1,6 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
 from .rbac import ROLES
+from .roles import rol_de_request
 
 
 class PermisoRegistro(BasePermission):
@@ -22,8 +23,7 @@ class PermisoRegistro(BasePermission):
 
 
     def has_object_permission(self, request, view, obj):
-        perfil = getattr(request.user, "perfil", None)
-        rol = getattr(perfil, "rol", None)
+        rol = rol_de_request(request)
 
         # Admin global
         if request.user.is_superuser:
@@ -56,7 +56,9 @@ class PermisoRegistro(BasePermission):
 
 class TieneRol(BasePermission):
     """
-    Permiso genérico para vistas por rol (RBAC puro)
+    Permiso genérico para vistas por rol (RBAC puro).
+    El rol se resuelve una vez por request (src/roles.py), sin consultas
+    si viene en el token o con el perfil ya cargado.
     """
 
     def has_permission(self, request, view):
@@ -68,15 +70,8 @@ class TieneRol(BasePermission):
         if request.user.is_superuser:
             return True
 
-        perfil = getattr(request.user, "perfil", None)
-        if not perfil:
+        rol_usuario = rol_de_request(request)
+        if not rol_usuario:
             return False
 
-        rol_usuario = perfil.rol
-        roles_permitidos = getattr(view, "roles_permitidos", [])
-
-        # DEBUG (puedes borrar luego)
-        print("ROL DEL USUARIO:", rol_usuario)
-        print("ROLES PERMITIDOS:", roles_permitidos)
-
-        return rol_usuario in roles_permitidos
+        return rol_usuario in getattr(view, "roles_permitidos", [])
@@ -0,0 +1,189 @@
+"""
+Purga de auditoría por lotes, con pausa entre lotes y checkpoint reanudable.
+
+En lugar de un único DELETE dentro de una transacción (que bloquea las
+escrituras auditadas durante toda la purga), se eliminan lotes de N filas
+ordenadas por PK. Cada lote y su checkpoint se confirman en la misma
+transacción, así que una tarea interrumpida (o fallida) continúa
+exactamente donde quedó.
+
+Solo puede haber una purga activa (PENDIENTE o EN_CURSO): lo garantiza un
+índice único parcial (TareaPurga.Meta.constraints), también frente a dos
+solicitudes simultáneas.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from src.models import Auditoria, TareaPurga
+
+logger = logging.getLogger(__name__)
+
+LOTE_DEFECTO = 5000
+PAUSA_MS_DEFECTO = 250
+
+# Una tarea EN_CURSO sin avanzar en este tiempo se considera abandonada
+# (proceso reiniciado) y puede ser retomada por otro ejecutor.
+TIEMPO_ABANDONO = timedelta(minutes=5)
+
+
+class PurgaEnCurso(Exception):
+    """Ya existe una purga activa"""
+
+
+def _reanudables():
+    abandono = timezone.now() - TIEMPO_ABANDONO
+    return Q(estado__in=["PENDIENTE", "FALLIDA"]) | Q(estado="EN_CURSO", fecha_actualizacion__lt=abandono)
+
+
+def crear_tarea_purga(usuario, dias, tamanio_lote=LOTE_DEFECTO, pausa_ms=PAUSA_MS_DEFECTO):
+    """
+    Registrar una nueva tarea de purga y fijar su rango de IDs.
+    Lanza PurgaEnCurso si ya hay una purga activa.
+    """
+    if TareaPurga.objects.filter(estado__in=["PENDIENTE", "EN_CURSO"]).exists():
+        raise PurgaEnCurso("Ya existe una purga en curso")
+
+    fecha_limite = timezone.now() - timedelta(days=dias)
+
+    # El rango se fija al crear la tarea: filas insertadas después no se tocan
+    rango = Auditoria.objects.filter(fecha__lt=fecha_limite).aggregate(
+        id_min=Min('id'),
+        id_max=Max('id')
+    )
+    total_estimado = 0
+    if rango['id_max'] is not None:
+        total_estimado = rango['id_max'] - rango['id_min'] + 1
+
+    try:
+        # atomic: la violación del índice no invalida la transacción del llamador
+        with transaction.atomic():
+            return TareaPurga.objects.create(
+                fecha_limite=fecha_limite,
+                dias=dias,
+                tamanio_lote=tamanio_lote,
+                pausa_ms=pausa_ms,
+                id_maximo=rango['id_max'],
+                ultimo_id=(rango['id_min'] or 1) - 1,
+                total_estimado=total_estimado,
+                solicitado_por=usuario,
+            )
+    except IntegrityError:
+        raise PurgaEnCurso("Ya existe una purga en curso")
+
+
+def tareas_reanudables():
+    """Tareas pendientes, fallidas o abandonadas a mitad de camino"""
+    return TareaPurga.objects.filter(_reanudables()).order_by('fecha_creacion')
+
+
+def _reclamar_tarea(tarea_id):
+    """
+    Marca la tarea EN_CURSO de forma atómica.
+    Retorna False si otro ejecutor ya la está procesando o si hay otra
+    purga activa (al reintentar una FALLIDA).
+    """
+    try:
+        with transaction.atomic():
+            return TareaPurga.objects.filter(_reanudables(), pk=tarea_id).update(
+                estado="EN_CURSO", error="", fecha_actualizacion=timezone.now()
+            ) == 1
+    except IntegrityError:
+        return False
+
+
+def _eliminar_lote(tarea):
+    """
+    Elimina el siguiente lote y avanza el checkpoint en la misma transacción.
+    Retorna la cantidad de filas eliminadas (0 = no quedan filas).
+    """
+    ids = list(
+        Auditoria.objects.filter(
+            id__gt=tarea.ultimo_id,
+            id__lte=tarea.id_maximo,
+            fecha__lt=tarea.fecha_limite,
+        ).order_by('id').values_list('id', flat=True)[:tarea.tamanio_lote]
+    )
+    if not ids:
+        return 0
+
+    with transaction.atomic():
+        # _raw_delete: DELETE directo sin cargar instancias ni emitir señales
+        # (Auditoria no tiene relaciones inversas que requieran cascada)
+        qs = Auditoria.objects.filter(id__in=ids)
+        eliminados = qs._raw_delete(qs.db)
+
+        tarea.ultimo_id = ids[-1]
+        tarea.eliminados += eliminados
+        tarea.lotes += 1
+        tarea.save(update_fields=['ultimo_id', 'eliminados', 'lotes', 'fecha_actualizacion'])
+
+    return eliminados
+
+
+def ejecutar_tarea_purga(tarea_id, reportar=None):
+    """
+    Procesa una tarea de purga hasta completarla.
+    reportar: callback opcional que recibe la tarea tras cada lote (progreso).
+    """
+    if not _reclamar_tarea(tarea_id):
+        logger.info("Tarea de purga %s ya está en curso o finalizada, o hay otra purga activa", tarea_id)
+        return None
+
+    tarea = TareaPurga.objects.get(pk=tarea_id)
+
+    try:
+        if tarea.id_maximo is not None:
+            while _eliminar_lote(tarea):
+                if reportar:
+                    reportar(tarea)
+                # Pausa entre lotes para limitar la carga de I/O
+                time.sleep(tarea.pausa_ms / 1000)
+    except Exception as exc:
+        tarea.estado = "FALLIDA"
+        tarea.error = str(exc)
+        tarea.save(update_fields=['estado', 'error', 'fecha_actualizacion'])
+        logger.exception("Tarea de purga %s falló en ultimo_id=%s", tarea.id, tarea.ultimo_id)
+        raise
+
+    tarea.estado = "COMPLETADA"
+    tarea.fecha_fin = timezone.now()
+    tarea.save(update_fields=['estado', 'fecha_fin', 'fecha_actualizacion'])
+
+    # Auditoría de la purga
+    Auditoria.objects.create(
+        usuario=tarea.solicitado_por,
+        rol="SUPERADMIN",
+        accion="DELETE",
+        modelo="Auditoria",
+        objeto_id=tarea.id,
+        descripcion=f"⚠️ PURGA MASIVA: Eliminados {tarea.eliminados} registros de auditoría anteriores a {tarea.dias} días",
+        metadatos={"tarea_purga": tarea.id, "lotes": tarea.lotes}
+    )
+
+    return tarea
+
+
+def serializar_tarea(tarea):
+    """Representación de la tarea para las respuestas de la API"""
+    return {
+        "id": tarea.id,
+        "estado": tarea.estado,
+        "dias": tarea.dias,
+        "fecha_limite": tarea.fecha_limite.isoformat(),
+        "tamanio_lote": tarea.tamanio_lote,
+        "pausa_ms": tarea.pausa_ms,
+        "eliminados": tarea.eliminados,
+        "total_estimado": tarea.total_estimado,
+        "progreso": tarea.progreso(),
+        "lotes": tarea.lotes,
+        "ultimo_id": tarea.ultimo_id,
+        "error": tarea.error,
+        "fecha_creacion": tarea.fecha_creacion.isoformat(),
+        "fecha_actualizacion": tarea.fecha_actualizacion.isoformat(),
+        "fecha_fin": tarea.fecha_fin.isoformat() if tarea.fecha_fin else None,
+    }
@@ -0,0 +1,452 @@
+"""
+Red de discriminación (estilo Rete) para evaluar muchas reglas por documento.
+
+Todas las reglas activas se descomponen en una única red de nodos compartidos:
+
+- Predicados atómicos, internados por su AST: `tipo_certificado == 'AFP'`
+  aparece una sola vez aunque lo usen cien reglas.
+- Igualdades contra literales sobre un mismo campo se agrupan en un dict
+  valor -> máscara: una búsqueda resuelve todas las igualdades del campo.
+- Umbrales numéricos (<, <=, >, >=) sobre un mismo campo se ordenan y se
+  resuelven con bisect contra máscaras acumuladas: O(log n) por campo.
+- AND/OR se internan por su conjunto de hijos (conmutativos), así que las
+  subcondiciones compartidas también se evalúan una vez.
+
+Cada nodo tiene un bit. Evaluar un documento produce un entero con los bits
+verdaderos; una regla coincide si el bit de su nodo raíz está encendido.
+
+Los cambios son incrementales: agregar o quitar una regla solo interna o
+libera (por conteo de referencias) los nodos de esa regla. Después se
+publica un "plan" inmutable, así que evaluar no requiere locks.
+"""
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from src.motor_reglas import (
+    ReglaInvalida,
+    a_numero,
+    a_texto,
+    compilar_booleano,
+    compilar_campo,
+    compilar_regla,
+)
+from src.perfil_reglas import perfilador
+
+logger = logging.getLogger(__name__)
+
+_NUMERICOS = (int, float)
+_RANGOS = ('>', '>=', '<', '<=')
+
+
+def _es_numero(valor):
+    return isinstance(valor, _NUMERICOS) and not isinstance(valor, bool)
+
+
+class _Nodo:
+    __slots__ = ('bit', 'tipo', 'datos', 'hijos', 'referencias')
+
+    def __init__(self, bit, tipo, datos, hijos=()):
+        self.bit = bit
+        self.tipo = tipo          # 'igualdad' | 'rango' | 'predicado' | 'and' | 'or'
+        self.datos = datos
+        self.hijos = hijos        # compuestos: ((clave_hijo, negado), ...)
+        self.referencias = 0
+
+
+class _GrupoRango:
+    """Umbrales de un campo, ordenados por operador, con máscaras acumuladas"""
+    __slots__ = ('umbrales', 'tabla')
+
+    def __init__(self):
+        self.umbrales = {op: {} for op in _RANGOS}  # op -> {umbral: bit}
+        self.tabla = None
+
+    def vacio(self):
+        return not any(self.umbrales.values())
+
+    def preparar(self):
+        """(valores ordenados, máscaras acumuladas) por operador"""
+        tabla = {}
+        for op, por_umbral in self.umbrales.items():
+            if not por_umbral:
+                continue
+            valores = sorted(por_umbral)
+            bits = [por_umbral[v] for v in valores]
+            if op in ('>', '>='):
+                # Se cumplen los umbrales menores al valor: prefijos
+                acumuladas = [0]
+                for bit in bits:
+                    acumuladas.append(acumuladas[-1] | bit)
+            else:
+                # Se cumplen los umbrales mayores al valor: sufijos
+                acumuladas = [0] * (len(bits) + 1)
+                for i in range(len(bits) - 1, -1, -1):
+                    acumuladas[i] = acumuladas[i + 1] | bits[i]
+            tabla[op] = (tuple(valores), tuple(acumuladas))
+        self.tabla = tabla
+        return tabla
+
+
+class _Plan:
+    """Estructura inmutable de evaluación (se reemplaza completa en cada cambio)"""
+    __slots__ = ('igualdades', 'rangos', 'predicados', 'compuestos', 'reglas')
+
+    def __init__(self, igualdades, rangos, predicados, compuestos, reglas):
+        self.igualdades = igualdades
+        self.rangos = rangos
+        self.predicados = predicados
+        self.compuestos = compuestos
+        self.reglas = reglas
+
+    def evaluar(self, doc):
+        verdaderos = 0
+
+        for obtener, por_valor in self.igualdades:
+            valor = obtener(doc)
+            if valor is None:
+                continue
+            clase = valor.__class__
+            if clase is str:
+                verdaderos |= por_valor.get(('t', valor), 0)
+                numero = a_numero(valor)
+                if numero is not None:
+                    verdaderos |= por_valor.get(('n', numero), 0)
+            elif clase is int or clase is float:
+                verdaderos |= por_valor.get(('n', valor), 0) | por_valor.get(('t', a_texto(valor)), 0)
+            else:
+                numero = a_numero(valor)
+                if numero is not None:
+                    verdaderos |= por_valor.get(('n', numero), 0)
+                verdaderos |= por_valor.get(('t', a_texto(valor)), 0)
+
+        for obtener, tabla in self.rangos:
+            valor = obtener(doc)
+            if valor.__class__ is not int and valor.__class__ is not float:
+                valor = a_numero(valor)
+                if valor is None:
+                    continue
+            if valor != valor:  # NaN no cumple ninguna comparación
+                continue
+            for op, (valores, acumuladas) in tabla:
+                if op == '>':
+                    verdaderos |= acumuladas[bisect_left(valores, valor)]
+                elif op == '>=':
+                    verdaderos |= acumuladas[bisect_right(valores, valor)]
+                elif op == '<':
+                    verdaderos |= acumuladas[bisect_right(valores, valor)]
+                else:
+                    verdaderos |= acumuladas[bisect_left(valores, valor)]
+
+        for bit, evaluar in self.predicados:
+            if evaluar(doc):
+                verdaderos |= bit
+
+        # Orden topológico: los hijos siempre se calcularon antes
+        for es_and, bit, positivos, negados in self.compuestos:
+            if es_and:
+                if verdaderos & positivos == positivos and not verdaderos & negados:
+                    verdaderos |= bit
+            elif verdaderos & positivos or negados & ~verdaderos:
+                verdaderos |= bit
+
+        return [regla for bit, negado, regla in self.reglas if bool(verdaderos & bit) is not negado]
+
+
+_PLAN_VACIO = _Plan((), (), (), (), ())
+
+
+class RedReglas:
+    """Red compartida de reglas compiladas, modificable en forma incremental"""
+
+    def __init__(self, perfilar=False):
+        self.perfilar = perfilar        # registrar métricas por regla (src/perfil_reglas.py)
+        self._lock = threading.RLock()
+        self._nodos = {}                # clave -> _Nodo (dict: orden de inserción = orden topológico)
+        self._bits_libres = []
+        self._siguiente_bit = 0
+        self._igualdades = {}           # ruta -> {('t'|'n', valor): máscara}
+        self._rangos = {}               # ruta -> _GrupoRango
+        self._reglas = {}               # id -> (firma, raíz, ReglaCompilada)
+        self._invalidas = {}            # id -> (firma, mensaje)
+        self._plan = _PLAN_VACIO
+
+    # --- consulta ---
+    @property
+    def reglas(self):
+        return [self._reglas[i][2] for i in sorted(self._reglas)]
+
+    @property
+    def invalidas(self):
+        return {regla_id: mensaje for regla_id, (_, mensaje) in self._invalidas.items()}
+
+    def __len__(self):
+        return len(self._reglas)
+
+    def evaluar(self, documento):
+        """Reglas (ReglaCompilada, en orden de id) que se cumplen para el documento"""
+        plan = self._plan
+        try:
+            coincidencias = plan.evaluar(documento)
+        except Exception:
+            logger.exception("Error en la red de reglas; se evalúa regla por regla")
+            coincidencias = []
+            for _, _, regla in plan.reglas:
+                try:
+                    if regla.evaluar(documento):
+                        coincidencias.append(regla)
+                except Exception:
+                    logger.exception("Error evaluando regla %s sobre documento", regla.id)
+        if self.perfilar:
+            perfilador.registrar(plan, documento, coincidencias)
+        return coincidencias
+
+    def estadisticas(self):
+        """Tamaño de la red: cuántos nodos se comparten entre reglas"""
+        por_tipo = {}
+        compartidos = 0
+        for nodo in self._nodos.values():
+            por_tipo[nodo.tipo] = por_tipo.get(nodo.tipo, 0) + 1
+            if nodo.referencias > 1:
+                compartidos += 1
+        return {
+            "reglas": len(self._reglas),
+            "nodos": len(self._nodos),
+            "nodos_compartidos": compartidos,
+            "por_tipo": por_tipo,
+            "invalidas": len(self._invalidas),
+        }
+
+    # --- cambios ---
+    def agregar(self, regla):
+        """Agrega o reemplaza una regla (ReglaNegocio o snapshot con los mismos campos)"""
+        with self._lock:
+            if self._agregar(regla):
+                self._publicar()
+
+    def quitar(self, regla_id):
+        with self._lock:
+            self._invalidas.pop(regla_id, None)
+            if regla_id in self._reglas:
+                self._quitar(regla_id)
+                self._publicar()
+
+    def sincronizar(self, reglas):
+        """
+        Deja la red con exactamente estas reglas. Solo se tocan las que
+        cambiaron de versión o texto; retorna la cantidad de cambios.
+        """
+        with self._lock:
+            reglas = {r.id: r for r in reglas}
+            cambios = 0
+            for regla_id in [i for i in self._reglas if i not in reglas]:
+                self._quitar(regla_id)
+                cambios += 1
+            for regla_id in [i for i in self._invalidas if i not in reglas]:
+                del self._invalidas[regla_id]
+            for regla in reglas.values():
+                if self._agregar(regla):
+                    cambios += 1
+            if cambios:
+                self._publicar()
+            return cambios
+
+    @staticmethod
+    def _firma(regla):
+        return (regla.version, regla.nombre, regla.condicion, regla.accion)
+
+    def _agregar(self, regla):
+        firma = self._firma(regla)
+        actual = self._reglas.get(regla.id)
+        if actual and actual[0] == firma:
+            return False
+        if regla.id in self._invalidas and self._invalidas[regla.id][0] == firma:
+            return False
+
+        try:
+            compilada = compilar_regla(regla)
+        except ReglaInvalida as exc:
+            logger.warning("Regla %s v%s inválida, se omite: %s", regla.id, regla.version, exc)
+            if actual:
+                self._quitar(regla.id)
+            self._invalidas[regla.id] = (firma, str(exc))
+            return True
+
+        raiz = self._internar(compilada.ast)
+        if actual:
+            self._quitar(regla.id)
+        self._invalidas.pop(regla.id, None)
+        self._reglas[regla.id] = (firma, raiz, compilada)
+        return True
+
+    def _quitar(self, regla_id):
+        _, (clave, _), _ = self._reglas.pop(regla_id)
+        self._liberar(clave)
+
+    # --- internado de nodos ---
+    def _nuevo_bit(self):
+        if self._bits_libres:
+            return self._bits_libres.pop()
+        bit = 1 << self._siguiente_bit
+        self._siguiente_bit += 1
+        return bit
+
+    def _internar(self, ast):
+        """Retorna (clave, negado) del nodo que representa el AST"""
+        tipo = ast[0]
+
+        if tipo == 'not':
+            clave, negado = self._internar(ast[1])
+            return clave, not negado
+
+        if tipo == 'cmp' and ast[2][0] == 'campo' and ast[3][0] == 'lit':
+            op, ruta, literal = ast[1], ast[2][1], ast[3][1]
+            if op in ('==', '!=') and (isinstance(literal, str) or _es_numero(literal)):
+                # a != x  ==  NOT (a == x), también con campos ausentes
+                clave = ('igualdad', ruta, ('t', literal) if isinstance(literal, str) else ('n', literal))
+                return self._referenciar(clave, 'igualdad', (ruta, clave[2])), op == '!='
+            if op in _RANGOS and _es_numero(literal):
+                clave = ('rango', ruta, op, literal)
+                return self._referenciar(clave, 'rango', (ruta, op, literal)), False
+
+        if tipo in ('and', 'or'):
+            referencias = Counter(self._internar(hijo) for hijo in ast[1])
+            hijos = frozenset(referencias)
+            clave = (tipo, hijos)
+            # El nodo retiene una referencia por hijo: se sueltan las sobrantes
+            # (hijos repetidos, o todas si el nodo ya existía)
+            existe = clave in self._nodos
+            for (hijo, negado), cantidad in referencias.items():
+                for _ in range(cantidad if existe else cantidad - 1):
+                    self._liberar(hijo)
+            return self._referenciar(clave, tipo, None, tuple(hijos)), False
+
+        clave = ('predicado', ast)
+        return self._referenciar(clave, 'predicado', ast), False
+
+    def _referenciar(self, clave, tipo, datos, hijos=()):
+        nodo = self._nodos.get(clave)
+        if nodo is None:
+            nodo = _Nodo(self._nuevo_bit(), tipo, datos, hijos)
+            self._nodos[clave] = nodo
+            self._registrar(nodo)
+        nodo.referencias += 1
+        return clave
+
+    def _liberar(self, clave):
+        nodo = self._nodos[clave]
+        nodo.referencias -= 1
+        if nodo.referencias:
+            return
+        del self._nodos[clave]
+        self._desregistrar(nodo)
+        self._bits_libres.append(nodo.bit)
+        for hijo, _ in nodo.hijos:
+            self._liberar(hijo)
+
+    def _registrar(self, nodo):
+        if nodo.tipo == 'igualdad':
+            ruta, valor = nodo.datos
+            grupo = self._igualdades.setdefault(ruta, {})
+            grupo[valor] = grupo.get(valor, 0) | nodo.bit
+        elif nodo.tipo == 'rango':
+            ruta, op, umbral = nodo.datos
+            grupo = self._rangos.setdefault(ruta, _GrupoRango())
+            grupo.umbrales[op][umbral] = nodo.bit
+            grupo.tabla = None
+        elif nodo.tipo == 'predicado':
+            nodo.datos = (nodo.datos, compilar_booleano(nodo.datos))
+
+    def _desregistrar(self, nodo):
+        if nodo.tipo == 'igualdad':
+            ruta, valor = nodo.datos
+            grupo = self._igualdades[ruta]
+            grupo[valor] &= ~nodo.bit
+            if not grupo[valor]:
+                del grupo[valor]
+            if not grupo:
+                del self._igualdades[ruta]
+        elif nodo.tipo == 'rango':
+            ruta, op, umbral = nodo.datos
+            grupo = self._rangos[ruta]
+            del grupo.umbrales[op][umbral]
+            grupo.tabla = None
+            if grupo.vacio():
+                del self._rangos[ruta]
+
+    def _publicar(self):
+        """Arma el plan inmutable con el estado actual de la red"""
+        igualdades = tuple(
+            (compilar_campo(ruta), dict(grupo)) for ruta, grupo in self._igualdades.items()
+        )
+        rangos = tuple(
+            (compilar_campo(ruta), tuple((grupo.tabla or grupo.preparar()).items()))
+            for ruta, grupo in self._rangos.items()
+        )
+
+        predicados = []
+        compuestos = []
+        for nodo in self._nodos.values():
+            if nodo.tipo == 'predicado':
+                predicados.append((nodo.bit, nodo.datos[1]))
+            elif nodo.tipo in ('and', 'or'):
+                positivos = negados = 0
+                for clave, negado in nodo.hijos:
+                    if negado:
+                        negados |= self._nodos[clave].bit
+                    else:
+                        positivos |= self._nodos[clave].bit
+                compuestos.append((nodo.tipo == 'and', nodo.bit, positivos, negados))
+
+        reglas = tuple(
+            (self._nodos[clave].bit, negado, compilada)
+            for _, (_, (clave, negado), compilada) in sorted(self._reglas.items())
+        )
+        self._plan = _Plan(igualdades, rangos, tuple(predicados), tuple(compuestos), reglas)
+
+
+# ===============================
+# RED DE REGLAS ACTIVAS (por proceso)
+# ===============================
+_red_activa = RedReglas(perfilar=True)
+
+
+def _sincronizar_red_activa():
+    from src.models import ReglaNegocio
+    _red_activa.sincronizar(ReglaNegocio.objects.filter(estado="ACTIVA").only(
+        'id', 'version', 'nombre', 'condicion', 'accion'
+    ))
+    return _red_activa
+
+
+def _crear_cache():
+    from src.cache_reglas import CacheReglas
+    return CacheReglas(_sincronizar_red_activa)
+
+
+_cache_red_activa = None
+
+
+def red_activa():
+    """
+    Red con las reglas ACTIVAS. Solo consulta la BD (y sincroniza de forma
+    incremental) cuando cambió la versión global de reglas (src/cache_reglas.py).
+    """
+    global _cache_red_activa
+    if _cache_red_activa is None:
+        _cache_red_activa = _crear_cache()
+    return _cache_red_activa.obtener()
+
+
+def actualizar_regla(regla):
+    """Refleja en la red de este proceso un cambio de versión/estado de la regla"""
+    if regla.estado == "ACTIVA":
+        _red_activa.agregar(regla)
+    else:
+        _red_activa.quitar(regla.id)
+
+
+def quitar_regla(regla_id):
+    """Quita de la red de este proceso una regla eliminada"""
+    _red_activa.quitar(regla_id)
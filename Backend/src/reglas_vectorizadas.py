@@ -0,0 +1,312 @@
+"""
+Evaluación vectorizada de reglas sobre lotes de calificaciones.
+
+Para cargas CSV y revalidaciones masivas: en lugar de evaluar regla por
+regla y documento por documento, cada lote se convierte en columnas
+(una por campo usado en las reglas) y las condiciones se traducen a
+máscaras booleanas de NumPy.
+
+- Cada columna se factoriza: códigos enteros + valores únicos. Un predicado
+  que usa un solo campo se evalúa una vez por valor único (con el mismo
+  closure del motor escalar) y se expande con los códigos: tipo_certificado,
+  periodo o rut cuestan lo mismo con 10 filas que con un millón.
+- Comparaciones numéricas contra literales (monto > X) usan directamente la
+  columna float64 (NaN = ausente o no numérico).
+- AND/OR/NOT se combinan con &, | y ~; las subexpresiones repetidas entre
+  reglas se calculan una vez por lote.
+- Predicados con varios campos caen a evaluación fila por fila.
+
+Los resultados son idénticos a los del motor escalar (src/motor_reglas.py).
+NumPy es opcional: sin él se usa la red de reglas fila por fila.
+"""
+import logging
+
+from src.motor_reglas import a_numero, compilar_booleano, compilar_campo
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+LOTE_DEFECTO = 20000
+
+_NUMERICOS = (int, float)
+_COMPARADORES_NUMERICOS = ('==', '!=', '<', '<=', '>', '>=')
+_ENTERO_EXACTO = 2 ** 53
+
+
+def _es_numero(valor):
+    return isinstance(valor, _NUMERICOS) and not isinstance(valor, bool)
+
+
+def campos_de(ast, rutas=None):
+    """Rutas de campos (tuplas) que usa un AST"""
+    if rutas is None:
+        rutas = set()
+    tipo = ast[0]
+    if tipo == 'campo':
+        rutas.add(ast[1])
+    elif tipo in ('and', 'or', 'func'):
+        for hijo in ast[-1]:
+            campos_de(hijo, rutas)
+    elif tipo in ('cmp', 'arit'):
+        campos_de(ast[2], rutas)
+        campos_de(ast[3], rutas)
+    elif tipo in ('not', 'neg', 'bool', 'in'):
+        campos_de(ast[1], rutas)
+    return rutas
+
+
+def _clave(ast):
+    """
+    Clave de memoización: el AST más las clases de sus literales
+    (('lit', 1) y ('lit', True) son iguales como tuplas, pero no al evaluar).
+    """
+    tipos = []
+    pendientes = [ast]
+    while pendientes:
+        nodo = pendientes.pop()
+        if isinstance(nodo, tuple):
+            pendientes.extend(nodo)
+        else:
+            tipos.append(nodo.__class__)
+    return ast, tuple(tipos)
+
+
+def proyeccion_mongo(reglas):
+    """Proyección con los campos de primer nivel que usan las reglas"""
+    proyeccion = {}
+    for regla in reglas:
+        for ruta in campos_de(regla.ast):
+            proyeccion[ruta[0]] = 1
+    return proyeccion
+
+
+def _documento_con(ruta, valor):
+    """Documento mínimo donde el campo `ruta` vale `valor`"""
+    documento = valor
+    for clave in reversed(ruta):
+        documento = {clave: documento}
+    return documento
+
+
+# ===============================
+# COLUMNAS
+# ===============================
+class _Columna:
+    """Columna factorizada: valores[i] == unicos[codigos[i]]"""
+
+    def __init__(self, documentos, ruta):
+        obtener = compilar_campo(ruta)
+        indice = {}
+        unicos = []
+        codigos = []
+        for documento in documentos:
+            valor = obtener(documento)
+            try:
+                # La clase forma parte de la clave: True, 1 y 1.0 son distintos
+                clave = (valor.__class__, valor)
+                codigo = indice.get(clave)
+            except TypeError:  # listas/dicts: sin deduplicar
+                clave = codigo = None
+            if codigo is None:
+                codigo = len(unicos)
+                unicos.append(valor)
+                if clave is not None:
+                    indice[clave] = codigo
+            codigos.append(codigo)
+
+        self.ruta = ruta
+        self.unicos = unicos
+        self.codigos = np.array(codigos, dtype=np.int32)
+        self._numeros = None
+        # float64 es exacto para enteros hasta 2**53
+        self.exacta = all(
+            v.__class__ is not int or -_ENTERO_EXACTO <= v <= _ENTERO_EXACTO for v in unicos
+        )
+
+    @property
+    def numeros(self):
+        """float64 por fila (NaN si el valor no es numérico)"""
+        if self._numeros is None:
+            por_unico = np.array(
+                [np.nan if (n := a_numero(v)) is None else n for v in self.unicos],
+                dtype=np.float64
+            )
+            self._numeros = por_unico[self.codigos]
+        return self._numeros
+
+    def por_unico(self, evaluar):
+        """Evalúa evaluar(doc) una vez por valor único y expande a todas las filas"""
+        resultados = np.fromiter(
+            (bool(evaluar(_documento_con(self.ruta, v))) for v in self.unicos),
+            dtype=bool,
+            count=len(self.unicos)
+        )
+        return resultados[self.codigos]
+
+
+class _Lote:
+    """Columnas y máscaras (memoizadas por nodo del AST) de un lote de documentos"""
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.n = len(documentos)
+        self._columnas = {}
+        self._mascaras = {}
+
+    def columna(self, ruta):
+        columna = self._columnas.get(ruta)
+        if columna is None:
+            columna = self._columnas[ruta] = _Columna(self.documentos, ruta)
+        return columna
+
+    def mascara(self, ast):
+        clave = _clave(ast)
+        mascara = self._mascaras.get(clave)
+        if mascara is None:
+            mascara = self._mascaras[clave] = self._calcular(ast)
+        return mascara
+
+    def _calcular(self, ast):
+        tipo = ast[0]
+
+        if tipo == 'and':
+            return np.logical_and.reduce([self.mascara(h) for h in ast[1]])
+        if tipo == 'or':
+            return np.logical_or.reduce([self.mascara(h) for h in ast[1]])
+        if tipo == 'not':
+            return ~self.mascara(ast[1])
+
+        # Comparación numérica directa contra la columna float64
+        if (tipo == 'cmp' and ast[1] in _COMPARADORES_NUMERICOS
+                and ast[2][0] == 'campo' and ast[3][0] == 'lit' and _es_numero(ast[3][1])
+                and abs(ast[3][1]) <= _ENTERO_EXACTO and self.columna(ast[2][1]).exacta):
+            numeros = self.columna(ast[2][1]).numeros
+            literal = ast[3][1]
+            op = ast[1]
+            with np.errstate(invalid='ignore'):
+                if op == '==':
+                    return numeros == literal
+                if op == '!=':
+                    return ~(numeros == literal)  # ausentes/no numéricos: True, como el motor escalar
+                if op == '<':
+                    return numeros < literal
+                if op == '<=':
+                    return numeros <= literal
+                if op == '>':
+                    return numeros > literal
+                return numeros >= literal
+
+        evaluar = compilar_booleano(ast)
+        rutas = campos_de(ast)
+
+        if not rutas:
+            return np.full(self.n, bool(evaluar({})), dtype=bool)
+        if len(rutas) == 1:
+            return self.columna(next(iter(rutas))).por_unico(evaluar)
+
+        # Varios campos: fila por fila
+        return np.fromiter((bool(evaluar(d)) for d in self.documentos), dtype=bool, count=self.n)
+
+
+# ===============================
+# RESULTADO
+# ===============================
+class ResultadoLote:
+    """
+    Coincidencias de un lote: matriz[r, i] indica si la regla r se cumple en la fila i.
+    Sin NumPy, matriz es una lista de enteros (bit r = regla r) por fila.
+    """
+
+    def __init__(self, reglas, matriz, filas):
+        self.reglas = reglas
+        self.matriz = matriz
+        self.filas = filas
+
+    def bitsets(self):
+        """
+        Bitset de reglas coincidentes por fila.
+        NumPy: uint8 (filas, ceil(reglas / 8)), bit r (little-endian) = self.reglas[r].
+        """
+        if NUMPY_AVAILABLE:
+            return np.packbits(self.matriz.T, axis=1, bitorder='little')
+        return self.matriz
+
+    def coincidencias(self, fila):
+        """Reglas (ReglaCompilada) que se cumplen en la fila"""
+        if NUMPY_AVAILABLE:
+            return [self.reglas[r] for r in np.flatnonzero(self.matriz[:, fila])]
+        bits = self.matriz[fila]
+        return [regla for r, regla in enumerate(self.reglas) if bits >> r & 1]
+
+    def mascara(self, posicion):
+        """Lista de bools por fila para la regla self.reglas[posicion]"""
+        if NUMPY_AVAILABLE:
+            return self.matriz[posicion].tolist()
+        return [bool(bits >> posicion & 1) for bits in self.matriz]
+
+    def conteos(self):
+        """{regla_id: filas coincidentes}"""
+        if NUMPY_AVAILABLE:
+            totales = self.matriz.sum(axis=1) if self.reglas else []
+            return {regla.id: int(total) for regla, total in zip(self.reglas, totales)}
+        return {
+            regla.id: sum(1 for bits in self.matriz if bits >> r & 1)
+            for r, regla in enumerate(self.reglas)
+        }
+
+    def grupos(self):
+        """
+        Filas agrupadas por conjunto de reglas coincidentes:
+        {(regla_id, ...): [fila, ...]} (incluye la tupla vacía)
+        """
+        grupos = {}
+        for fila, bits in enumerate(self._claves_fila()):
+            grupos.setdefault(bits, []).append(fila)
+        return {
+            tuple(self.reglas[r].id for r in range(len(self.reglas)) if bits >> r & 1): filas
+            for bits, filas in grupos.items()
+        }
+
+    def _claves_fila(self):
+        if not NUMPY_AVAILABLE:
+            return self.matriz
+        return [int.from_bytes(fila.tobytes(), 'little') for fila in self.bitsets()]
+
+
+def evaluar_lote(reglas, documentos, red=None):
+    """
+    Evalúa todas las reglas (ReglaCompilada) sobre una lista de documentos.
+    `red` (RedReglas con las mismas reglas) solo se usa si NumPy no está
+    instalado. Retorna un ResultadoLote.
+    """
+    reglas = list(reglas)
+    documentos = list(documentos)
+
+    if not NUMPY_AVAILABLE:
+        # Sin NumPy: fila por fila (con la red si está disponible)
+        posicion = {regla.id: 1 << r for r, regla in enumerate(reglas)}
+        matriz = []
+        for documento in documentos:
+            coincidencias = red.evaluar(documento) if red is not None else (
+                regla for regla in reglas if regla.evaluar(documento)
+            )
+            bits = 0
+            for regla in coincidencias:
+                bits |= posicion.get(regla.id, 0)
+            matriz.append(bits)
+        return ResultadoLote(reglas, matriz, len(documentos))
+
+    lote = _Lote(documentos)
+    matriz = np.zeros((len(reglas), len(documentos)), dtype=bool)
+    for r, regla in enumerate(reglas):
+        try:
+            matriz[r] = lote.mascara(regla.ast)
+        except Exception:
+            logger.exception("Error vectorizando regla %s; se evalúa fila por fila", regla.id)
+            matriz[r] = [bool(regla.evaluar(d)) for d in documentos]
+    return ResultadoLote(reglas, matriz, len(documentos))
@@ -0,0 +1,167 @@
+"""
+Motor de reportes PDF tabulares de muchas páginas (reportlab).
+
+Una sola Table de platypus con todas las filas se diagrama completa en
+memoria y su costo crece más que linealmente. Aquí las filas se consumen
+desde un iterador y se agrupan en tablas del tamaño de una página:
+
+- La altura de fila es fija, así que las filas por página se calculan de
+  antemano; cada página es una Table independiente (diagramar cuesta
+  O(filas de la página)) con repeatRows=1 como resguardo si alguna no
+  cabe y se divide.
+- Las tablas se entregan a build() a medida que se necesitan
+  (_FlowablesPerezosos): en memoria solo vive la página en curso más las
+  páginas ya terminadas y comprimidas del canvas.
+- El TableStyle se compila una sola vez por proceso y se comparte entre
+  todas las tablas.
+"""
+from functools import partial
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+TAMANO_FUENTE = 8
+ALTO_FILA = 14                # puntos; fijo para poder calcular filas por página
+ALTO_ENCABEZADO = 20
+
+
+class _FlowablesPerezosos(list):
+    """
+    Lista de flowables que se rellena desde un iterador cuando build() la
+    vacía. build() consulta len() antes de cada flowable; las operaciones
+    internas de handle_flowable (del, insert, slices) trabajan sobre la
+    lista real, que nunca tiene más de unos pocos elementos.
+    """
+
+    def __init__(self, iterable):
+        super().__init__()
+        self._fuente = iter(iterable)
+
+    def __len__(self):
+        if not list.__len__(self):
+            siguiente = next(self._fuente, None)
+            if siguiente is not None:
+                self.append(siguiente)
+        return list.__len__(self)
+
+
+_estilo_tabla = None
+
+
+def estilo_tabla():
+    """TableStyle compartido (se compila una vez)"""
+    global _estilo_tabla
+    if _estilo_tabla is None:
+        _estilo_tabla = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), TAMANO_FUENTE),
+            ('TOPPADDING', (0, 0), (-1, -1), 1),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 1),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+        ])
+    return _estilo_tabla
+
+
+def _tabla(encabezados, filas, anchos):
+    return Table(
+        [encabezados, *filas],
+        colWidths=anchos,
+        rowHeights=[ALTO_ENCABEZADO] + [ALTO_FILA] * len(filas),
+        style=estilo_tabla(),
+        repeatRows=1,
+    )
+
+
+def _paginas(encabezados, filas, anchos, primera, siguientes):
+    """Tablas de `primera` filas y luego de `siguientes` filas cada una"""
+    pagina = []
+    capacidad = primera
+    vacia = True
+    for fila in filas:
+        pagina.append(fila)
+        vacia = False
+        if len(pagina) >= capacidad:
+            yield _tabla(encabezados, pagina, anchos)
+            pagina = []
+            capacidad = siguientes
+    if pagina or vacia:     # sin filas: tabla solo con encabezados
+        yield _tabla(encabezados, pagina, anchos)
+
+
+def _pie(canvas, doc, desplazamiento=0):
+    canvas.saveState()
+    canvas.setFont('Helvetica', 7)
+    canvas.drawRightString(
+        doc.pagesize[0] - doc.rightMargin, doc.bottomMargin / 2, f"Página {doc.page + desplazamiento}"
+    )
+    canvas.restoreState()
+
+
+def _documento(archivo, pagesize):
+    return SimpleDocTemplate(archivo, pagesize=pagesize or letter, topMargin=0.5 * inch, pageCompression=1)
+
+
+def _cabecera(titulo, info):
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor('#0b1220'),
+        spaceAfter=20,
+        alignment=1  # Center
+    )
+    return [
+        Paragraph(titulo, title_style),
+        Spacer(1, 0.3 * inch),
+        Paragraph(info, styles['Normal']),
+        Spacer(1, 0.2 * inch),
+    ]
+
+
+def _capacidad(doc, cabecera):
+    """Filas por página según el alto del marco (la primera también lleva la cabecera)"""
+    alto_marco = doc.height - 12        # padding del Frame (6 arriba, 6 abajo)
+    alto_cabecera = sum(
+        f.wrap(doc.width, alto_marco)[1] + f.getSpaceBefore() + f.getSpaceAfter() for f in cabecera
+    )
+    siguientes = max(1, int((alto_marco - ALTO_ENCABEZADO) // ALTO_FILA))
+    primera = max(1, int((alto_marco - alto_cabecera - ALTO_ENCABEZADO) // ALTO_FILA))
+    return primera, siguientes
+
+
+def filas_por_pagina(titulo, info, pagesize=None):
+    """(filas de la primera página, filas de cada página siguiente)"""
+    return _capacidad(_documento(None, pagesize), _cabecera(titulo, info))
+
+
+def generar_pdf(archivo, titulo, info, encabezados, filas, anchos, pagesize=None, cabecera=True, pagina_inicial=1):
+    """
+    Escribe el reporte en `archivo` (ruta o archivo binario). `filas` es un
+    iterable de listas de celdas (se consume una sola vez); `anchos` en puntos.
+    cabecera=False omite título e información (partes que continúan un
+    reporte) y pagina_inicial desplaza la numeración del pie.
+    Retorna la cantidad de páginas.
+    """
+    doc = _documento(archivo, pagesize)
+
+    elementos = _cabecera(titulo, info) if cabecera else []
+    primera, siguientes = _capacidad(doc, elementos)
+
+    flowables = _FlowablesPerezosos(_paginas(encabezados, filas, anchos, primera, siguientes))
+    flowables.extend(elementos)
+    pie = partial(_pie, desplazamiento=pagina_inicial - 1)
+    doc.build(flowables, onFirstPage=pie, onLaterPages=pie)
+    return doc.page
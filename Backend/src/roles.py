@@ -0,0 +1,101 @@
+"""
+Resolución del rol RBAC del usuario sin consultas en los chequeos de permisos.
+
+El rol se resuelve una sola vez por request (queda en request.rol) en este
+orden:
+
+1. Claim "rol" del access token JWT, si el token lo trae.
+2. Perfil ya cargado en el usuario (JWTAuthenticationPerfil lo trae con
+   select_related al autenticar).
+3. Caché LRU por proceso usuario_id -> rol.
+4. Consulta de solo la columna rol, que se guarda en la caché.
+
+La caché se invalida al guardar o eliminar un PerfilUsuario (src/signals.py).
+Esa invalidación es local al proceso: en los demás workers una entrada
+vive como máximo CACHE_TTL segundos.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_MAXIMO = 4096
+CACHE_TTL = 60          # segundos
+
+_PENDIENTE = object()
+_cache_roles = OrderedDict()        # usuario_id -> (rol, expira)
+_lock = threading.Lock()
+
+
+def _rol_en_cache(usuario_id):
+    with _lock:
+        entrada = _cache_roles.get(usuario_id)
+        if entrada is None:
+            return _PENDIENTE
+        rol, expira = entrada
+        if expira < time.monotonic():
+            del _cache_roles[usuario_id]
+            return _PENDIENTE
+        _cache_roles.move_to_end(usuario_id)
+        return rol
+
+
+def _guardar_en_cache(usuario_id, rol):
+    with _lock:
+        _cache_roles[usuario_id] = (rol, time.monotonic() + CACHE_TTL)
+        _cache_roles.move_to_end(usuario_id)
+        if len(_cache_roles) > CACHE_MAXIMO:
+            _cache_roles.popitem(last=False)
+
+
+def invalidar_rol(usuario_id):
+    with _lock:
+        _cache_roles.pop(usuario_id, None)
+
+
+def limpiar_cache_roles():
+    with _lock:
+        _cache_roles.clear()
+
+
+def rol_de_usuario(user):
+    """Rol del perfil del usuario (None si no tiene perfil o no está autenticado)"""
+    if not user or not user.is_authenticated:
+        return None
+
+    rol = getattr(user, '_rol_resuelto', _PENDIENTE)
+    if rol is not _PENDIENTE:
+        return rol
+
+    campo_perfil = user._meta.get_field('perfil')
+    if campo_perfil.is_cached(user):
+        # Con select_related y sin perfil, el valor en caché es None
+        perfil = campo_perfil.get_cached_value(user)
+        rol = perfil.rol if perfil else None
+        _guardar_en_cache(user.pk, rol)
+    else:
+        rol = _rol_en_cache(user.pk)
+        if rol is _PENDIENTE:
+            from src.models import PerfilUsuario
+            rol = PerfilUsuario.objects.filter(usuario_id=user.pk).values_list('rol', flat=True).first()
+            _guardar_en_cache(user.pk, rol)
+
+    user._rol_resuelto = rol
+    return rol
+
+
+def rol_de_request(request):
+    """
+    Rol del usuario del request, resuelto una sola vez y guardado en
+    request.rol (visible tanto en el Request de DRF como en el HttpRequest).
+    """
+    rol = getattr(request, 'rol', _PENDIENTE)
+    if rol is not _PENDIENTE:
+        return rol
+
+    token = getattr(request, 'auth', None)
+    rol = token.get('rol', _PENDIENTE) if hasattr(token, 'get') else _PENDIENTE
+    if rol is _PENDIENTE:
+        rol = rol_de_usuario(getattr(request, 'user', None))
+
+    getattr(request, '_request', request).rol = rol
+    return rol
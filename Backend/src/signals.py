@@ -1,8 +1,10 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 
-from .models import Registro, Auditoria, Calificacion
+from .models import Registro, Auditoria, Calificacion, PerfilUsuario
+from .roles import invalidar_rol, rol_de_usuario
+from .tokens import incrementar_version_permisos, olvidar_version_permisos
 
 
 # -------------------------------
@@ -13,8 +15,81 @@ def obtener_rol(user):
         return "DESCONOCIDO"
     if user.is_superuser:
         return "ADMIN"
-    perfil = getattr(user, "perfil", None)
-    return perfil.rol if perfil else "SIN_ROL"
+    return rol_de_usuario(user) or "SIN_ROL"
+
+
+# -------------------------------
+# CACHÉ DE ROLES (src/roles.py)
+# -------------------------------
+@receiver(post_save, sender=PerfilUsuario)
+@receiver(post_delete, sender=PerfilUsuario)
+def invalidar_cache_rol(sender, instance, **kwargs):
+    invalidar_rol(instance.usuario_id)
+
+
+# -------------------------------
+# VERSIÓN DE PERMISOS (src/tokens.py)
+# -------------------------------
+# Un cambio en estos campos invalida los access tokens del usuario. username e
+# is_superuser viajan como claims (JWTAuthenticationClaims arma el usuario con ellos)
+CAMPOS_PERMISOS_USUARIO = ('is_active', 'is_superuser', 'password', 'username')
+
+
+def _campos_guardados(campos, update_fields):
+    return [c for c in campos if update_fields is None or c in update_fields]
+
+
+@receiver(pre_save, sender=User)
+def detectar_cambio_permisos_usuario(sender, instance, raw=False, update_fields=None, **kwargs):
+    # update_last_login guarda solo last_login: no consulta nada
+    campos = _campos_guardados(CAMPOS_PERMISOS_USUARIO, update_fields)
+    instance._permisos_cambiados = False
+    if raw or instance.pk is None or not campos:
+        return
+    anterior = User.objects.filter(pk=instance.pk).values(*campos).first()
+    instance._permisos_cambiados = anterior is not None and any(
+        anterior[campo] != getattr(instance, campo) for campo in campos
+    )
+
+
+@receiver(post_save, sender=User)
+def versionar_permisos_usuario(sender, instance, **kwargs):
+    if not getattr(instance, '_permisos_cambiados', False):
+        return
+    version = incrementar_version_permisos(instance.pk)
+    campo_perfil = User._meta.get_field('perfil')
+    if version is not None and campo_perfil.is_cached(instance):
+        campo_perfil.get_cached_value(instance).version_permisos = version
+
+
+@receiver(pre_save, sender=PerfilUsuario)
+def detectar_cambio_rol(sender, instance, raw=False, update_fields=None, **kwargs):
+    instance._permisos_cambiados = False
+    campos = _campos_guardados(('rol', 'version_permisos'), update_fields)
+    if raw or instance.pk is None or not campos:
+        return
+    anterior = PerfilUsuario.objects.filter(pk=instance.pk).values('rol', 'version_permisos').first()
+    if anterior is None:
+        return
+    # La versión solo cambia con incrementar_version_permisos: una instancia
+    # cargada antes de un incremento no debe volver a escribir la anterior
+    instance.version_permisos = anterior['version_permisos']
+    instance._permisos_cambiados = 'rol' in campos and anterior['rol'] != instance.rol
+
+
+@receiver(post_save, sender=PerfilUsuario)
+def versionar_permisos_perfil(sender, instance, created, raw=False, **kwargs):
+    # Perfil nuevo: también se publica su versión (puede quedar una en Redis de un perfil anterior)
+    if raw or not (created or getattr(instance, '_permisos_cambiados', False)):
+        return
+    version = incrementar_version_permisos(instance.usuario_id)
+    if version is not None:
+        instance.version_permisos = version
+
+
+@receiver(post_delete, sender=PerfilUsuario)
+def olvidar_permisos_perfil(sender, instance, **kwargs):
+    olvidar_version_permisos(instance.usuario_id)
 
 
 # ===============================
@@ -0,0 +1,296 @@
+"""
+Simulación ("dry run") de una regla de negocio sobre las calificaciones existentes.
+
+Antes de activar una versión nueva de una ReglaNegocio se puede medir a
+cuántas calificaciones afectaría, sin modificar nada:
+
+- Cursor proyectado: solo se leen los campos que usa la condición
+  (más estado y periodo para el desglose).
+- Muestreo opcional en el servidor ($rand), para estimaciones rápidas.
+- Paralelismo: la colección se parte en rangos de _id (por fecha del
+  ObjectId) y cada rango se evalúa en un proceso distinto, por lotes
+  vectorizados (src/reglas_vectorizadas.py).
+- Si la regla ya existe, la versión actual se evalúa en la misma pasada
+  para reportar cuántas coincidencias son nuevas y cuántas se pierden.
+
+Los procesos se inician con spawn (como src/exportacion_paralela.py): el
+simulador corre en hilos de un worker web y fork duplicaría locks,
+conexiones a BD y sockets de Redis heredados. Desde la API, las
+simulaciones en varios procesos corren en segundo plano
+(SimulacionRegla, ejecutar_simulacion).
+
+Este módulo no importa modelos al cargarse: los procesos hijos lo
+importan antes de inicializar Django.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+
+from bson.objectid import ObjectId
+
+from src.motor_reglas import ReglaInvalida, a_texto, compilar_condicion
+from src.mongodb_utils import get_mongo_db
+from src.reglas_vectorizadas import LOTE_DEFECTO, evaluar_lote, proyeccion_mongo
+
+PROCESOS_MAXIMO = 8
+PROCESOS_DEFECTO = min(4, os.cpu_count() or 1)
+# Rangos por proceso: más rangos que procesos reparte mejor la carga
+RANGOS_POR_PROCESO = 4
+
+SIN_VALOR = "(sin valor)"
+
+METODO_INICIO = 'spawn'
+
+logger = logging.getLogger(__name__)
+
+
+class SimulacionInvalida(ValueError):
+    pass
+
+
+def _compilar(clave, condicion):
+    ast, evaluar = compilar_condicion(condicion)
+    return SimpleNamespace(id=clave, ast=ast, evaluar=evaluar)
+
+
+def _filtro_base(estado=None, muestra=1.0):
+    filtro = {}
+    if estado:
+        filtro['estado'] = estado
+    if muestra < 1:
+        filtro['$expr'] = {'$lt': [{'$rand': {}}, muestra]}
+    return filtro
+
+
+def _rangos_id(coleccion, filtro, cantidad):
+    """
+    Parte la colección en `cantidad` rangos de _id según la fecha del ObjectId.
+    Retorna una lista de filtros sobre _id ({} = sin restricción).
+    """
+    primero = coleccion.find_one(filtro, {'_id': 1}, sort=[('_id', 1)])
+    ultimo = coleccion.find_one(filtro, {'_id': 1}, sort=[('_id', -1)])
+    if cantidad <= 1 or primero is None or not isinstance(primero['_id'], ObjectId) \
+            or not isinstance(ultimo['_id'], ObjectId):
+        return [{}]
+
+    inicio = primero['_id'].generation_time
+    paso = (ultimo['_id'].generation_time + timedelta(seconds=1) - inicio) / cantidad
+    # ObjectId.from_datetime trunca a segundos: se descartan cortes repetidos
+    cortes = sorted({ObjectId.from_datetime(inicio + paso * i) for i in range(1, cantidad)})
+    cortes = [corte for corte in cortes if corte > primero['_id']]
+    if not cortes:
+        return [{}]
+
+    rangos = [{'$lt': cortes[0]}]
+    rangos.extend({'$gte': a, '$lt': b} for a, b in zip(cortes, cortes[1:]))
+    rangos.append({'$gte': cortes[-1]})
+    return rangos
+
+
+def _contar(resultado, documentos, conteo):
+    """Suma al conteo un lote evaluado (regla 0 = candidata, 1 = versión actual)"""
+    candidata = resultado.mascara(0)
+    actual = resultado.mascara(1) if len(resultado.reglas) > 1 else None
+
+    for fila, documento in enumerate(documentos):
+        coincide = candidata[fila]
+        estado = documento.get('estado') or SIN_VALOR
+        periodo = a_texto(documento.get('periodo')) or SIN_VALOR
+
+        for grupo, clave in (('por_estado', estado), ('por_periodo', periodo)):
+            celda = conteo[grupo].setdefault(clave, {'evaluadas': 0, 'coincidencias': 0})
+            celda['evaluadas'] += 1
+            celda['coincidencias'] += coincide
+
+        conteo['evaluadas'] += 1
+        conteo['coincidencias'] += coincide
+        if actual is not None:
+            conteo['coincidencias_actual'] += actual[fila]
+            conteo['nuevas'] += coincide and not actual[fila]
+            conteo['dejan'] += actual[fila] and not coincide
+
+
+def _conteo_vacio():
+    return {
+        'evaluadas': 0, 'coincidencias': 0,
+        'coincidencias_actual': 0, 'nuevas': 0, 'dejan': 0,
+        'por_estado': {}, 'por_periodo': {},
+    }
+
+
+def _simular_rango(condicion, condicion_actual, filtro, proyeccion, lote):
+    """Evalúa un rango de la colección (se ejecuta en un proceso del pool o en línea)"""
+    reglas = [_compilar(0, condicion)]
+    if condicion_actual:
+        reglas.append(_compilar(1, condicion_actual))
+
+    coleccion = get_mongo_db()['calificaciones']
+    conteo = _conteo_vacio()
+    documentos = []
+    for documento in coleccion.find(filtro, proyeccion).batch_size(lote):
+        documentos.append(documento)
+        if len(documentos) >= lote:
+            _contar(evaluar_lote(reglas, documentos), documentos, conteo)
+            documentos = []
+    if documentos:
+        _contar(evaluar_lote(reglas, documentos), documentos, conteo)
+    return conteo
+
+
+def _iniciar_proceso():
+    # Proceso nuevo (spawn): Django se inicializa y Mongo se conecta desde cero
+    import django
+    django.setup()
+
+
+def procesos_efectivos(procesos):
+    """Procesos que usará la simulación (acotados por PROCESOS_MAXIMO y los núcleos)"""
+    return min(procesos, PROCESOS_MAXIMO, os.cpu_count() or 1)
+
+
+def _combinar(total, parcial):
+    for clave, valor in parcial.items():
+        if isinstance(valor, dict):
+            for grupo, celda in valor.items():
+                destino = total[clave].setdefault(grupo, {'evaluadas': 0, 'coincidencias': 0})
+                destino['evaluadas'] += celda['evaluadas']
+                destino['coincidencias'] += celda['coincidencias']
+        else:
+            total[clave] += valor
+
+
+def simular_regla(condicion, regla=None, muestra=1.0, procesos=PROCESOS_DEFECTO, estado=None, lote=LOTE_DEFECTO):
+    """
+    Evalúa `condicion` sobre las calificaciones de MongoDB sin modificarlas.
+    `regla` (ReglaNegocio existente) agrega la comparación con su versión actual.
+    Lanza ReglaInvalida si la condición no compila y SimulacionInvalida si
+    los parámetros no son válidos.
+    """
+    if not 0 < muestra <= 1:
+        raise SimulacionInvalida("muestra debe estar entre 0 (exclusivo) y 1")
+    if procesos < 1:
+        raise SimulacionInvalida("procesos debe ser mayor que 0")
+    procesos = procesos_efectivos(procesos)
+
+    reglas = [_compilar(0, condicion)]  # valida antes de lanzar procesos
+    condicion_actual = None
+    if regla is not None:
+        try:
+            reglas.append(_compilar(1, regla.condicion))
+            condicion_actual = regla.condicion
+        except ReglaInvalida:
+            pass  # versión actual inválida: sin comparación
+
+    proyeccion = {'_id': 1, 'estado': 1, 'periodo': 1, **proyeccion_mongo(reglas)}
+    filtro = _filtro_base(estado, muestra)
+    inicio = time.monotonic()
+
+    rangos = [{}]
+    if procesos > 1:
+        coleccion = get_mongo_db()['calificaciones']
+        rangos = _rangos_id(coleccion, _filtro_base(estado), procesos * RANGOS_POR_PROCESO)
+    filtros = [{**filtro, '_id': rango} if rango else filtro for rango in rangos]
+
+    total = _conteo_vacio()
+    if len(filtros) == 1:
+        for filtro_rango in filtros:
+            _combinar(total, _simular_rango(condicion, condicion_actual, filtro_rango, proyeccion, lote))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=procesos,
+            mp_context=multiprocessing.get_context(METODO_INICIO),
+            initializer=_iniciar_proceso,
+        ) as pool:
+            futuros = [
+                pool.submit(_simular_rango, condicion, condicion_actual, filtro_rango, proyeccion, lote)
+                for filtro_rango in filtros
+            ]
+            for futuro in futuros:
+                _combinar(total, futuro.result())
+
+    resultado = {
+        "condicion": condicion,
+        "muestra": muestra,
+        "procesos": procesos,
+        "rangos": len(filtros),
+        "evaluadas": total['evaluadas'],
+        "coincidencias": total['coincidencias'],
+        "porcentaje": round(100 * total['coincidencias'] / total['evaluadas'], 2) if total['evaluadas'] else 0.0,
+        "por_estado": dict(sorted(total['por_estado'].items())),
+        "por_periodo": dict(sorted(total['por_periodo'].items())),
+        "duracion_ms": round((time.monotonic() - inicio) * 1000),
+    }
+    if muestra < 1:
+        # Estimación para toda la colección a partir de la muestra
+        resultado["estimado_evaluadas"] = round(total['evaluadas'] / muestra)
+        resultado["estimado_coincidencias"] = round(total['coincidencias'] / muestra)
+    if regla is not None:
+        resultado["regla_id"] = regla.id
+        resultado["version_actual"] = regla.version
+        resultado["comparacion"] = {
+            "condicion_actual": regla.condicion,
+            "coincidencias_actual": total['coincidencias_actual'],
+            "nuevas": total['nuevas'],
+            "dejan": total['dejan'],
+        } if condicion_actual else None
+    return resultado
+
+
+# ===============================
+# SIMULACIÓN EN SEGUNDO PLANO
+# ===============================
+def crear_simulacion(usuario, condicion, regla=None, muestra=1.0, procesos=PROCESOS_DEFECTO, estado=None):
+    """
+    Registra una simulación para ejecutar_simulacion. Valida antes la
+    condición y los parámetros (ReglaInvalida / SimulacionInvalida).
+    """
+    from src.models import SimulacionRegla
+
+    if not 0 < muestra <= 1:
+        raise SimulacionInvalida("muestra debe estar entre 0 (exclusivo) y 1")
+    if procesos < 1:
+        raise SimulacionInvalida("procesos debe ser mayor que 0")
+    _compilar(0, condicion)
+
+    return SimulacionRegla.objects.create(
+        condicion=condicion,
+        regla=regla,
+        parametros={'muestra': muestra, 'procesos': procesos, 'estado': estado},
+        solicitado_por=usuario,
+    )
+
+
+def ejecutar_simulacion(simulacion_id):
+    """Ejecuta una SimulacionRegla y guarda su resultado o el error"""
+    from django.utils import timezone
+    from src.models import SimulacionRegla
+
+    simulacion = SimulacionRegla.objects.select_related('regla').get(pk=simulacion_id)
+    try:
+        simulacion.resultado = simular_regla(simulacion.condicion, regla=simulacion.regla, **simulacion.parametros)
+        simulacion.estado = "COMPLETADA"
+    except Exception as exc:
+        simulacion.estado = "FALLIDA"
+        simulacion.error = str(exc)
+        logger.exception("Simulación %s falló", simulacion.id)
+    simulacion.fecha_fin = timezone.now()
+    simulacion.save(update_fields=['estado', 'resultado', 'error', 'fecha_fin'])
+    return simulacion
+
+
+def serializar_simulacion(simulacion):
+    return {
+        "id": simulacion.id,
+        "estado": simulacion.estado,
+        "condicion": simulacion.condicion,
+        "regla_id": simulacion.regla_id,
+        "parametros": simulacion.parametros,
+        "resultado": simulacion.resultado,
+        "error": simulacion.error,
+        "fecha_creacion": simulacion.fecha_creacion.isoformat(),
+        "fecha_fin": simulacion.fecha_fin.isoformat() if simulacion.fecha_fin else None,
+    }
@@ -0,0 +1,120 @@
+"""
+Utilidades para respuestas en streaming (exportaciones grandes).
+
+Las filas se generan desde un iterador y se agrupan en bloques; nada
+se acumula en memoria del worker, así que el consumo es constante
+sin importar cuántas filas se exporten.
+
+La compresión gzip puede ser del archivo (descarga .gz) o de transporte
+(Content-Encoding: gzip, negociado con Accept-Encoding): en el segundo
+caso el cliente recibe el archivo original descomprimido al vuelo.
+"""
+import csv
+import json
+import zlib
+from io import StringIO
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+# Cantidad de filas que se serializan juntas antes de entregar un bloque
+FILAS_POR_BLOQUE = 500
+
+
+def bloques_csv(encabezados, filas, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Serializa filas (iterables) a CSV en bloques de texto (encabezados=None: sin encabezado)"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    pendientes = 0
+    if encabezados is not None:
+        writer.writerow(encabezados)
+        pendientes = 1
+
+    for fila in filas:
+        writer.writerow(fila)
+        pendientes += 1
+        if pendientes >= filas_por_bloque:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendientes = 0
+
+    if pendientes:
+        yield buffer.getvalue()
+
+
+def bloques_ndjson(documentos, filas_por_bloque=FILAS_POR_BLOQUE):
+    """Serializa dicts a NDJSON (un documento JSON por línea) en bloques"""
+    lineas = []
+    for documento in documentos:
+        lineas.append(json.dumps(documento, cls=DjangoJSONEncoder, ensure_ascii=False))
+        if len(lineas) >= filas_por_bloque:
+            yield "\n".join(lineas) + "\n"
+            lineas = []
+
+    if lineas:
+        yield "\n".join(lineas) + "\n"
+
+
+def comprimir_gzip(bloques, nivel=6):
+    """
+    Compresión gzip incremental: cada bloque se comprime al pasar,
+    sin esperar al final del contenido.
+    """
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+    primero = True
+    for bloque in bloques:
+        if isinstance(bloque, str):
+            bloque = bloque.encode('utf-8')
+        comprimido = compresor.compress(bloque)
+        if primero:
+            # El primer bloque sale de inmediato (tiempo al primer byte constante);
+            # después zlib entrega cuando acumula suficiente para comprimir bien
+            comprimido += compresor.flush(zlib.Z_SYNC_FLUSH)
+            primero = False
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+def acepta_gzip(request):
+    """True si el cliente acepta Content-Encoding: gzip (cabecera Accept-Encoding)"""
+    calidades = {}
+    for codificacion in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        nombre, _, parametros = codificacion.partition(';')
+        calidad = 1.0
+        parametros = parametros.strip().lower()
+        if parametros.startswith('q='):
+            try:
+                calidad = float(parametros[2:])
+            except ValueError:
+                calidad = 0.0
+        calidades[nombre.strip().lower()] = calidad
+    # Una mención explícita de gzip tiene prioridad sobre el comodín
+    return calidades.get('gzip', calidades.get('*', 0.0)) > 0
+
+
+def respuesta_streaming(bloques, content_type, nombre_archivo, gzip=False, request=None):
+    """
+    StreamingHttpResponse de descarga.
+    gzip=True entrega el archivo comprimido (.gz) en lugar del texto plano.
+    Con `request`, se comprime el transporte (Content-Encoding: gzip) si
+    el cliente lo acepta.
+    """
+    codificar = False
+    if gzip:
+        bloques = comprimir_gzip(bloques)
+        content_type = 'application/gzip'
+        nombre_archivo = f"{nombre_archivo}.gz"
+    elif request is not None and acepta_gzip(request):
+        bloques = comprimir_gzip(bloques)
+        codificar = True
+
+    response = StreamingHttpResponse(bloques, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{nombre_archivo}"'
+    if codificar:
+        response['Content-Encoding'] = 'gzip'
+    if request is not None:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
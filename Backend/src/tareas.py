@@ -0,0 +1,29 @@
+"""
+Ejecución de tareas largas fuera del ciclo request/response.
+Las tareas guardan su propio estado en BD, por lo que si el proceso
+se reinicia pueden reanudarse con su comando de gestión.
+"""
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+def ejecutar_en_segundo_plano(funcion, *args, nombre=None, **kwargs):
+    """
+    Lanza funcion(*args, **kwargs) en un hilo daemon.
+    Cierra las conexiones a BD del hilo al terminar para no dejarlas abiertas.
+    """
+    def _ejecutar():
+        try:
+            funcion(*args, **kwargs)
+        except Exception:
+            logger.exception("Error en tarea en segundo plano %s", nombre or funcion.__name__)
+        finally:
+            connections.close_all()
+
+    hilo = threading.Thread(target=_ejecutar, name=nombre or funcion.__name__, daemon=True)
+    hilo.start()
+    return hilo
@@ -0,0 +1,306 @@
+"""
+Exportaciones de calificaciones en segundo plano, con artefacto en disco.
+
+POST crea una TareaExportacion; un ejecutor (hilo de src/tareas.py o el
+comando procesar_exportaciones) escribe el archivo en MEDIA_ROOT/exports/
+y el cliente consulta el estado hasta obtener el enlace de descarga.
+
+Los artefactos se identifican por una clave sha256 de formato + filtros
+normalizados + versión de los datos filtrados (cantidad de documentos y
+máxima fecha_actualizacion). Una exportación idéntica mientras los datos
+no cambien reutiliza la tarea en curso o el archivo ya generado, que se
+conserva hasta TTL y luego se elimina con limpiar_expiradas().
+
+Las exportaciones grandes se generan por partes en varios procesos
+(src/exportacion_paralela.py).
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from src.exportacion import (
+    ExportacionInvalida,
+    filtro_mongo,
+    parametros_exportacion,
+    queryset_exportacion,
+)
+from src.exportacion_paralela import generar_exportacion
+from src.formatos_exportacion import FORMATOS
+from src.models import TareaExportacion
+from src.mongodb_utils import get_mongo_db
+
+logger = logging.getLogger(__name__)
+
+# Tiempo que se conserva un artefacto generado
+TTL = timedelta(hours=24)
+
+# Una tarea EN_CURSO sin latido en este tiempo se considera abandonada
+# (proceso reiniciado) y puede ser retomada por otro ejecutor.
+TIEMPO_ABANDONO = timedelta(minutes=30)
+
+# Mínimo entre dos latidos de una tarea en curso (cada latido es un UPDATE)
+INTERVALO_LATIDO = timedelta(minutes=1)
+
+DIRECTORIO = 'exports'
+
+# Query params que forman parte de la clave (el resto se ignora)
+PARAMETROS = ('fuente', 'estado', 'periodo', 'tipo_certificado', 'dias', 'fecha_desde', 'fecha_hasta')
+
+
+def directorio_exportaciones():
+    return Path(settings.MEDIA_ROOT) / DIRECTORIO
+
+
+def normalizar_parametros(query_params):
+    """Query params relevantes, sin vacíos y con la fuente explícita"""
+    normalizados = {
+        nombre: str(query_params.get(nombre)).strip()
+        for nombre in PARAMETROS
+        if query_params.get(nombre) not in (None, '')
+    }
+    normalizados.setdefault('fuente', 'mongo')
+    return normalizados
+
+
+def version_datos(parametros):
+    """
+    Versión de los datos que cubre la exportación: cantidad de filas y
+    máxima fecha de actualización dentro del filtro. Cualquier alta, baja
+    o modificación dentro del filtro cambia la versión.
+    """
+    if parametros['fuente'] == 'postgres':
+        agregado = queryset_exportacion(
+            parametros['estado'], parametros['desde'], parametros['hasta']
+        ).order_by().aggregate(total=Count('id'), ultima=Max('fecha_actualizacion'))
+        ultima = agregado['ultima']
+        return f"{agregado['total']}:{ultima.isoformat() if ultima else ''}"
+
+    filtro = filtro_mongo(**{k: v for k, v in parametros.items() if k != 'fuente'})
+    coleccion = get_mongo_db()['calificaciones']
+    total = coleccion.count_documents(filtro)
+    ultimo = next(
+        coleccion.find(filtro, {'fecha_actualizacion': 1}).sort('fecha_actualizacion', -1).limit(1),
+        None
+    )
+    ultima = ultimo.get('fecha_actualizacion') if ultimo else None
+    return f"{total}:{ultima.isoformat() if hasattr(ultima, 'isoformat') else ultima or ''}"
+
+
+def clave_exportacion(formato, normalizados, version):
+    contenido = json.dumps(
+        {'formato': formato, 'parametros': normalizados, 'version': version},
+        sort_keys=True
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _vigente(tarea, ahora):
+    """La tarea sirve para una solicitud idéntica"""
+    if tarea.estado == "COMPLETADA":
+        return (
+            tarea.expira_en is not None and tarea.expira_en > ahora
+            and (Path(settings.MEDIA_ROOT) / tarea.archivo).is_file()
+        )
+    if tarea.estado == "EN_CURSO":
+        return tarea.fecha_actualizacion >= ahora - TIEMPO_ABANDONO
+    return tarea.estado == "PENDIENTE"
+
+
+def crear_o_reutilizar(usuario, formato, query_params):
+    """
+    Retorna (tarea, reutilizada). Lanza ExportacionInvalida si el formato
+    o los filtros no son válidos.
+    """
+    if formato not in FORMATOS:
+        raise ExportacionInvalida(f"formato debe ser uno de: {', '.join(FORMATOS)}")
+    _, _, _, disponible, mensaje = FORMATOS[formato]
+    if not disponible:
+        raise ExportacionInvalida(mensaje)
+
+    normalizados = normalizar_parametros(query_params)
+    parametros = parametros_exportacion(normalizados)
+    version = version_datos(parametros)
+    clave = clave_exportacion(formato, normalizados, version)
+
+    ahora = timezone.now()
+    for tarea in TareaExportacion.objects.filter(
+        clave=clave, estado__in=["PENDIENTE", "EN_CURSO", "COMPLETADA"]
+    ):
+        if _vigente(tarea, ahora):
+            return tarea, True
+
+    tarea = TareaExportacion.objects.create(
+        formato=formato,
+        parametros=normalizados,
+        version_datos=version,
+        clave=clave,
+        solicitado_por=usuario,
+    )
+    return tarea, False
+
+
+def tareas_reanudables():
+    """Tareas pendientes o abandonadas a mitad de camino"""
+    abandono = timezone.now() - TIEMPO_ABANDONO
+    return TareaExportacion.objects.filter(
+        Q(estado="PENDIENTE") | Q(estado="EN_CURSO", fecha_actualizacion__lt=abandono)
+    ).order_by('fecha_creacion')
+
+
+def _reclamar_tarea(tarea_id):
+    """
+    Marca la tarea EN_CURSO de forma atómica.
+    Retorna False si otro ejecutor ya la está procesando.
+    """
+    abandono = timezone.now() - TIEMPO_ABANDONO
+    return TareaExportacion.objects.filter(
+        Q(estado="PENDIENTE") | Q(estado="EN_CURSO", fecha_actualizacion__lt=abandono),
+        pk=tarea_id,
+    ).update(estado="EN_CURSO", fecha_actualizacion=timezone.now()) == 1
+
+
+def latido_tarea(tarea_id, temporal=None):
+    """
+    Función de latido para generar_exportacion: renueva fecha_actualizacion
+    de la tarea (a lo sumo una vez por INTERVALO_LATIDO) para que no se
+    tome por abandonada, y la fecha de modificación del temporal para que
+    limpiar_expiradas() no lo borre mientras se generan las partes.
+    """
+    ultimo = time.monotonic()
+
+    def latido():
+        nonlocal ultimo
+        ahora = time.monotonic()
+        if ahora - ultimo < INTERVALO_LATIDO.total_seconds():
+            return
+        ultimo = ahora
+        TareaExportacion.objects.filter(pk=tarea_id, estado="EN_CURSO").update(
+            fecha_actualizacion=timezone.now()
+        )
+        if temporal:
+            try:
+                os.utime(temporal)
+            except OSError:
+                pass
+
+    return latido
+
+
+def ejecutar_tarea_exportacion(tarea_id):
+    """
+    Genera el artefacto de una tarea. Se escribe a un temporal en el mismo
+    directorio y se renombra al final (os.replace), así una descarga nunca
+    ve un archivo a medio escribir.
+    """
+    if not _reclamar_tarea(tarea_id):
+        logger.info("Tarea de exportación %s ya está en curso o finalizada", tarea_id)
+        return None
+
+    tarea = TareaExportacion.objects.get(pk=tarea_id)
+    extension = FORMATOS[tarea.formato][0]
+    directorio = directorio_exportaciones()
+    temporal = None
+
+    try:
+        parametros = parametros_exportacion(tarea.parametros)
+        directorio.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directorio, suffix='.tmp', delete=False) as archivo:
+            temporal = archivo.name
+            filas = generar_exportacion(
+                tarea.formato, archivo, parametros, latido=latido_tarea(tarea.id, temporal)
+            )
+
+        nombre = f"{tarea.clave}.{extension}"
+        os.replace(temporal, directorio / nombre)
+        temporal = None
+
+        tarea.archivo = f"{DIRECTORIO}/{nombre}"
+        tarea.tamanio = (directorio / nombre).stat().st_size
+        tarea.filas = filas
+    except Exception as exc:
+        if temporal:
+            try:
+                os.remove(temporal)
+            except OSError:
+                pass
+        tarea.estado = "FALLIDA"
+        tarea.error = str(exc)
+        tarea.save(update_fields=['estado', 'error', 'fecha_actualizacion'])
+        logger.exception("Tarea de exportación %s falló", tarea.id)
+        raise
+
+    tarea.estado = "COMPLETADA"
+    tarea.fecha_fin = timezone.now()
+    tarea.expira_en = tarea.fecha_fin + TTL
+    tarea.save(update_fields=[
+        'estado', 'archivo', 'tamanio', 'filas', 'fecha_fin', 'expira_en', 'fecha_actualizacion'
+    ])
+    return tarea
+
+
+def limpiar_expiradas():
+    """
+    Marca EXPIRADA las tareas completadas cuyo TTL venció y elimina sus
+    archivos (salvo que una tarea vigente con la misma clave los use),
+    junto con temporales de ejecuciones abandonadas.
+    Retorna la cantidad de tareas expiradas.
+    """
+    ahora = timezone.now()
+    vencidas = list(TareaExportacion.objects.filter(estado="COMPLETADA", expira_en__lte=ahora))
+    en_uso = set(
+        TareaExportacion.objects
+        .filter(estado="COMPLETADA", expira_en__gt=ahora)
+        .values_list('archivo', flat=True)
+    )
+
+    for tarea in vencidas:
+        if tarea.archivo and tarea.archivo not in en_uso:
+            try:
+                os.remove(Path(settings.MEDIA_ROOT) / tarea.archivo)
+            except FileNotFoundError:
+                pass
+    TareaExportacion.objects.filter(pk__in=[t.pk for t in vencidas]).update(
+        estado="EXPIRADA", fecha_actualizacion=ahora
+    )
+
+    directorio = directorio_exportaciones()
+    if directorio.is_dir():
+        limite = time.time() - TIEMPO_ABANDONO.total_seconds()
+        for temporal in directorio.glob('*.tmp'):
+            try:
+                if temporal.stat().st_mtime < limite:
+                    temporal.unlink()
+            except FileNotFoundError:
+                pass
+
+    return len(vencidas)
+
+
+def serializar_tarea_exportacion(tarea):
+    """Representación de la tarea para las respuestas de la API"""
+    descarga = None
+    if tarea.estado == "COMPLETADA" and tarea.expira_en and tarea.expira_en > timezone.now():
+        descarga = f"/api/exportar/tareas/{tarea.id}/descargar/"
+    return {
+        "id": tarea.id,
+        "formato": tarea.formato,
+        "parametros": tarea.parametros,
+        "estado": tarea.estado,
+        "filas": tarea.filas,
+        "tamanio": tarea.tamanio,
+        "descarga": descarga,
+        "error": tarea.error,
+        "fecha_creacion": tarea.fecha_creacion.isoformat(),
+        "fecha_actualizacion": tarea.fecha_actualizacion.isoformat(),
+        "fecha_fin": tarea.fecha_fin.isoformat() if tarea.fecha_fin else None,
+        "expira_en": tarea.expira_en.isoformat() if tarea.expira_en else None,
+    }
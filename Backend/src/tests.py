@@ -149,6 +149,603 @@ class PermissionTests(TestCase):
         self.assertIsNotNone(self.user.id)
         self.assertEqual(self.user.username, 'testuser')
 
+    def test_rol_en_cache_e_invalidacion(self):
+        """Test que el rol se resuelve una vez por request y se invalida al guardar el perfil"""
+        from types import SimpleNamespace
+        from src.models import PerfilUsuario
+        from src.roles import limpiar_cache_roles, rol_de_request
+        limpiar_cache_roles()
+        perfil, _ = PerfilUsuario.objects.update_or_create(usuario=self.user, defaults={'rol': 'AUDITOR'})
+
+        def request():
+            return SimpleNamespace(user=User.objects.get(pk=self.user.pk), auth=None)
+
+        self.assertEqual(rol_de_request(request()), 'AUDITOR')
+        req = request()
+        with self.assertNumQueries(0):
+            self.assertEqual(rol_de_request(req), 'AUDITOR')
+            self.assertEqual(req.rol, 'AUDITOR')
+
+        perfil.rol = 'TI'
+        perfil.save()
+        self.assertEqual(rol_de_request(request()), 'TI')
+        self.assertEqual(rol_de_request(SimpleNamespace(user=self.user, auth={'rol': 'ANALISTA'})), 'ANALISTA')
+
+    def test_token_con_claims_y_version_de_permisos(self):
+        """Test que el usuario sale de los claims y un cambio de permisos invalida el token"""
+        from rest_framework.exceptions import AuthenticationFailed
+        from rest_framework.test import APIRequestFactory
+        from src.authentication import JWTAuthenticationClaims
+        from src.models import PerfilUsuario
+        from src.tokens import RefreshTokenConClaims, access_token_actualizado, incrementar_version_permisos
+        PerfilUsuario.objects.update_or_create(usuario=self.user, defaults={'rol': 'ANALISTA'})
+        refresh = RefreshTokenConClaims.for_user(User.objects.get(pk=self.user.pk))
+
+        def autenticar(access):
+            request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}')
+            return JWTAuthenticationClaims().authenticate(request)[0]
+
+        user = autenticar(refresh.access_token)
+        self.assertEqual((user.pk, user.username, user._rol_resuelto), (self.user.pk, 'testuser', 'ANALISTA'))
+
+        incrementar_version_permisos(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            autenticar(refresh.access_token)
+        self.assertEqual(autenticar(access_token_actualizado(refresh)).pk, self.user.pk)
+
+    def test_version_de_permisos_por_senales(self):
+        """Test que cambios de rol, is_active, contraseña o username desde cualquier origen suben la versión"""
+        from django.contrib.auth.models import update_last_login
+        from src.models import PerfilUsuario
+        perfil = PerfilUsuario.objects.create(usuario=self.user, rol='ANALISTA')
+
+        def version():
+            return PerfilUsuario.objects.get(pk=perfil.pk).version_permisos
+
+        inicial = version()
+        update_last_login(None, self.user)
+        perfil.telefono = '+56911111111'
+        perfil.save()
+        self.assertEqual(version(), inicial)
+
+        perfil.rol = 'AUDITOR'
+        perfil.save()
+        self.assertEqual(version(), inicial + 1)
+
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(version(), inicial + 2)
+        user.set_password('OtraClave123!')
+        user.save(update_fields=['password'])
+        self.assertEqual(version(), inicial + 3)
+        user.username = 'renombrado'
+        user.save()
+        self.assertEqual(version(), inicial + 4)
+
+        # Una instancia cargada antes de los incrementos no reescribe la versión anterior
+        perfil.telefono = '+56922222222'
+        perfil.save()
+        self.assertEqual(version(), inicial + 4)
+
+    def test_bloom_blacklist_local(self):
+        """Test que el filtro de Bloom local usa el orden de bits de SETBIT y marca los jti revocados"""
+        import time
+        from src import blacklist_tokens
+        self.assertTrue(blacklist_tokens._bit_activo(b'\x00\x40', 9))      # SETBIT clave 9 1
+        self.assertFalse(blacklist_tokens._bit_activo(b'\x00\x40', 8))
+
+        hora = blacklist_tokens._tramo(time.time() + 60, blacklist_tokens.BLOOM_TRAMO_SEGUNDOS)
+        blacklist_tokens._blooms[hora] = (bytearray(), time.monotonic())
+        try:
+            posiciones = blacklist_tokens._posiciones_bloom('a' * 32)
+            self.assertEqual(len(set(posiciones)), blacklist_tokens.BLOOM_HASHES)
+            blacklist_tokens._marcar_bloom_local(hora, posiciones)
+            bitmap = blacklist_tokens._blooms[hora][0]
+            self.assertTrue(all(blacklist_tokens._bit_activo(bitmap, p) for p in posiciones))
+            self.assertFalse(all(blacklist_tokens._bit_activo(bitmap, p) for p in blacklist_tokens._posiciones_bloom('b' * 32)))
+        finally:
+            blacklist_tokens._blooms.pop(hora, None)
+
+    def test_rotacion_refresh_en_otro_worker(self):
+        """Test que un refresh token ya rotado se rechaza aunque el Bloom local no lo tenga"""
+        from unittest import mock
+        from rest_framework.test import APIRequestFactory
+        from src import blacklist_tokens
+        from src.models import PerfilUsuario
+        from src.tokens import RefreshTokenConClaims
+        from src.views import jwt_auth
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis no instalado")
+        PerfilUsuario.objects.update_or_create(usuario=self.user, defaults={'rol': 'ANALISTA'})
+        refresh = str(RefreshTokenConClaims.for_user(User.objects.get(pk=self.user.pk)))
+        servidor = fakeredis.FakeServer()
+        self.addCleanup(blacklist_tokens._blooms.clear)
+
+        def renovar():
+            request = APIRequestFactory().post('/api/token/refresh/', {'refresh': refresh}, format='json')
+            return jwt_auth.RefreshTokenView.as_view()(request)
+
+        with mock.patch.multiple(
+            blacklist_tokens,
+            r=fakeredis.FakeRedis(server=servidor, decode_responses=True),
+            _r_binario=fakeredis.FakeRedis(server=servidor),
+            REDIS_AVAILABLE=True,
+        ), mock.patch.object(jwt_auth, 'REDIS_AVAILABLE', True):
+            self.assertEqual(renovar().status_code, 200)
+            # Otro worker: su copia del Bloom se leyó antes de la rotación
+            with mock.patch.object(blacklist_tokens, '_bloom_local', return_value=bytearray()):
+                self.assertEqual(renovar().status_code, 401)
+
+    def test_contador_tokens_revocados(self):
+        """Test que el contador descuenta los tramos vencidos y reconciliar() lo reconstruye"""
+        import time
+        from types import SimpleNamespace
+        from unittest import mock
+        from src import blacklist_tokens
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis no instalado")
+        servidor = fakeredis.FakeServer()
+        reloj = [time.time()]
+        self.addCleanup(blacklist_tokens._blooms.clear)
+        with mock.patch.multiple(
+            blacklist_tokens,
+            r=fakeredis.FakeRedis(server=servidor, decode_responses=True),
+            _r_binario=fakeredis.FakeRedis(server=servidor),
+            REDIS_AVAILABLE=True,
+            time=SimpleNamespace(time=lambda: reloj[0], monotonic=time.monotonic),
+        ):
+            inicio = reloj[0]
+            # Tres tramos de vencimiento distintos, dos tokens en el último
+            for i, segundos in enumerate((30, 90, 300, 300)):
+                self.assertTrue(blacklist_tokens.revocar(f"{i:032d}", inicio + segundos))
+            self.assertFalse(blacklist_tokens.revocar(f"{0:032d}", inicio + 30))
+            self.assertTrue(blacklist_tokens.esta_revocado(f"{3:032d}", inicio + 300))
+            self.assertFalse(blacklist_tokens.esta_revocado(f"{9:032d}", inicio + 300))
+            self.assertEqual(blacklist_tokens.estadisticas()['tokens_blacklist_count'], 4)
+
+            reloj[0] = inicio + 160     # vencen los dos primeros tramos
+            self.assertEqual(blacklist_tokens.estadisticas()['tokens_blacklist_count'], 2)
+            self.assertEqual(blacklist_tokens.estadisticas()['tokens_blacklist_count'], 2)
+
+            blacklist_tokens.r.set(blacklist_tokens.CLAVE_TOTAL, 57)   # contador desviado
+            self.assertEqual(blacklist_tokens.reconciliar(lote=1), 2)
+            estadisticas = blacklist_tokens.estadisticas()
+            self.assertEqual(estadisticas['tokens_blacklist_count'], 2)
+            self.assertIsNotNone(estadisticas['ultima_reconciliacion'])
+
+            reloj[0] = inicio + 400
+            self.assertEqual(blacklist_tokens.estadisticas()['tokens_blacklist_count'], 0)
+
+
+@pytest.mark.unit
+class CadenaAuditoriaTests(TestCase):
+    """Tests de la cadena de hashes de auditoría"""
+
+    def setUp(self):
+        from src.models import Auditoria
+        for i in range(5):
+            Auditoria.objects.create(
+                rol='ADMIN', accion='UPDATE', modelo='Test', objeto_id=i,
+                descripcion=f'Cambio {i}', metadatos={'i': i}
+            )
+
+    def test_cadena_integra(self):
+        """Test que las filas se encadenan y la verificación es incremental"""
+        from src.integridad_auditoria import verificar_cadena
+        from src.models import Auditoria
+        verificacion = verificar_cadena()
+        self.assertEqual(verificacion.estado, 'OK')
+        self.assertEqual(verificacion.filas_verificadas, 5)
+
+        nueva = Auditoria.objects.create(rol='ADMIN', accion='LOGIN', modelo='User', descripcion='Nueva')
+        # La fila queda guardada en la transacción del llamador, después de las anteriores
+        self.assertIsNotNone(nueva.pk)
+        self.assertEqual(
+            list(Auditoria.objects.order_by('fecha', 'id').values_list('id', flat=True)),
+            list(Auditoria.objects.order_by('id').values_list('id', flat=True)),
+        )
+        verificacion = verificar_cadena()
+        self.assertEqual(verificacion.estado, 'OK')
+        self.assertEqual(verificacion.filas_verificadas, 1)
+
+    def test_detecta_modificacion(self):
+        """Test que una fila modificada rompe la cadena"""
+        from src.integridad_auditoria import verificar_cadena
+        from src.models import Auditoria
+        fila = Auditoria.objects.order_by('id')[2]
+        Auditoria.objects.filter(pk=fila.pk).update(descripcion='Alterada')
+        verificacion = verificar_cadena(completa=True)
+        self.assertEqual(verificacion.estado, 'FALLIDA')
+        self.assertEqual(verificacion.id_fallido, fila.pk)
+
+    def test_valores_no_canonicos(self):
+        """Test que un objeto_id enviado como texto (form) verifica igual tras leerse de la base"""
+        from src.integridad_auditoria import verificar_cadena
+        from src.models import Auditoria
+        Auditoria.objects.create(
+            rol='ANALISTA', accion='DELETE', modelo='CorreoAdicional', objeto_id='5',
+            descripcion='Correo eliminado', ip_address='127.0.0.1'
+        )
+        self.assertEqual(Auditoria.objects.order_by('-id').first().objeto_id, 5)
+        verificacion = verificar_cadena(completa=True)
+        self.assertEqual(verificacion.estado, 'OK')
+        self.assertEqual(verificacion.filas_verificadas, 6)
+
+
+@pytest.mark.unit
+class PurgaAuditoriaTests(TestCase):
+    """Tests de la purga de auditoría en segundo plano"""
+
+    def test_una_sola_purga_activa(self):
+        """Test que no se crean dos purgas activas y que una fallida se puede reanudar"""
+        from unittest import mock
+        from src import purga
+        from src.models import TareaPurga
+        primera = purga.crear_tarea_purga(None, dias=1)
+        with self.assertRaises(purga.PurgaEnCurso):
+            purga.crear_tarea_purga(None, dias=1)
+        # Aunque la comprobación previa no la vea (solicitudes simultáneas), el índice la rechaza
+        with mock.patch.object(purga.TareaPurga.objects, 'filter', return_value=TareaPurga.objects.none()):
+            with self.assertRaises(purga.PurgaEnCurso):
+                purga.crear_tarea_purga(None, dias=1)
+
+        TareaPurga.objects.filter(pk=primera.pk).update(estado='FALLIDA', error='timeout')
+        self.assertIn(primera, purga.tareas_reanudables())
+        segunda = purga.crear_tarea_purga(None, dias=1)
+        self.assertFalse(purga._reclamar_tarea(primera.pk))     # la segunda sigue activa
+        TareaPurga.objects.filter(pk=segunda.pk).update(estado='COMPLETADA')
+        self.assertTrue(purga._reclamar_tarea(primera.pk))
+        primera.refresh_from_db()
+        self.assertEqual((primera.estado, primera.error), ('EN_CURSO', ''))
+
+
+@pytest.mark.unit
+class MotorReglasTests(TestCase):
+    """Tests del lenguaje de reglas de negocio"""
+
+    def test_evalua_condicion(self):
+        """Test de condiciones con AND/OR, IN y conversión de tipos"""
+        from src.motor_reglas import compilar_condicion
+        _, evaluar = compilar_condicion("monto > 1000000 AND periodo == '2025'")
+        self.assertTrue(evaluar({'monto': 2000000.0, 'periodo': '2025'}))
+        self.assertTrue(evaluar({'monto': '2000000', 'periodo': 2025}))
+        self.assertFalse(evaluar({'monto': 500, 'periodo': '2025'}))
+        self.assertFalse(evaluar({}))
+
+        _, evaluar = compilar_condicion("tipo_certificado IN ('AFP', 'APV') OR NOT existe(rut)")
+        self.assertTrue(evaluar({'tipo_certificado': 'ISAPRE'}))
+        self.assertFalse(evaluar({'tipo_certificado': 'ISAPRE', 'rut': '1-9'}))
+
+    def test_rechaza_regla_invalida(self):
+        """Test que la sintaxis inválida, las acciones y los estados desconocidos se rechazan"""
+        from src.motor_reglas import ReglaInvalida, validar_regla
+        validar_regla("monto > 5", "asignar_estado('OBSERVADA')")
+        with self.assertRaises(ReglaInvalida):
+            validar_regla("monto > 5", "asignar_estado('REVISION_MANUAL')")
+        with self.assertRaises(ReglaInvalida):
+            validar_regla("monto >", "asignar_estado('X')")
+        with self.assertRaises(ReglaInvalida):
+            validar_regla("__import__('os')", "asignar_estado('X')")
+        with self.assertRaises(ReglaInvalida):
+            validar_regla("monto > 5", "borrar_todo()")
+
+    def test_efectos_respetan_transiciones(self):
+        """Test que las reglas solo aplican transiciones permitidas y las registran en el historial"""
+        from types import SimpleNamespace
+        from src.motor_reglas import MotorReglas
+        motor = MotorReglas([
+            SimpleNamespace(id=1, version=2, nombre='Pendiente', condicion="monto > 5", accion="asignar_estado('PENDIENTE')"),
+            SimpleNamespace(id=2, version=1, nombre='Observar', condicion="monto > 100", accion="observar('revisar')"),
+        ])
+        documento = {'monto': 10, 'estado': 'BORRADOR'}
+        motor.aplicar(documento)
+        self.assertEqual(documento['estado'], 'PENDIENTE')
+        self.assertEqual(len(documento['historial_estados']), 1)
+        self.assertEqual(documento['historial_estados'][0]['estado_anterior'], 'BORRADOR')
+        self.assertEqual(documento['historial_estados'][0]['usuario'], 'REGLAS')
+
+        documento = {'monto': 500, 'estado': 'APROBADA', 'historial_estados': [{'estado': 'APROBADA'}]}
+        motor.aplicar(documento)
+        self.assertEqual(documento['estado'], 'APROBADA')
+        self.assertEqual(len(documento['historial_estados']), 1)
+        self.assertEqual(len(documento['alertas']), 2)
+
+    def test_evaluacion_por_lote(self):
+        """Test que la evaluación por lote coincide con la evaluación por documento"""
+        from types import SimpleNamespace
+        from src.motor_reglas import MotorReglas
+        condiciones = [
+            "monto > 1000000 AND periodo == '2025'",
+            "tipo_certificado IN ('AFP', 'APV') OR NOT existe(rut)",
+            "monto != 500 AND largo(rut) > 3",
+        ]
+        motor = MotorReglas([
+            SimpleNamespace(id=i, version=1, nombre=f'R{i}', condicion=c, accion="alerta('x')")
+            for i, c in enumerate(condiciones, start=1)
+        ])
+        documentos = [
+            {'monto': 2000000.0, 'periodo': '2025', 'tipo_certificado': 'AFP', 'rut': '1-9'},
+            {'monto': '2000000', 'periodo': 2025, 'tipo_certificado': 'ISAPRE'},
+            {'monto': 500, 'rut': '12345-6'},
+            {'monto': 'abc', 'tipo_certificado': 'APV', 'rut': '12345-6'},
+            {},
+        ]
+        resultado = motor.evaluar_lote(documentos)
+        for fila, documento in enumerate(documentos):
+            self.assertEqual(
+                [r.id for r in resultado.coincidencias(fila)],
+                [r.id for r in motor.evaluar(documento)]
+            )
+        self.assertEqual(resultado.conteos(), {1: 2, 2: 4, 3: 1})
+
+    def test_cache_por_version(self):
+        """Test que las reglas activas solo se recargan cuando cambia la versión global"""
+        from unittest import mock
+        from src import cache_reglas
+        from src.cache_reglas import CacheReglas, incrementar_version_reglas
+        cargar = mock.Mock(side_effect=lambda: cargar.call_count)
+        with mock.patch.object(cache_reglas, '_redis', None):
+            cache = CacheReglas(cargar)
+            self.assertEqual(cache.obtener(), 1)
+            with self.assertNumQueries(1):  # solo la lectura del contador
+                self.assertEqual(cache.obtener(), 1)
+            incrementar_version_reglas()
+            self.assertEqual(cache.obtener(), 2)
+            self.assertEqual(cargar.call_count, 2)
+
+    def test_red_equivale_a_evaluacion_directa(self):
+        """Test que la red coincide con evaluar cada regla por separado (bordes, faltantes y ediciones)"""
+        from types import SimpleNamespace
+        from unittest import mock
+        from src import red_reglas
+        from src.motor_reglas import compilar_condicion
+        condiciones = [
+            "tipo_certificado == 'AFP'", "tipo_certificado != 'AFP'", "periodo == 2024",
+            "tipo_certificado IN ('AFP', 'APV')", "monto == 100",
+            "monto > 100", "monto >= 100", "monto < 100", "monto <= 100", "100 < monto",
+            "monto BETWEEN 50 AND 100", "monto > 50 AND monto < 150", "monto < 0 OR monto > 1000",
+            "NOT monto > 100", "existe(rut) AND tipo_certificado == 'APV'", "detalles.factor >= 0.5",
+        ]
+        reglas = [
+            SimpleNamespace(id=i, version=1, nombre=f'R{i}', condicion=condicion, estado='ACTIVA',
+                            accion="alerta('x')")
+            for i, condicion in enumerate(condiciones, 1)
+        ]
+        documentos = [{}, {'rut': '1-9'}, {'monto': None}, {'monto': 'N/A'}, {'monto': True},
+                      {'periodo': 2024}, {'periodo': '2024'}, {'tipo_certificado': 'AFP', 'monto': '100'},
+                      {'tipo_certificado': 'APV', 'rut': '1-9', 'detalles': {'factor': 0.5}},
+                      {'detalles': {'factor': 0.49}}, {'detalles': 'x'}]
+        documentos += [{'monto': monto} for monto in (-1, 0, 49.99, 50, 99, 99.99, 100, 100.0, 100.01, 101, 150, 1000, 1001)]
+
+        red = red_reglas.RedReglas()
+
+        def comparar():
+            directas = {r.id: compilar_condicion(r.condicion)[1] for r in reglas}
+            for documento in documentos:
+                esperadas = [r.id for r in reglas if directas[r.id](documento)]
+                self.assertEqual([r.id for r in red.evaluar(documento)], esperadas, documento)
+
+        red.sincronizar(reglas)
+        comparar()
+
+        # Edición: el umbral cambia y la igualdad pasa a otro valor
+        with mock.patch.object(red_reglas, '_red_activa', red):
+            for regla, condicion in ((reglas[5], "monto > 99.99"), (reglas[0], "tipo_certificado == 'APV'")):
+                regla.condicion = condicion
+                regla.version += 1
+                red_reglas.actualizar_regla(regla)
+            reglas[6].estado = 'INACTIVA'
+            red_reglas.actualizar_regla(reglas[6])
+            reglas.pop(6)
+        comparar()
+
+    def test_perfil_por_regla(self):
+        """Test que el perfilador cuenta evaluaciones/coincidencias y muestrea tiempos"""
+        from types import SimpleNamespace
+        from unittest import mock
+        from src import perfil_reglas
+        from src.red_reglas import RedReglas
+        red = RedReglas()
+        red.sincronizar([
+            SimpleNamespace(id=1, version=1, nombre='R1', condicion='monto > 10', accion="alerta('x')"),
+            SimpleNamespace(id=2, version=1, nombre='R2', condicion='monto < 0', accion="alerta('x')"),
+        ])
+        perfilador = perfil_reglas.Perfilador(muestreo=2)
+        with mock.patch.object(perfil_reglas, '_redis', None):
+            for monto in range(20):
+                documento = {'monto': monto}
+                perfilador.registrar(red._plan, documento, red.evaluar(documento))
+            totales = perfilador.totales()
+        self.assertEqual((totales[1].evaluaciones, totales[1].coincidencias), (20, 9))
+        self.assertEqual((totales[2].evaluaciones, totales[2].coincidencias), (20, 0))
+        self.assertEqual(totales[1].muestras, 10)
+        self.assertEqual(perfil_reglas.percentil({perfil_reglas.bucket(1000): 99, perfil_reglas.bucket(10 ** 6): 1}, 0.5),
+                         perfil_reglas.valor_bucket(perfil_reglas.bucket(1000)))
+
+    def test_perfil_volcado_en_segundo_plano(self):
+        """Test que registrar no vuelca y el hilo del perfilador lo hace por su cuenta"""
+        import time
+        from types import SimpleNamespace
+        from unittest import mock
+        from src import perfil_reglas
+        class Plan:     # hashable, como red_reglas._Plan
+            reglas = [(None, None, SimpleNamespace(id=7, evaluar=lambda documento: True))]
+
+        plan = Plan()
+        perfilador = perfil_reglas.Perfilador(muestreo=0, volcar_cada=0.05)
+        with mock.patch.object(perfil_reglas, '_redis', None), \
+                mock.patch.object(perfilador, 'volcar', wraps=perfilador.volcar) as volcar:
+            perfilador.registrar(plan, {}, [plan.reglas[0][2]])
+            self.assertEqual(volcar.call_count, 0)
+            limite = time.monotonic() + 5
+            while 7 not in perfilador._local and time.monotonic() < limite:
+                time.sleep(0.01)
+        self.assertEqual((perfilador._local[7].evaluaciones, perfilador._local[7].coincidencias), (1, 1))
+
+    def test_historial_con_deltas(self):
+        """Test que los snapshots delta reconstruyen cada versión"""
+        from src.models import HistorialReglaNegocio, ReglaNegocio
+        from src.versiones_reglas import KEYFRAME_CADA, guardar_snapshot, snapshot_de_version
+        usuario = User.objects.create_user(username='ti', password='TestPass123!')
+        regla = ReglaNegocio.objects.create(
+            nombre='Monto alto', descripcion='Regla de prueba ' * 20,
+            condicion='monto > 0', accion="alerta('x')", creado_por=usuario
+        )
+        esperadas = {}
+        for version in range(1, 2 * KEYFRAME_CADA + 1):
+            regla.version = version
+            regla.condicion = f'monto > {version * 1000}'
+            guardar_snapshot(regla, usuario, f'v{version}')
+            esperadas[version] = regla.condicion
+
+        filas = HistorialReglaNegocio.objects.filter(regla_actual=regla)
+        self.assertEqual(filas.filter(es_keyframe=True).count(), 2)
+        for version, condicion in esperadas.items():
+            snapshot = snapshot_de_version(regla, version)
+            self.assertEqual(snapshot['condicion'], condicion)
+            self.assertEqual(snapshot['descripcion'], regla.descripcion)
+
+    def test_diff_por_lineas(self):
+        """Test que el diff agrupa en hunks y resalta las palabras cambiadas"""
+        from src.diff_reglas import diff_texto
+        texto_1 = "\n".join(f"linea {i}" for i in range(20))
+        texto_2 = texto_1.replace("linea 10", "linea diez")
+        diff = diff_texto(texto_1, texto_2)
+        self.assertEqual((diff['agregadas'], diff['eliminadas']), (1, 1))
+        self.assertEqual(len(diff['hunks']), 1)
+        hunk = diff['hunks'][0]
+        self.assertEqual((hunk['inicio_1'], hunk['lineas_1'], hunk['lineas_2']), (8, 7, 7))
+        eliminada = next(linea for linea in hunk['lineas'] if linea['tipo'] == '-')
+        self.assertEqual(eliminada['segmentos'], [['=', 'linea '], ['-', '10']])
+        self.assertEqual(diff_texto("a\nb", "a\nb"), {"cambio": False, "agregadas": 0, "eliminadas": 0, "hunks": []})
+
+
+@pytest.mark.unit
+class ExportacionTests(TestCase):
+    """Tests de exportaciones en segundo plano, en paralelo y columnares"""
+
+    def test_clave_exportacion(self):
+        """Test que la clave del artefacto depende solo de filtros relevantes, formato y versión"""
+        from src.tareas_exportacion import clave_exportacion, normalizar_parametros
+        normalizados = normalizar_parametros({'estado': 'VALIDADA', 'dias': '30', 'periodo': '', 'page': '2'})
+        self.assertEqual(normalizados, {'fuente': 'mongo', 'estado': 'VALIDADA', 'dias': '30'})
+        clave = clave_exportacion('csv', normalizados, '10:2025-01-01T00:00:00')
+        self.assertEqual(clave, clave_exportacion('csv', dict(reversed(normalizados.items())), '10:2025-01-01T00:00:00'))
+        self.assertNotEqual(clave, clave_exportacion('xlsx', normalizados, '10:2025-01-01T00:00:00'))
+        self.assertNotEqual(clave, clave_exportacion('csv', normalizados, '11:2025-01-01T00:00:00'))
+
+    def test_partes_exportacion(self):
+        """Test que las partes cubren todas las filas y en PDF ocupan páginas completas"""
+        from src import exportacion_paralela
+        minimo = exportacion_paralela.FILAS_MINIMAS_POR_PARTE
+        self.assertEqual(exportacion_paralela.planificar_partes('csv', minimo - 1, procesos=8), [minimo - 1])
+        partes = exportacion_paralela.planificar_partes('csv', 10 * minimo + 1, procesos=4)
+        self.assertEqual((len(partes), sum(partes)), (4, 10 * minimo + 1))
+
+        from src.reporte_pdf import REPORTLAB_AVAILABLE
+        if not (exportacion_paralela.PYPDF_AVAILABLE and REPORTLAB_AVAILABLE):
+            self.skipTest("pypdf o reportlab no instalados")
+        from src.formatos_exportacion import capacidad_pdf
+        primera, siguientes = capacidad_pdf()
+        partes = exportacion_paralela.planificar_partes('pdf', 10 * minimo, procesos=4)
+        self.assertEqual(sum(partes), 10 * minimo)
+        self.assertEqual((partes[0] - primera) % siguientes, 0)
+        self.assertTrue(all(tamano % siguientes == 0 for tamano in partes[1:-1]))
+
+    def test_filas_escritas_exportacion(self):
+        """Test que la exportación retorna las filas escritas y no el conteo con que se planificó"""
+        import io
+        from datetime import datetime
+        from unittest import mock
+        from src import exportacion, exportacion_paralela, formatos_exportacion
+        filas = [('1-9', 'R1', 'DJ1948', '2025', 100.0, 'APROBADA', False, 'ana', datetime(2025, 1, 1))] * 3
+        with mock.patch.object(formatos_exportacion, 'filas_exportacion', return_value=iter(filas)):
+            self.assertEqual(formatos_exportacion.escribir_csv(io.BytesIO(), {}), 3)
+        with mock.patch.object(formatos_exportacion, 'filas_exportacion', side_effect=lambda *a, **k: iter(filas)), \
+                mock.patch.object(exportacion, 'contar_exportacion', return_value=5):
+            self.assertEqual(exportacion_paralela.generar_exportacion('csv', io.BytesIO(), {}), 3)
+            if formatos_exportacion.OPENPYXL_AVAILABLE:
+                self.assertEqual(formatos_exportacion.escribir_excel(io.BytesIO(), {}), 3)
+
+    def test_pools_exportacion_limitados(self):
+        """Test que una exportación en paralelo espera su turno de pool latiendo"""
+        import threading
+        from unittest import mock
+        from src import exportacion_paralela
+        latidos = []
+        with mock.patch.object(exportacion_paralela, '_pools', threading.BoundedSemaphore(1)), \
+                mock.patch.object(exportacion_paralela, 'INTERVALO_LATIDO', 0.01):
+            exportacion_paralela._pools.acquire()
+            liberar = threading.Timer(0.1, exportacion_paralela._pools.release)
+            liberar.start()
+            with exportacion_paralela._turno_pool(lambda: latidos.append(1)):
+                self.assertFalse(exportacion_paralela._pools.acquire(blocking=False))
+            liberar.join()
+            self.assertTrue(exportacion_paralela._pools.acquire(blocking=False))
+        self.assertGreater(len(latidos), 0)
+
+    def test_latido_exportacion(self):
+        """Test que el latido mantiene vigente una tarea en curso y no la reabre si terminó"""
+        from datetime import timedelta
+        from unittest import mock
+        from django.utils import timezone
+        from src import tareas_exportacion
+        from src.models import TareaExportacion
+        tarea = TareaExportacion.objects.create(formato='csv', clave='x' * 64, estado='EN_CURSO')
+        antigua = timezone.now() - tareas_exportacion.TIEMPO_ABANDONO - timedelta(minutes=1)
+        TareaExportacion.objects.filter(pk=tarea.pk).update(fecha_actualizacion=antigua)
+        self.assertIn(tarea, tareas_exportacion.tareas_reanudables())
+
+        latido = tareas_exportacion.latido_tarea(tarea.pk)
+        latido()    # dentro del intervalo: no escribe
+        self.assertIn(tarea, tareas_exportacion.tareas_reanudables())
+        with mock.patch.object(tareas_exportacion, 'INTERVALO_LATIDO', timedelta(0)):
+            latido()
+        self.assertNotIn(tarea, tareas_exportacion.tareas_reanudables())
+
+        TareaExportacion.objects.filter(pk=tarea.pk).update(estado='FALLIDA', fecha_actualizacion=antigua)
+        with mock.patch.object(tareas_exportacion, 'INTERVALO_LATIDO', timedelta(0)):
+            latido()
+        self.assertEqual(TareaExportacion.objects.get(pk=tarea.pk).fecha_actualizacion, antigua)
+
+    def test_monto_decimal_columnar(self):
+        """Test que los montos se convierten a decimal(18, 2) o quedan nulos"""
+        from decimal import Decimal
+        from src.columnar import monto_decimal
+        self.assertEqual(monto_decimal(1500.5), Decimal('1500.50'))
+        self.assertEqual(monto_decimal('12.345'), Decimal('12.35'))
+        for invalido in (None, True, 'N/A', float('inf'), 'NaN', 10 ** 17):
+            self.assertIsNone(monto_decimal(invalido))
+
+    def test_columnar_tipos_mezclados(self):
+        """Test que columnas de texto aceptan valores no texto guardados en Mongo (periodo 2024)"""
+        import io
+        from datetime import datetime, timezone as dt_timezone
+        from src import columnar
+        if not columnar.PYARROW_AVAILABLE:
+            self.skipTest("pyarrow no instalado")
+        import pyarrow.parquet as pq
+        creado = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+        filas = [
+            ('11.111.111-1', 'R1', 'DJ1948', '2025', 100, 'PENDIENTE', False, 'ana', creado),
+            (22222222, 'R2', None, 2024, '50.5', 'APROBADA', True, None, creado),
+        ]
+        archivo = io.BytesIO()
+        total = columnar.escribir_columnar(
+            archivo, 'parquet', columnar.ESQUEMA_CALIFICACIONES, columnar.filas_calificaciones(filas)
+        )
+        self.assertEqual(total, 2)
+        archivo.seek(0)
+        tabla = pq.read_table(archivo)
+        self.assertEqual(tabla.column('periodo').to_pylist(), ['2025', '2024'])
+        self.assertEqual(tabla.column('rut').to_pylist(), ['11.111.111-1', '22222222'])
+        self.assertEqual(tabla.column('tipo_certificado').to_pylist(), ['DJ1948', None])
+
 
 # ============================================
 # TESTS BÁSICOS SIN DEPENDENCIAS EXTERNAS
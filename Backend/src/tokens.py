@@ -0,0 +1,165 @@
+"""
+Tokens JWT con los datos de autorización del usuario como claims.
+
+Al emitir el par de tokens se agregan al payload:
+
+- username, rol, is_superuser
+- pv: versión de permisos del PerfilUsuario
+
+Con eso JWTAuthenticationClaims (src/authentication.py) arma el usuario
+sin consultar la base de datos. Cada cambio de rol, is_active,
+is_superuser o contraseña incrementa PerfilUsuario.version_permisos (en
+Postgres, dentro de la misma transacción) y la publica en Redis tras el
+commit; un access token con otra "pv" se rechaza y el cliente debe
+renovarlo (RefreshTokenView vuelve a leer los claims desde la base de
+datos).
+
+Los incrementos salen de señales sobre User y PerfilUsuario
+(src/signals.py), así que cubren cualquier origen del cambio: vistas,
+Django admin, comandos o shell. Un QuerySet.update() no emite señales y
+debe llamar a incrementar_version_permisos() por su cuenta.
+
+Consultar la versión cuesta un GET en Redis, o una lectura por PK en
+Postgres si Redis no está disponible.
+"""
+import logging
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from src.models import PerfilUsuario
+from src.roles import invalidar_rol
+
+logger = logging.getLogger(__name__)
+
+CLAIMS = ('username', 'rol', 'is_superuser', 'pv')
+PREFIJO_REDIS = "permisos:version:"
+
+try:
+    import redis
+    _redis = redis.Redis(host='localhost', port=6379, db=0, decode_responses=True, socket_timeout=0.5)
+    _redis.ping()
+    REDIS_AVAILABLE = True
+except Exception:
+    _redis = None
+    REDIS_AVAILABLE = False
+
+
+def _version_postgres(usuario_id):
+    return PerfilUsuario.objects.filter(usuario_id=usuario_id).values_list('version_permisos', flat=True).first()
+
+
+def version_permisos(usuario_id):
+    """Versión de permisos vigente del usuario (None si no tiene perfil)"""
+    if _redis is not None:
+        try:
+            valor = _redis.get(f"{PREFIJO_REDIS}{usuario_id}")
+            if valor is not None:
+                return int(valor)
+            # Clave ausente (primer uso o reinicio de Redis): se siembra desde Postgres
+            valor = _version_postgres(usuario_id)
+            if valor is not None:
+                _redis.set(f"{PREFIJO_REDIS}{usuario_id}", valor, nx=True)
+            return valor
+        except redis.RedisError:
+            logger.warning("Redis no disponible para la versión de permisos; se usa Postgres")
+    return _version_postgres(usuario_id)
+
+
+def incrementar_version_permisos(usuario_id):
+    """
+    Invalida los access tokens emitidos al usuario. Llamar en la misma
+    transacción que el cambio: la versión de Postgres se confirma con él y
+    Redis se actualiza después del commit. Retorna la versión nueva (None
+    si el usuario no tiene perfil).
+    """
+    PerfilUsuario.objects.filter(usuario_id=usuario_id).update(version_permisos=F('version_permisos') + 1)
+    version = _version_postgres(usuario_id)
+    invalidar_rol(usuario_id)
+    if _redis is None or version is None:
+        return version
+
+    def _publicar():
+        # SET (no INCR): deja Redis igual a Postgres aunque la clave no existiera
+        try:
+            _redis.set(f"{PREFIJO_REDIS}{usuario_id}", version)
+        except redis.RedisError:
+            logger.warning("No se pudo publicar la versión de permisos del usuario %s en Redis", usuario_id)
+            try:
+                _redis.delete(f"{PREFIJO_REDIS}{usuario_id}")
+            except redis.RedisError:
+                pass
+
+    transaction.on_commit(_publicar)
+    return version
+
+
+def olvidar_version_permisos(usuario_id):
+    """Perfil eliminado: sin versión, los tokens del usuario se rechazan"""
+    if _redis is None:
+        return
+
+    def _borrar():
+        try:
+            _redis.delete(f"{PREFIJO_REDIS}{usuario_id}")
+        except redis.RedisError:
+            logger.warning("No se pudo borrar la versión de permisos del usuario %s en Redis", usuario_id)
+
+    transaction.on_commit(_borrar)
+
+
+def claims_de_usuario(user):
+    """Claims de autorización del usuario; vacío si no tiene perfil"""
+    perfil = getattr(user, 'perfil', None)
+    if perfil is None:
+        return {}
+    return {
+        'username': user.username,
+        'rol': perfil.rol,
+        'is_superuser': user.is_superuser,
+        'pv': perfil.version_permisos,
+    }
+
+
+class RefreshTokenConClaims(RefreshToken):
+    """RefreshToken cuyo access token lleva los claims de autorización"""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim, valor in claims_de_usuario(user).items():
+            token[claim] = valor
+        return token
+
+
+class TokenObtainPairConClaimsSerializer(TokenObtainPairSerializer):
+    token_class = RefreshTokenConClaims
+
+
+def access_token_actualizado(refresh):
+    """
+    Access token nuevo a partir de un refresh token, con los claims releídos
+    de la base de datos (el rol o la versión pudieron cambiar desde el login).
+    Lanza TokenError si el usuario ya no existe o está inactivo.
+    """
+    User = get_user_model()
+    user = (
+        User.objects
+        .select_related('perfil')
+        .filter(**{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}, is_active=True)
+        .first()
+    )
+    if user is None:
+        raise TokenError("Usuario no encontrado o inactivo")
+
+    access = refresh.access_token
+    for claim in CLAIMS:
+        access.payload.pop(claim, None)
+    for claim, valor in claims_de_usuario(user).items():
+        access[claim] = valor
+    return access
@@ -0,0 +1,176 @@
+"""
+Utilidades para consultas sobre Auditoria.
+
+Los filtros por fecha se expresan como rangos semiabiertos sobre el
+timestamp (fecha >= inicio AND fecha < fin) en lugar de fecha__date,
+que envuelve la columna en un cast y deja sin uso los índices sobre fecha.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from src.models import Auditoria
+
+
+def inicio_del_dia(dia):
+    """Medianoche (aware, zona horaria actual) del día indicado"""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+def rango_fechas(fecha_desde, fecha_hasta):
+    """
+    Convierte un rango de días inclusivo [desde, hasta] en el rango
+    semiabierto de timestamps [inicio, fin) equivalente.
+    """
+    return inicio_del_dia(fecha_desde), inicio_del_dia(fecha_hasta + timedelta(days=1))
+
+
+def filtro_rango_fechas(fecha_desde, fecha_hasta, campo='fecha'):
+    """kwargs de filtro sargable equivalentes a campo__date__gte/lte"""
+    inicio, fin = rango_fechas(fecha_desde, fecha_hasta)
+    return {f'{campo}__gte': inicio, f'{campo}__lt': fin}
+
+
+def filtro_dia(dia, campo='fecha'):
+    """kwargs de filtro sargable equivalentes a campo__date=dia"""
+    return filtro_rango_fechas(dia, dia, campo)
+
+
+# ===============================
+# FILTROS DE LA API DE AUDITORÍA
+# ===============================
+class FiltroAuditoriaInvalido(Exception):
+    """Parámetro de filtro inválido; detail y status_code van a la respuesta"""
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+def _parsear_fecha(valor, nombre):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise FiltroAuditoriaInvalido(f"{nombre} inválida. Use formato YYYY-MM-DD")
+
+
+def filtrar_auditorias(params):
+    """
+    Aplica los filtros comunes de auditoría (AuditoriaView, exportación).
+    Retorna (queryset, fecha_desde, fecha_hasta).
+
+    params: fecha_desde, fecha_hasta (YYYY-MM-DD, default: últimos 30 días),
+            usuario, accion, modelo, objeto_id, rol
+    """
+    # Filtrar desde últimos 30 días por defecto
+    fecha_hasta = datetime.now().date()
+    fecha_desde = fecha_hasta - timedelta(days=30)
+
+    if params.get('fecha_desde'):
+        fecha_desde = _parsear_fecha(params['fecha_desde'], 'fecha_desde')
+    if params.get('fecha_hasta'):
+        fecha_hasta = _parsear_fecha(params['fecha_hasta'], 'fecha_hasta')
+
+    # Rango semiabierto [desde 00:00, hasta+1 00:00) para usar los índices sobre fecha
+    auditorias = Auditoria.objects.filter(**filtro_rango_fechas(fecha_desde, fecha_hasta))
+
+    usuario_param = params.get('usuario')
+    if usuario_param:
+        try:
+            user = User.objects.get(username=usuario_param)
+        except User.DoesNotExist:
+            raise FiltroAuditoriaInvalido(f"Usuario '{usuario_param}' no encontrado", status_code=404)
+        auditorias = auditorias.filter(usuario=user)
+
+    accion_param = params.get('accion')
+    if accion_param:
+        if accion_param not in dict(Auditoria.ACCION_CHOICES):
+            raise FiltroAuditoriaInvalido("Acción inválida")
+        auditorias = auditorias.filter(accion=accion_param)
+
+    modelo_param = params.get('modelo')
+    if modelo_param:
+        auditorias = auditorias.filter(modelo=modelo_param)
+
+    objeto_id_param = params.get('objeto_id')
+    if objeto_id_param:
+        try:
+            auditorias = auditorias.filter(objeto_id=int(objeto_id_param))
+        except ValueError:
+            raise FiltroAuditoriaInvalido("objeto_id debe ser un número")
+
+    rol_param = params.get('rol')
+    if rol_param:
+        auditorias = auditorias.filter(rol=rol_param)
+
+    return auditorias, fecha_desde, fecha_hasta
+
+
+# ===============================
+# PAGINACIÓN POR CURSOR (KEYSET)
+# ===============================
+def codificar_cursor(fecha, pk):
+    """Cursor opaco con la posición (fecha, id) del último elemento entregado"""
+    crudo = f"{fecha.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(crudo).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """Retorna (fecha, id) o lanza ValueError si el cursor es inválido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha_txt, pk_txt = base64.urlsafe_b64decode(cursor + relleno).decode().split('|')
+        fecha = datetime.fromisoformat(fecha_txt)
+        pk = int(pk_txt)
+    except (TypeError, ValueError, UnicodeDecodeError, binascii.Error) as exc:
+        raise ValueError("cursor inválido") from exc
+    if timezone.is_naive(fecha):
+        raise ValueError("cursor inválido")
+    return fecha, pk
+
+
+def despues_del_cursor(queryset, cursor):
+    """
+    Filtra los elementos posteriores al cursor en el orden (-fecha, -id).
+    fecha__lte acota el recorrido del índice; el OR desempata filas con la
+    misma fecha. El costo no depende de cuántas páginas se hayan recorrido.
+    """
+    fecha, pk = decodificar_cursor(cursor)
+    return queryset.filter(fecha__lte=fecha).filter(
+        Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=pk)
+    )
+
+
+# ===============================
+# CONTEOS ESTIMADOS
+# ===============================
+def contar_estimado(queryset):
+    """
+    Conteo aproximado sin recorrer la tabla.
+    Sin filtros usa pg_class.reltuples; con filtros, la estimación de
+    filas del planificador. En otros motores cae al conteo exacto.
+    """
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+
+    queryset = queryset.order_by()
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [queryset.model._meta.db_table]
+            )
+            fila = cursor.fetchone()
+        if fila and fila[0] >= 0:
+            return fila[0]
+        return queryset.count()  # tabla nunca analizada
+
+    plan = json.loads(queryset.explain(format='json'))
+    return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,311 @@
+"""
+Historial de reglas con compresión por keyframes + deltas.
+
+Cada snapshot de HistorialReglaNegocio es un keyframe (textos completos) o
+un delta contra el snapshot anterior de la misma regla (en orden de id).
+Un delta guarda solo los campos de texto que cambiaron, como operaciones
+sobre el texto anterior:
+
+    [120, -5, "nuevo texto", 30]
+    int > 0: copiar n caracteres | int < 0: saltar n | str: insertar
+
+Cada KEYFRAME_CADA snapshots (o si el delta no ahorra espacio) se guarda un
+keyframe, así que reconstruir cualquier versión lee a lo sumo KEYFRAME_CADA
+filas y aplica KEYFRAME_CADA - 1 deltas.
+"""
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+from django.db import transaction
+
+from src.diff_reglas import diff_texto as diferencia_texto
+from src.models import HistorialReglaNegocio, ReglaNegocio
+
+KEYFRAME_CADA = 10
+CAMPOS_TEXTO = ('nombre', 'descripcion', 'condicion', 'accion')
+
+
+# ===============================
+# DELTAS DE TEXTO
+# ===============================
+def diferencia(anterior, nuevo):
+    """Operaciones que transforman `anterior` en `nuevo`"""
+    operaciones = []
+    matcher = SequenceMatcher(None, anterior, nuevo, autojunk=False)
+    for etiqueta, i1, i2, j1, j2 in matcher.get_opcodes():
+        if etiqueta == 'equal':
+            operaciones.append(i2 - i1)
+            continue
+        if i2 > i1:
+            operaciones.append(-(i2 - i1))
+        if j2 > j1:
+            operaciones.append(nuevo[j1:j2])
+    return operaciones
+
+
+def aplicar_diferencia(anterior, operaciones):
+    partes = []
+    posicion = 0
+    for operacion in operaciones:
+        if isinstance(operacion, str):
+            partes.append(operacion)
+        elif operacion > 0:
+            partes.append(anterior[posicion:posicion + operacion])
+            posicion += operacion
+        else:
+            posicion -= operacion
+    return ''.join(partes)
+
+
+def _tamano(operaciones):
+    return sum(len(op) if isinstance(op, str) else 8 for op in operaciones)
+
+
+# ===============================
+# RECONSTRUCCIÓN
+# ===============================
+def _textos(fila, anteriores):
+    """Textos completos de la fila dados los del snapshot anterior"""
+    if fila.es_keyframe or anteriores is None:
+        return {campo: getattr(fila, campo) for campo in CAMPOS_TEXTO}
+    return {
+        campo: aplicar_diferencia(anteriores[campo], fila.delta[campo]) if campo in fila.delta else anteriores[campo]
+        for campo in CAMPOS_TEXTO
+    }
+
+
+def reconstruir(filas):
+    """
+    Recorre filas de una misma regla en orden de id (empezando en un
+    keyframe) y retorna [(fila, textos)].
+    """
+    resultado = []
+    textos = None
+    for fila in filas:
+        textos = _textos(fila, textos)
+        resultado.append((fila, textos))
+    return resultado
+
+
+def _cadena_hasta(fila):
+    """Filas desde el keyframe más cercano hasta `fila` (a lo sumo KEYFRAME_CADA)"""
+    keyframe_id = (
+        HistorialReglaNegocio.objects
+        .filter(regla_actual_id=fila.regla_actual_id, id__lte=fila.id, es_keyframe=True)
+        .order_by('-id').values_list('id', flat=True).first()
+    ) or 0
+    return list(
+        HistorialReglaNegocio.objects
+        .filter(regla_actual_id=fila.regla_actual_id, id__gte=keyframe_id, id__lte=fila.id)
+        .order_by('id')
+    )
+
+
+def textos_de(fila):
+    """Textos completos (nombre, descripcion, condicion, accion) de un snapshot"""
+    if fila.es_keyframe:
+        return _textos(fila, None)
+    return reconstruir(_cadena_hasta(fila))[-1][1]
+
+
+def fila_de_version(regla, version):
+    """Último snapshot (sin reconstruir) de la versión indicada, o None"""
+    return (
+        HistorialReglaNegocio.objects
+        .filter(regla_actual=regla, version=version)
+        .select_related('modificado_por')
+        .order_by('-id').first()
+    )
+
+
+def snapshot_de_version(regla, version):
+    """
+    Último snapshot de la versión indicada como dict con los textos
+    completos, o None si no existe.
+    """
+    fila = fila_de_version(regla, version)
+    if fila is None:
+        return None
+    return serializar_snapshot(fila, textos_de(fila))
+
+
+def historial_completo(regla):
+    """Todos los snapshots de la regla, reconstruidos en una sola pasada"""
+    filas = (
+        HistorialReglaNegocio.objects
+        .filter(regla_actual=regla)
+        .select_related('modificado_por')
+        .order_by('id')
+    )
+    return [serializar_snapshot(fila, textos) for fila, textos in reconstruir(filas)]
+
+
+def serializar_snapshot(fila, textos):
+    return {
+        "id": fila.id,
+        **textos,
+        "version": fila.version,
+        "estado": fila.estado,
+        "modificado_por": fila.modificado_por.username if fila.modificado_por else "Sistema",
+        "fecha_snapshot": fila.fecha_snapshot.strftime("%Y-%m-%d %H:%M:%S"),
+        "comentario": fila.comentario,
+    }
+
+
+# ===============================
+# ESCRITURA
+# ===============================
+def _codificar(fila, textos, cadena):
+    """
+    Convierte `fila` en delta contra el último elemento de `cadena`
+    ([(fila, textos)] desde el último keyframe) o la deja como keyframe.
+    """
+    fila.es_keyframe = True
+    fila.delta = {}
+    for campo in CAMPOS_TEXTO:
+        setattr(fila, campo, textos[campo])
+    if not cadena or len(cadena) >= KEYFRAME_CADA:
+        return
+
+    anteriores = cadena[-1][1]
+    delta = {
+        campo: diferencia(anteriores[campo], textos[campo])
+        for campo in CAMPOS_TEXTO
+        if textos[campo] != anteriores[campo]
+    }
+    if sum(_tamano(ops) for ops in delta.values()) >= sum(len(textos[c]) for c in CAMPOS_TEXTO):
+        return  # el delta no ahorra espacio
+
+    fila.es_keyframe = False
+    fila.delta = delta
+    for campo in CAMPOS_TEXTO:
+        setattr(fila, campo, "")
+
+
+@transaction.atomic
+def guardar_snapshot(regla, usuario, comentario):
+    """Crea el snapshot del estado actual de la regla (keyframe o delta)"""
+    # El delta se calcula contra el último snapshot: se serializan los
+    # escritores de la misma regla para que nadie se intercale
+    list(ReglaNegocio.objects.select_for_update().filter(pk=regla.pk).values_list('pk'))
+
+    ultima = HistorialReglaNegocio.objects.filter(regla_actual=regla).order_by('-id').first()
+    cadena = reconstruir(_cadena_hasta(ultima)) if ultima else []
+
+    fila = HistorialReglaNegocio(
+        regla_actual=regla,
+        version=regla.version,
+        estado=regla.estado,
+        modificado_por=usuario,
+        comentario=comentario,
+    )
+    _codificar(fila, {campo: getattr(regla, campo) for campo in CAMPOS_TEXTO}, cadena)
+    fila.save()
+    return fila
+
+
+def asegurar_snapshot(regla, usuario, comentario):
+    """
+    Guarda el estado actual solo si su versión aún no está en el historial
+    (reglas cuyo historial se escribió guardando el estado anterior a cada cambio).
+    """
+    if not HistorialReglaNegocio.objects.filter(regla_actual=regla, version=regla.version).exists():
+        guardar_snapshot(regla, usuario, comentario)
+
+
+@transaction.atomic
+def compactar_historial(regla):
+    """
+    Recodifica el historial existente de una regla como keyframes + deltas.
+    Retorna (filas, keyframes) después de compactar.
+    """
+    list(ReglaNegocio.objects.select_for_update().filter(pk=regla.pk).values_list('pk'))
+    filas = list(HistorialReglaNegocio.objects.filter(regla_actual=regla).order_by('id'))
+    cadena = []
+    for fila, textos in reconstruir(filas):
+        _codificar(fila, textos, cadena)
+        cadena = [(fila, textos)] if fila.es_keyframe else cadena + [(fila, textos)]
+    HistorialReglaNegocio.objects.bulk_update(filas, ['es_keyframe', 'delta', *CAMPOS_TEXTO], batch_size=500)
+    return len(filas), sum(1 for fila in filas if fila.es_keyframe)
+
+
+# ===============================
+# COMPARACIÓN DE VERSIONES
+# ===============================
+CAMPOS_DIFF = ('condicion', 'accion', 'descripcion')
+_CACHE_DIFF_MAXIMO = 256
+_cache_diff = OrderedDict()
+_lock_diff = threading.Lock()
+
+
+def _lado(regla, version):
+    """
+    (clave de caché, metadatos, cargar_textos) de una versión o de "actual".
+    La clave identifica contenido inmutable: la fila del historial o, para
+    la regla actual, su versión + fecha de modificación.
+    """
+    if version == "actual":
+        clave = ("actual", regla.version, regla.fecha_modificacion.isoformat())
+        meta = {"version": regla.version, "actual": True, "nombre": regla.nombre, "estado": regla.estado}
+        return clave, meta, lambda: {campo: getattr(regla, campo) for campo in CAMPOS_TEXTO}
+
+    fila = fila_de_version(regla, version)
+    if fila is None:
+        return None
+    meta = {
+        "version": fila.version,
+        "estado": fila.estado,
+        "modificado_por": fila.modificado_por.username if fila.modificado_por else "Sistema",
+        "fecha_snapshot": fila.fecha_snapshot.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    return ("fila", fila.id), meta, lambda: textos_de(fila)
+
+
+def comparar_versiones(regla, version_1, version_2, completo=False):
+    """
+    Diff entre dos versiones de una regla ("actual" = estado vigente).
+    Retorna None si alguna versión no existe. Los hunks se cachean por
+    contenido (el historial es inmutable).
+    """
+    lado_1, lado_2 = _lado(regla, version_1), _lado(regla, version_2)
+    if lado_1 is None or lado_2 is None:
+        return None
+    (clave_1, meta_1, textos_1), (clave_2, meta_2, textos_2) = lado_1, lado_2
+
+    clave = (regla.id, clave_1, clave_2)
+    with _lock_diff:
+        entrada = _cache_diff.get(clave)
+        if entrada is not None:
+            _cache_diff.move_to_end(clave)
+    if entrada is None:
+        # El diff se calcula fuera del lock
+        a, b = textos_1(), textos_2()
+        entrada = {
+            "nombres": (a["nombre"], b["nombre"]),
+            "diff": {campo: diferencia_texto(a[campo], b[campo]) for campo in CAMPOS_DIFF},
+            "textos": (a, b),
+        }
+        with _lock_diff:
+            _cache_diff[clave] = entrada
+            _cache_diff.move_to_end(clave)
+            if len(_cache_diff) > _CACHE_DIFF_MAXIMO:
+                _cache_diff.popitem(last=False)
+
+    meta_1 = {**meta_1, "nombre": entrada["nombres"][0]}
+    meta_2 = {**meta_2, "nombre": entrada["nombres"][1]}
+    if completo:
+        meta_1.update({campo: entrada["textos"][0][campo] for campo in CAMPOS_DIFF})
+        meta_2.update({campo: entrada["textos"][1][campo] for campo in CAMPOS_DIFF})
+
+    return {
+        "regla_id": regla.id,
+        "version_1": meta_1,
+        "version_2": meta_2,
+        "cambios": {
+            "nombre": meta_1["nombre"] != meta_2["nombre"],
+            **{campo: entrada["diff"][campo]["cambio"] for campo in CAMPOS_DIFF},
+            "estado": meta_1["estado"] != meta_2["estado"],
+        },
+        "diff": entrada["diff"],
+    }
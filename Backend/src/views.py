@@ -8,6 +8,7 @@ from django.contrib.auth import authenticate
 from .models import Registro, PerfilUsuario
 from .serializers import RegistroSerializer, UserSerializer
 from .permissions import PermisoRegistro
+from .roles import rol_de_request
 
 
 # ======================================================
@@ -22,8 +23,7 @@ class RegistroViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        perfil = getattr(user, "perfil", None)
-        rol = getattr(perfil, "rol", None)
+        rol = rol_de_request(self.request)
 
         # Admin global
         if user.is_superuser:
@@ -82,8 +82,7 @@ def mi_perfil(request):
     Endpoint clave para RBAC frontend.
     Retorna rol y si es superusuario.
     """
-    perfil = getattr(request.user, "perfil", None)
-    rol = perfil.rol if perfil else None
+    rol = rol_de_request(request)
 
     # Superusuario sin perfil explícito
     if request.user.is_superuser and not rol:
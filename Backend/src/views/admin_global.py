@@ -7,7 +7,19 @@ from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 
-from src.models import PerfilUsuario, Auditoria, ReglaNegocio, Calificacion, Registro
+from src.models import PerfilUsuario, Auditoria, ReglaNegocio, Calificacion, Registro, TareaPurga, VerificacionAuditoria
+from src.integridad_auditoria import serializar_verificacion, ultimo_checkpoint, verificar_cadena
+from src.perfil_reglas import MUESTREO, perfilador, resumen
+from src.purga import (
+    LOTE_DEFECTO,
+    PAUSA_MS_DEFECTO,
+    PurgaEnCurso,
+    crear_tarea_purga,
+    ejecutar_tarea_purga,
+    serializar_tarea,
+    tareas_reanudables,
+)
+from src.tareas import ejecutar_en_segundo_plano
 
 
 class AdminGlobalPermission(IsAuthenticated):
@@ -87,6 +99,77 @@ class EstadoSistemaView(APIView):
         })
 
 
+class PerfilReglasView(APIView):
+    """
+    Costo de evaluación por regla de negocio (src/perfil_reglas.py)
+    Solo Administrador Global
+
+    Evaluaciones y coincidencias son exactas; los tiempos (p50/p99) salen
+    de evaluar cada regla aislada en 1 de cada MUESTREO documentos.
+    """
+    permission_classes = [AdminGlobalPermission]
+    ORDENES = ("costo_estimado_ms", "p99_us", "p50_us", "evaluaciones", "tasa_coincidencia")
+
+    def get(self, request):
+        """
+        Query params:
+        - orden: costo_estimado_ms (default), p99_us, p50_us, evaluaciones, tasa_coincidencia
+        - lenta_us: umbral de p99 para marcar una regla como lenta (default 50)
+        - minimo: evaluaciones mínimas para marcar "nunca coincide" (default 1000)
+        """
+        orden = request.query_params.get("orden", "costo_estimado_ms")
+        if orden not in self.ORDENES:
+            return Response(
+                {"detail": f"orden debe ser uno de: {', '.join(self.ORDENES)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            lenta_us = float(request.query_params.get("lenta_us", 50))
+            minimo = int(request.query_params.get("minimo", 1000))
+        except ValueError:
+            return Response(
+                {"detail": "lenta_us y minimo deben ser números"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        totales = perfilador.totales()
+        reglas = ReglaNegocio.objects.in_bulk(list(totales))
+        data = []
+        for regla_id, metricas in totales.items():
+            fila = resumen(metricas)
+            regla = reglas.get(regla_id)
+            fila.update({
+                "regla_id": regla_id,
+                "nombre": regla.nombre if regla else None,
+                "estado": regla.estado if regla else "ELIMINADA",
+                "lenta": fila["p99_us"] is not None and fila["p99_us"] >= lenta_us,
+                "nunca_coincide": fila["evaluaciones"] >= minimo and fila["coincidencias"] == 0,
+            })
+            data.append(fila)
+        data.sort(key=lambda fila: (fila[orden] is not None, fila[orden] or 0), reverse=True)
+
+        return Response({
+            "origen": perfilador.origen,
+            "muestreo": MUESTREO,
+            "total": len(data),
+            "lentas": sum(1 for fila in data if fila["lenta"]),
+            "nunca_coinciden": sum(1 for fila in data if fila["nunca_coincide"]),
+            "reglas": data
+        })
+
+    def delete(self, request):
+        """Reiniciar las métricas acumuladas"""
+        perfilador.reiniciar()
+        Auditoria.objects.create(
+            usuario=request.user,
+            rol="SUPERADMIN",
+            accion="DELETE",
+            modelo="ReglaNegocio",
+            descripcion="Reinicio de métricas de evaluación de reglas"
+        )
+        return Response({"detail": "Métricas de reglas reiniciadas"})
+
+
 class ResetPasswordView(APIView):
     """
     Resetear contraseña de cualquier usuario (operación crítica)
@@ -271,21 +354,51 @@ class PurgaDatosView(APIView):
     """
     Operaciones de purga de datos (EXTREMADAMENTE CRÍTICO)
     Solo Administrador Global
+
+    La purga de auditoría corre como tarea en segundo plano, por lotes
+    y con checkpoint: no bloquea las escrituras auditadas del sistema.
     """
     permission_classes = [AdminGlobalPermission]
 
-    @transaction.atomic
+    def get(self, request):
+        """
+        Progreso de las tareas de purga
+        Query params:
+        - tarea_id: detalle de una tarea (default: últimas 20)
+        """
+        tarea_id = request.query_params.get("tarea_id")
+        if tarea_id:
+            try:
+                tarea = TareaPurga.objects.get(pk=tarea_id)
+            except (TareaPurga.DoesNotExist, ValueError):
+                return Response(
+                    {"detail": "Tarea de purga no encontrada"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(serializar_tarea(tarea))
+
+        tareas = TareaPurga.objects.all()[:20]
+        return Response({
+            "tareas": [serializar_tarea(t) for t in tareas]
+        })
+
     def post(self, request):
         """
         Body: {
             "operacion": "purgar_auditoria",
             "dias": 90,
+            "tamanio_lote": 5000,     (opcional)
+            "pausa_ms": 250,          (opcional)
             "confirmar": "PURGAR_DEFINITIVAMENTE"
         }
+        o bien, para retomar una tarea interrumpida o fallida:
+        { "operacion": "reanudar_purga", "tarea_id": 3, "confirmar": "PURGAR_DEFINITIVAMENTE" }
+
+        Responde 202: la purga sigue en segundo plano, así que
+        registros_eliminados son los eliminados al momento de responder.
         """
         operacion = request.data.get("operacion")
         confirmacion = request.data.get("confirmar")
-        dias = request.data.get("dias", 90)
 
         if confirmacion != "PURGAR_DEFINITIVAMENTE":
             return Response(
@@ -294,26 +407,129 @@ class PurgaDatosView(APIView):
             )
 
         if operacion == "purgar_auditoria":
-            fecha_limite = timezone.now() - timedelta(days=dias)
-            count = Auditoria.objects.filter(fecha__lt=fecha_limite).count()
-            Auditoria.objects.filter(fecha__lt=fecha_limite).delete()
-
-            # Auditoría de la purga
+            try:
+                dias = int(request.data.get("dias", 90))
+                tamanio_lote = int(request.data.get("tamanio_lote", LOTE_DEFECTO))
+                pausa_ms = int(request.data.get("pausa_ms", PAUSA_MS_DEFECTO))
+            except (TypeError, ValueError):
+                return Response(
+                    {"detail": "dias, tamanio_lote y pausa_ms deben ser números"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if dias < 1 or not 1 <= tamanio_lote <= 50000 or pausa_ms < 0:
+                return Response(
+                    {"detail": "Parámetros fuera de rango (dias >= 1, 1 <= tamanio_lote <= 50000, pausa_ms >= 0)"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            try:
+                tarea = crear_tarea_purga(request.user, dias, tamanio_lote, pausa_ms)
+            except PurgaEnCurso:
+                return Response(
+                    {"detail": "Ya existe una purga en curso. Consulte su progreso o reanúdela"},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+            # Auditoría de la solicitud (el resultado se audita al terminar la tarea)
             Auditoria.objects.create(
                 usuario=request.user,
                 rol="SUPERADMIN",
                 accion="DELETE",
                 modelo="Auditoria",
-                descripcion=f"⚠️ PURGA MASIVA: Eliminados {count} registros de auditoría anteriores a {dias} días"
+                objeto_id=tarea.id,
+                descripcion=f"⚠️ PURGA MASIVA solicitada: registros de auditoría anteriores a {dias} días (~{tarea.total_estimado})"
             )
 
-            return Response({
-                "detail": f"Purga completada: {count} registros eliminados",
-                "operacion": operacion,
-                "registros_eliminados": count
-            })
+        elif operacion == "reanudar_purga":
+            try:
+                tarea = tareas_reanudables().get(pk=request.data.get("tarea_id"))
+            except (TareaPurga.DoesNotExist, ValueError, TypeError):
+                return Response(
+                    {"detail": "No hay una tarea reanudable con ese ID"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            if TareaPurga.objects.filter(estado__in=["PENDIENTE", "EN_CURSO"]).exclude(pk=tarea.pk).exists():
+                return Response(
+                    {"detail": "Ya existe otra purga en curso. Espere a que termine"},
+                    status=status.HTTP_409_CONFLICT
+                )
+
+        else:
+            return Response(
+                {"detail": "Operación no válida"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        ejecutar_en_segundo_plano(ejecutar_tarea_purga, tarea.id, nombre=f"purga-{tarea.id}")
+
+        return Response({
+            "detail": f"Purga en segundo plano iniciada (tarea {tarea.id})",
+            "operacion": operacion,
+            # Eliminados hasta ahora (0 en una purga nueva): el total final se consulta con GET
+            "registros_eliminados": tarea.eliminados,
+            "tarea": serializar_tarea(tarea)
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class VerificarAuditoriaView(APIView):
+    """
+    Verificación de la cadena de hashes de auditoría
+    Solo Administrador Global
 
-        return Response(
-            {"detail": "Operación no válida"},
-            status=status.HTTP_400_BAD_REQUEST
+    La verificación incremental parte del último checkpoint OK y solo
+    recalcula las filas nuevas; la completa recorre toda la tabla. Ambas
+    corren en segundo plano: sin checkpoint (primera vez o tras una falla)
+    la incremental también recorre la tabla entera.
+    """
+    permission_classes = [AdminGlobalPermission]
+
+    def get(self, request):
+        """
+        Query params:
+        - verificacion_id: detalle de una verificación (default: últimas 20)
+        """
+        verificacion_id = request.query_params.get("verificacion_id")
+        if verificacion_id:
+            try:
+                verificacion = VerificacionAuditoria.objects.select_related('ejecutada_por').get(pk=verificacion_id)
+            except (VerificacionAuditoria.DoesNotExist, ValueError):
+                return Response(
+                    {"detail": "Verificación no encontrada"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            return Response(serializar_verificacion(verificacion))
+
+        checkpoint = ultimo_checkpoint()
+        verificaciones = VerificacionAuditoria.objects.select_related('ejecutada_por')[:20]
+        return Response({
+            "checkpoint": serializar_verificacion(checkpoint) if checkpoint else None,
+            "verificaciones": [serializar_verificacion(v) for v in verificaciones]
+        })
+
+    def post(self, request):
+        """
+        Body: { "completa": false }
+        Incremental o completa, en segundo plano (202). El resultado se
+        consulta con GET ?verificacion_id=
+        """
+        completa = str(request.data.get("completa", "")).lower() in ("1", "true")
+        tipo = "completa" if completa else "incremental"
+
+        if VerificacionAuditoria.objects.filter(estado="EN_CURSO", completa=completa).exists():
+            return Response(
+                {"detail": f"Ya existe una verificación {tipo} en curso"},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        verificacion = VerificacionAuditoria.objects.create(completa=completa, ejecutada_por=request.user)
+        ejecutar_en_segundo_plano(
+            verificar_cadena,
+            completa=completa,
+            verificacion=verificacion,
+            nombre=f"verificacion-auditoria-{verificacion.id}"
         )
+        return Response({
+            "detail": f"Verificación {tipo} iniciada en segundo plano ({verificacion.id})",
+            "verificacion": serializar_verificacion(verificacion)
+        }, status=status.HTTP_202_ACCEPTED)
@@ -3,14 +3,27 @@ Vista de Auditoría completa con filtros
 Solo lectura: AUDITOR, TI, ADMIN
 Filtros: fecha_desde, fecha_hasta, usuario, accion, modelo, objeto_id
 """
+import json
+import tempfile
+
+from django.http import FileResponse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.contrib.auth.models import User
-from datetime import datetime, timedelta
+from src import columnar
+from src.columnar import FORMATOS_COLUMNARES
 from src.permissions import TieneRol
 from src.models import Auditoria
+from src.streaming import bloques_csv, bloques_ndjson, respuesta_streaming
+from src.roles import rol_de_request
+from src.utils_auditoria import (
+    FiltroAuditoriaInvalido,
+    codificar_cursor,
+    contar_estimado,
+    despues_del_cursor,
+    filtrar_auditorias,
+)
 
 
 class AuditoriaView(APIView):
@@ -32,91 +45,77 @@ class AuditoriaView(APIView):
             - modelo: Registro|Calificacion|Certificado|ReglaNegocio
             - objeto_id: int
             - rol: CORREDOR|ANALISTA|AUDITOR|TI|ADMIN
-            - page: int (default: 1)
+            - cursor: siguiente_cursor de la respuesta anterior (paginación keyset)
+            - page: int (default: 1, OFFSET; preferir cursor en páginas profundas)
             - page_size: int (default: 50, max: 200)
+            - total: exacto|estimado|no (default: estimado; exacto si hay filtros además de fechas)
         """
-        # Filtrar desde últimos 30 días por defecto
-        fecha_hasta = datetime.now().date()
-        fecha_desde = fecha_hasta - timedelta(days=30)
-
-        # Parse fechas si vienen en params
-        fecha_desde_param = request.query_params.get('fecha_desde')
-        if fecha_desde_param:
-            try:
-                fecha_desde = datetime.strptime(fecha_desde_param, '%Y-%m-%d').date()
-            except ValueError:
-                return Response(
-                    {"detail": "fecha_desde inválida. Use formato YYYY-MM-DD"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        try:
+            auditorias, fecha_desde, fecha_hasta = filtrar_auditorias(request.query_params)
+        except FiltroAuditoriaInvalido as exc:
+            return Response({"detail": exc.detail}, status=exc.status_code)
+        auditorias = auditorias.select_related('usuario')
 
-        fecha_hasta_param = request.query_params.get('fecha_hasta')
-        if fecha_hasta_param:
-            try:
-                fecha_hasta = datetime.strptime(fecha_hasta_param, '%Y-%m-%d').date()
-            except ValueError:
-                return Response(
-                    {"detail": "fecha_hasta inválida. Use formato YYYY-MM-DD"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        # Orden estable (fecha, id) para la paginación por cursor
+        auditorias = auditorias.order_by('-fecha', '-id')
 
-        # Query base
-        auditorias = Auditoria.objects.filter(
-            fecha__date__gte=fecha_desde,
-            fecha__date__lte=fecha_hasta
-        ).select_related('usuario')
+        # Conteo: exacto si hay filtros selectivos; estimado si solo se filtra por fecha
+        modo_total = request.query_params.get('total', 'estimado')
+        if modo_total not in ('exacto', 'estimado', 'no'):
+            return Response(
+                {"detail": "total debe ser exacto, estimado o no"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        solo_rango_fechas = not any(
+            request.query_params.get(p) for p in ('usuario', 'accion', 'modelo', 'objeto_id', 'rol')
+        )
+        total_estimado = modo_total == 'estimado' and solo_rango_fechas
+        if modo_total == 'no':
+            total = None
+        elif total_estimado:
+            total = contar_estimado(auditorias)
+        else:
+            total = auditorias.count()
 
-        # Filtros adicionales
-        usuario_param = request.query_params.get('usuario')
-        if usuario_param:
-            try:
-                user = User.objects.get(username=usuario_param)
-                auditorias = auditorias.filter(usuario=user)
-            except User.DoesNotExist:
-                return Response(
-                    {"detail": f"Usuario '{usuario_param}' no encontrado"},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-
-        accion_param = request.query_params.get('accion')
-        if accion_param:
-            if accion_param not in dict(Auditoria.ACCION_CHOICES):
-                return Response(
-                    {"detail": "Acción inválida"},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            auditorias = auditorias.filter(accion=accion_param)
-
-        modelo_param = request.query_params.get('modelo')
-        if modelo_param:
-            auditorias = auditorias.filter(modelo=modelo_param)
+        # Paginación
+        try:
+            page = int(request.query_params.get('page', 1))
+            page_size = min(int(request.query_params.get('page_size', 50)), 200)
+        except ValueError:
+            return Response(
+                {"detail": "page y page_size deben ser números"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if page < 1 or page_size < 1:
+            return Response(
+                {"detail": "page y page_size deben ser mayores a 0"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        objeto_id_param = request.query_params.get('objeto_id')
-        if objeto_id_param:
+        # Con cursor el costo es constante en cualquier página; page (OFFSET) se
+        # mantiene por compatibilidad pero recorre todas las filas anteriores
+        cursor = request.query_params.get('cursor')
+        if cursor:
             try:
-                auditorias = auditorias.filter(objeto_id=int(objeto_id_param))
+                auditorias = despues_del_cursor(auditorias, cursor)
             except ValueError:
                 return Response(
-                    {"detail": "objeto_id debe ser un número"},
+                    {"detail": "cursor inválido"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
+            start = 0
+        else:
+            start = (page - 1) * page_size
 
-        rol_param = request.query_params.get('rol')
-        if rol_param:
-            auditorias = auditorias.filter(rol=rol_param)
+        # Se pide una fila extra para saber si existe una página siguiente
+        auditorias_paginated = list(auditorias[start:start + page_size + 1])
+        hay_siguiente = len(auditorias_paginated) > page_size
+        auditorias_paginated = auditorias_paginated[:page_size]
 
-        # Ordenar por fecha descendente
-        auditorias = auditorias.order_by('-fecha')
-
-        # Paginación
-        page = int(request.query_params.get('page', 1))
-        page_size = min(int(request.query_params.get('page_size', 50)), 200)
-
-        start = (page - 1) * page_size
-        end = start + page_size
-
-        total = auditorias.count()
-        auditorias_paginated = auditorias[start:end]
+        siguiente_cursor = None
+        if hay_siguiente:
+            ultima = auditorias_paginated[-1]
+            siguiente_cursor = codificar_cursor(ultima.fecha, ultima.id)
 
         # Serializar
         data = []
@@ -137,15 +136,101 @@ class AuditoriaView(APIView):
 
         return Response({
             "total": total,
-            "page": page,
+            "total_estimado": total_estimado,
+            "page": None if cursor else page,
             "page_size": page_size,
-            "pages": (total + page_size - 1) // page_size,
+            "pages": (total + page_size - 1) // page_size if total is not None else None,
+            "siguiente_cursor": siguiente_cursor,
             "fecha_desde": fecha_desde.isoformat(),
             "fecha_hasta": fecha_hasta.isoformat(),
             "resultados": data
         })
 
 
+class ExportarAuditoriaView(APIView):
+    """
+    GET: Exportación completa de auditoría en streaming (NDJSON o CSV)
+    o columnar (Parquet / Arrow IPC) para análisis.
+    Pensada para extracciones de cumplimiento de varios años:
+    usa un cursor del servidor y memoria constante.
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["AUDITOR", "TI", "ADMIN"]
+
+    CAMPOS = [
+        'id', 'fecha', 'usuario__username', 'rol', 'accion', 'modelo',
+        'objeto_id', 'descripcion', 'ip_address', 'metadatos',
+    ]
+    CHUNK_SIZE = 2000
+
+    def get(self, request):
+        """
+        Mismos filtros que AuditoriaView, más:
+            - formato: ndjson|csv|parquet|arrow (default: ndjson)
+            - gzip: 1 para descargar comprimido (.gz; no aplica a parquet/arrow,
+              que ya van comprimidos con zstd)
+        """
+        formato = request.query_params.get('formato', 'ndjson')
+        if formato not in ('ndjson', 'csv', *FORMATOS_COLUMNARES):
+            return Response(
+                {"detail": "formato debe ser ndjson, csv, parquet o arrow"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if formato in FORMATOS_COLUMNARES and not columnar.PYARROW_AVAILABLE:
+            return Response({"detail": columnar.MENSAJE_PYARROW}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            auditorias, fecha_desde, fecha_hasta = filtrar_auditorias(request.query_params)
+        except FiltroAuditoriaInvalido as exc:
+            return Response({"detail": exc.detail}, status=exc.status_code)
+
+        # Orden cronológico sobre el índice (fecha, id); values() evita instanciar modelos
+        # e iterator() lee por bloques con un cursor del servidor
+        filas = auditorias.order_by('fecha', 'id').values(*self.CAMPOS).iterator(chunk_size=self.CHUNK_SIZE)
+
+        Auditoria.objects.create(
+            usuario=request.user,
+            rol=rol_de_request(request) or 'ADMIN',
+            accion="CREATE",
+            modelo="Auditoria",
+            descripcion=f"Exportación de auditoría ({formato}) {fecha_desde} → {fecha_hasta}",
+            metadatos={k: v for k, v in request.query_params.items()}
+        )
+
+        nombre = f"auditoria_{fecha_desde:%Y%m%d}_{fecha_hasta:%Y%m%d}.{formato}"
+
+        if formato in FORMATOS_COLUMNARES:
+            # El pie del archivo (metadatos de row groups) se escribe al final:
+            # se arma en un temporal en disco y se envía con FileResponse
+            archivo = tempfile.TemporaryFile(suffix=f".{formato}")
+            columnar.escribir_columnar(archivo, formato, columnar.ESQUEMA_AUDITORIA, columnar.filas_auditoria(filas))
+            archivo.seek(0)
+            content_type = 'application/vnd.apache.parquet' if formato == 'parquet' else 'application/vnd.apache.arrow.file'
+            return FileResponse(archivo, as_attachment=True, filename=nombre, content_type=content_type)
+
+        gzip = request.query_params.get('gzip') in ('1', 'true')
+
+        if formato == 'csv':
+            bloques = bloques_csv(
+                ['id', 'fecha', 'usuario', 'rol', 'accion', 'modelo', 'objeto_id', 'descripcion', 'ip_address', 'metadatos'],
+                (
+                    [
+                        a['id'], a['fecha'].isoformat(), a['usuario__username'] or '', a['rol'], a['accion'],
+                        a['modelo'], a['objeto_id'] if a['objeto_id'] is not None else '', a['descripcion'],
+                        a['ip_address'] or '', json.dumps(a['metadatos'], ensure_ascii=False),
+                    ]
+                    for a in filas
+                )
+            )
+            return respuesta_streaming(bloques, 'text/csv; charset=utf-8', nombre, gzip=gzip)
+
+        bloques = bloques_ndjson(
+            {('usuario' if k == 'usuario__username' else k): v for k, v in a.items()}
+            for a in filas
+        )
+        return respuesta_streaming(bloques, 'application/x-ndjson', nombre, gzip=gzip)
+
+
 class AuditoriaEstadisticasView(APIView):
     """
     GET: Estadísticas de auditoría
@@ -7,7 +7,8 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.utils import timezone
 from django.db import transaction
-from rest_framework_simplejwt.tokens import RefreshToken
+from src.tokens import RefreshTokenConClaims
+from src.roles import rol_de_request
 import pyotp
 import redis
 import json
@@ -27,8 +28,7 @@ except:
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def mi_perfil(request):
-    perfil = getattr(request.user, "perfil", None)
-    rol = perfil.rol if perfil else None
+    rol = rol_de_request(request)
 
     if request.user.is_superuser and not rol:
         rol = "TI"
@@ -418,10 +418,10 @@ class LoginMFAView(APIView):
 
         if not mfa_habilitado:
             # Sin MFA, generar tokens directamente
-            refresh = RefreshToken.for_user(user)
+            refresh = RefreshTokenConClaims.for_user(user)
             return Response({
                 "access": str(refresh.access_token),
-                "refresh": str(refresh.token),
+                "refresh": str(refresh),
                 "mfa_requerido": False,
                 "usuario": {
                     "id": user.id,
@@ -495,10 +495,10 @@ class LoginMFAView(APIView):
         self._eliminar_sesion_mfa(session_id)
 
         # Generar tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = RefreshTokenConClaims.for_user(user)
         return Response({
             "access": str(refresh.access_token),
-            "refresh": str(refresh.token),
+            "refresh": str(refresh),
             "usuario": {
                 "id": user.id,
                 "username": user.username,
@@ -4,6 +4,7 @@ from rest_framework.permissions import IsAuthenticated
 
 from src.permissions import TieneRol
 from src.models import Calificacion, Registro
+from src.roles import rol_de_request
 
 
 class CalificacionView(APIView):
@@ -43,7 +44,7 @@ class CalificacionView(APIView):
             from src.models import Auditoria
             Auditoria.objects.create(
                 usuario=request.user,
-                rol=request.user.perfil.rol if hasattr(request.user, 'perfil') else "DESCONOCIDO",
+                rol=rol_de_request(request) or "DESCONOCIDO",
                 accion="RESOLUCION",
                 modelo="Calificacion",
                 objeto_id=calificacion.id,
@@ -13,6 +13,9 @@ from bson.errors import InvalidId
 from src.permissions import TieneRol
 from src.mongodb_utils import CalificacionMongo, DocumentoMongo
 from src.models import Auditoria, Registro
+from src.integridad_auditoria import registrar_auditorias
+from src.motor_reglas import CAMPOS_EFECTO, MotorReglas, aplicar_efectos, auditorias_de_reglas
+from src.roles import rol_de_request
 
 
 class CalificacionCorredorView(APIView):
@@ -99,11 +102,16 @@ class CalificacionCorredorView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        # Reglas de negocio activas (pueden cambiar estado o pedir auditoría)
+        coincidencias = MotorReglas.activo().aplicar(data)
+
         try:
             calificacion_id = self.calificacion_mongo.crear(data)
         except ValueError as exc:
             return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
+        registrar_auditorias(auditorias_de_reglas(coincidencias, calificacion_id, request.user, "CORREDOR"))
+
         # Auditoría
         Auditoria.objects.create(
             usuario=request.user,
@@ -150,8 +158,10 @@ class CalificacionCorredorView(APIView):
         return Response({
             "detail": "Calificación creada exitosamente",
             "id": calificacion_id,
-            "estado": "BORRADOR",
-            "auditoria_solicitada": data.get('solicitar_auditoria', False)
+            "estado": data['estado'],
+            "auditoria_solicitada": data.get('solicitar_auditoria', False),
+            "reglas_aplicadas": [r.nombre for r in coincidencias],
+            "alertas": data['alertas']
         }, status=status.HTTP_201_CREATED)
 
 
@@ -291,10 +301,18 @@ class CalificacionAnalistaView(APIView):
             if 'detalles' in request.data:
                 data_actualizar['detalles'] = request.data['detalles']
 
+            # Reevaluar reglas sobre el documento resultante
+            documento = {**actual, **data_actualizar}
+            coincidencias = MotorReglas.activo().aplicar(documento)
+            for campo in CAMPOS_EFECTO:
+                if campo in documento and documento[campo] != actual.get(campo):
+                    data_actualizar[campo] = documento[campo]
+
             success = self.calificacion_mongo.actualizar(
                 calificacion_id,
                 data_actualizar,
-                request.user.username
+                request.user.username,
+                transiciones=documento.get('historial_estados', [])[len(actual.get('historial_estados', [])):]
             )
 
             if not success:
@@ -306,13 +324,20 @@ class CalificacionAnalistaView(APIView):
             # Auditoría
             Auditoria.objects.create(
                 usuario=request.user,
-                rol=getattr(request.user.perfil, 'rol', 'ANALISTA'),
+                rol=rol_de_request(request) or 'ANALISTA',
                 accion="UPDATE",
                 modelo="CalificacionMongo",
                 descripcion=f"Actualizó calificación {calificacion_id}"
             )
+            registrar_auditorias(auditorias_de_reglas(
+                coincidencias, calificacion_id, request.user, rol_de_request(request) or 'ANALISTA'
+            ))
 
-            return Response({"detail": "Calificación actualizada exitosamente"})
+            return Response({
+                "detail": "Calificación actualizada exitosamente",
+                "estado": documento.get('estado'),
+                "reglas_aplicadas": [r.nombre for r in coincidencias]
+            })
 
         except InvalidId:
             return Response(
@@ -343,7 +368,7 @@ class CalificacionEnviarValidacionView(APIView):
 
         Auditoria.objects.create(
             usuario=request.user,
-            rol=getattr(request.user.perfil, 'rol', 'ANALISTA'),
+            rol=rol_de_request(request) or 'ANALISTA',
             accion="UPDATE",
             modelo="CalificacionMongo",
             descripcion=f"Envió calificación {calificacion_id} a validación"
@@ -382,7 +407,7 @@ class CalificacionResolverView(APIView):
 
         Auditoria.objects.create(
             usuario=request.user,
-            rol=getattr(request.user.perfil, 'rol', 'AUDITOR'),
+            rol=rol_de_request(request) or 'AUDITOR',
             accion="UPDATE",
             modelo="CalificacionMongo",
             descripcion=f"Resolución {nuevo_estado} sobre calificación {calificacion_id}"
@@ -513,7 +538,7 @@ class DocumentosMongoView(APIView):
 
         Auditoria.objects.create(
             usuario=request.user,
-            rol=getattr(request.user.perfil, 'rol', 'CORREDOR'),
+            rol=rol_de_request(request) or 'CORREDOR',
             accion="CREATE",
             modelo="DocumentoMongo",
             descripcion=f"Carga de documento {doc_id} para registro {data.get('registro_id')}"
@@ -565,9 +590,10 @@ class CalificacionCargaMasivaCSVView(APIView):
             'creado_por': request.user.username,
         })
 
-        # Procesar CSV
+        # Procesar CSV: primero se validan todas las filas...
         creadas = 0
         errores = []
+        validas = []
         with open(file_path, newline='', encoding='utf-8') as csvfile:
             reader = csv.DictReader(csvfile)
             expected = {'registro_id', 'rut', 'tipo_certificado', 'periodo', 'monto'}
@@ -597,22 +623,39 @@ class CalificacionCargaMasivaCSVView(APIView):
                     if not payload['tipo_certificado'] or not payload['rut'] or not payload['periodo']:
                         raise ValueError("Campos obligatorios faltantes")
 
-                    self.calificacion_mongo.crear(payload)
-                    creadas += 1
+                    validas.append((idx, payload))
                 except Exception as exc:  # capturamos por fila
                     errores.append({"fila": idx, "error": str(exc)})
 
+        # ...luego las reglas se evalúan sobre todo el archivo de una vez
+        resultado = MotorReglas.activo().evaluar_lote(payload for _, payload in validas)
+        auditorias_reglas = []
+        for posicion, (idx, payload) in enumerate(validas):
+            try:
+                coincidencias = resultado.coincidencias(posicion)
+                aplicar_efectos(payload, coincidencias)
+                calificacion_id = self.calificacion_mongo.crear(payload)
+                auditorias_reglas.extend(auditorias_de_reglas(
+                    coincidencias, calificacion_id, request.user, rol_de_request(request) or 'ANALISTA'
+                ))
+                creadas += 1
+            except Exception as exc:
+                errores.append({"fila": idx, "error": str(exc)})
+        errores.sort(key=lambda error: error["fila"])
+
         Auditoria.objects.create(
             usuario=request.user,
-            rol=getattr(request.user.perfil, 'rol', 'ANALISTA'),
+            rol=rol_de_request(request) or 'ANALISTA',
             accion="CREATE",
             modelo="CalificacionMongo",
             descripcion=f"Carga masiva CSV doc {doc_id}: creadas={creadas}, errores={len(errores)}"
         )
+        registrar_auditorias(auditorias_reglas)
 
         return Response({
             "detail": "Carga masiva procesada",
             "creadas": creadas,
             "errores": errores,
+            "reglas_aplicadas": len(auditorias_reglas),
             "documento_csv_id": doc_id
         })
@@ -9,6 +9,7 @@ from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404
 from src.models import Auditoria
 from src.views.calificaciones_mongo import CalificacionCorredorDetailView
+from src.roles import rol_de_request
 import pymongo
 
 class CalificacionCorredorUpdateView(APIView):
@@ -23,7 +24,7 @@ class CalificacionCorredorUpdateView(APIView):
     def put(self, request, calificacion_id):
         """Actualizar calificación (solo corredor)"""
 
-        if request.user.perfil.rol != "CORREDOR":
+        if rol_de_request(request) != "CORREDOR":
             return Response(
                 {"detail": "Solo corredores pueden editar calificaciones"},
                 status=status.HTTP_403_FORBIDDEN
@@ -93,7 +94,7 @@ class CalificacionCorredorUpdateView(APIView):
                         "estado": nuevo_estado,
                         "motivo_cambio": motivo,
                         "actualizado_por": request.user.username,
-                        "fecha_actualizacion": str(__import__('datetime').datetime.now()),
+                        "fecha_actualizacion": __import__('datetime').datetime.utcnow(),
                     }
                 }
             )
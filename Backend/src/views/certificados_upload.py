@@ -11,6 +11,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from src.permissions import TieneRol
 from src.models import Certificado, Registro, Auditoria
+from src.roles import rol_de_request
 
 # Configuración
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
@@ -73,7 +74,7 @@ class CertificadoUploadView(APIView):
             )
 
         # Validar permisos: corredor solo puede subir a sus registros
-        if request.user.perfil.rol == "CORREDOR" and registro.usuario != request.user:
+        if rol_de_request(request) == "CORREDOR" and registro.usuario != request.user:
             return Response(
                 {"detail": "No tienes permiso para subir certificados a este registro"},
                 status=status.HTTP_403_FORBIDDEN
@@ -119,7 +120,7 @@ class CertificadoUploadView(APIView):
             # Auditar
             Auditoria.objects.create(
                 usuario=request.user,
-                rol=request.user.perfil.rol,
+                rol=rol_de_request(request),
                 accion="CREATE",
                 modelo="Certificado",
                 objeto_id=certificado.id,
@@ -179,7 +180,7 @@ class CertificadoListView(APIView):
         ).all()
 
         # Filtrar por usuario si es corredor
-        if request.user.perfil.rol == "CORREDOR":
+        if rol_de_request(request) == "CORREDOR":
             certificados = certificados.filter(cargado_por=request.user)
 
         # Filtros opcionales
@@ -242,7 +243,7 @@ class CertificadoDetailView(APIView):
             )
 
         # Verificar permisos
-        if request.user.perfil.rol == "CORREDOR" and certificado.cargado_por != request.user:
+        if rol_de_request(request) == "CORREDOR" and certificado.cargado_por != request.user:
             return Response(
                 {"detail": "No tienes permiso para ver este certificado"},
                 status=status.HTTP_403_FORBIDDEN
@@ -275,7 +276,7 @@ class CertificadoDetailView(APIView):
             - estado: VALIDADO | RECHAZADO
             - observaciones: string (opcional)
         """
-        if request.user.perfil.rol not in ["ANALISTA", "AUDITOR", "TI"]:
+        if rol_de_request(request) not in ["ANALISTA", "AUDITOR", "TI"]:
             return Response(
                 {"detail": "No tienes permiso para validar certificados"},
                 status=status.HTTP_403_FORBIDDEN
@@ -309,7 +310,7 @@ class CertificadoDetailView(APIView):
         # Auditar
         Auditoria.objects.create(
             usuario=request.user,
-            rol=request.user.perfil.rol,
+            rol=rol_de_request(request),
             accion="UPDATE",
             modelo="Certificado",
             objeto_id=certificado.id,
@@ -340,7 +341,7 @@ class CertificadoDetailView(APIView):
             )
 
         # Solo el creador o TI pueden eliminar
-        if certificado.cargado_por != request.user and request.user.perfil.rol != "TI":
+        if certificado.cargado_por != request.user and rol_de_request(request) != "TI":
             return Response(
                 {"detail": "No tienes permiso para eliminar este certificado"},
                 status=status.HTTP_403_FORBIDDEN
@@ -349,7 +350,7 @@ class CertificadoDetailView(APIView):
         # Auditar antes de eliminar
         Auditoria.objects.create(
             usuario=request.user,
-            rol=request.user.perfil.rol,
+            rol=rol_de_request(request),
             accion="DELETE",
             modelo="Certificado",
             objeto_id=certificado.id,
@@ -1,247 +1,241 @@
 """
-Vistas para exportar calificaciones a PDF y Excel
+Vistas para exportar calificaciones a PDF, Excel, CSV y formatos columnares
+(Parquet / Arrow IPC, para análisis)
+
+Las filas salen de src/exportacion.py: colección de MongoDB por defecto
+(fuente=postgres para el modelo Calificacion legado), con filtros estado,
+periodo, tipo_certificado, dias y fecha_desde/fecha_hasta.
+
+Exportaciones grandes: usar las tareas en segundo plano (TareasExportacionView,
+src/tareas_exportacion.py), que generan el archivo fuera del request y lo
+reutilizan mientras los datos no cambien.
 """
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
-from django.http import HttpResponse
-import csv
-from io import BytesIO
-from datetime import datetime
-from src.models import Calificacion
+from django.conf import settings
+from django.http import FileResponse
+from django.utils import timezone
+import os
+import tempfile
+from src.exportacion import ExportacionInvalida, parametros_exportacion
+from src.formatos_exportacion import FORMATOS, bloques_csv_calificaciones
+from src.models import Auditoria, TareaExportacion
 from src.permissions import TieneRol
-
-try:
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib import colors
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
-
-try:
-    import openpyxl
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-    OPENPYXL_AVAILABLE = True
-except ImportError:
-    OPENPYXL_AVAILABLE = False
+from src.roles import rol_de_request
+from src.streaming import respuesta_streaming
+from src.tareas import ejecutar_en_segundo_plano
+from src.tareas_exportacion import (
+    crear_o_reutilizar,
+    ejecutar_tarea_exportacion,
+    serializar_tarea_exportacion,
+)
+
+
+def _respuesta_archivo(formato, request):
+    """Genera el formato en un temporal (FileResponse lo cierra y se borra al terminar)"""
+    extension, content_type, escribir, disponible, mensaje = FORMATOS[formato]
+    if not disponible:
+        return Response({"detail": mensaje}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Obtener parámetros y filtrar calificaciones
+    try:
+        parametros = parametros_exportacion(request.query_params)
+    except ExportacionInvalida as exc:
+        return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    archivo = tempfile.TemporaryFile(suffix=f".{extension}")
+    escribir(archivo, parametros)
+    archivo.seek(0)
+
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f"calificaciones.{extension}",
+        content_type=content_type
+    )
 
 
 class ExportarPDFView(APIView):
     """
     Exportar calificaciones a PDF
     GET: /api/exportar/pdf/?estado=VALIDADA&dias=30
+
+    Todas las filas, en tablas del tamaño de una página (src/reporte_pdf.py).
     """
     permission_classes = [IsAuthenticated, TieneRol]
     roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
 
     def get(self, request):
-        if not REPORTLAB_AVAILABLE:
-            return Response(
-                {"detail": "ReportLab no está instalado. Instala con: pip install reportlab"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Obtener parámetros
-        estado = request.query_params.get('estado')
-        dias = int(request.query_params.get('dias', 30))
-
-        # Filtrar calificaciones
-        calificaciones = Calificacion.objects.all()
-        if estado:
-            calificaciones = calificaciones.filter(estado=estado)
-
-        # Crear PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch)
-
-        # Estilos
-        styles = getSampleStyleSheet()
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            textColor=colors.HexColor('#0b1220'),
-            spaceAfter=20,
-            alignment=1  # Center
-        )
-
-        # Elementos del documento
-        elements = []
-
-        # Título
-        title = Paragraph("📊 Reporte de Calificaciones", title_style)
-        elements.append(title)
-        elements.append(Spacer(1, 0.3*inch))
-
-        # Información del reporte
-        fecha_actual = datetime.now().strftime('%d/%m/%Y %H:%M')
-        info_text = f"Generado: {fecha_actual} | Total: {calificaciones.count()} calificaciones"
-        elements.append(Paragraph(info_text, styles['Normal']))
-        elements.append(Spacer(1, 0.2*inch))
-
-        # Tabla de datos
-        data = [['RUT', 'Tipo Cert.', 'Período', 'Estado', 'Auditoría', 'Creado']]
-
-        for cal in calificaciones[:100]:  # Limitar a 100 para no sobrecargar el PDF
-            auditoria = '✓' if cal.solicitar_auditoria else '-'
-            data.append([
-                cal.registro.rut if cal.registro else '-',
-                'N/A',  # Tipo certificado no está en modelo Calificacion
-                'N/A',
-                cal.estado,
-                auditoria,
-                cal.fecha_creacion.strftime('%d/%m/%Y')
-            ])
-
-        # Estilos de tabla
-        table = Table(data, colWidths=[1.2*inch, 1*inch, 1*inch, 1*inch, 0.8*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3b82f6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-
-        elements.append(table)
-
-        # Generar PDF
-        doc.build(elements)
-        buffer.seek(0)
-
-        # Retornar respuesta
-        return HttpResponse(
-            buffer,
-            content_type='application/pdf',
-            headers={'Content-Disposition': 'attachment; filename="calificaciones.pdf"'}
-        )
+        return _respuesta_archivo('pdf', request)
 
 
 class ExportarExcelView(APIView):
     """
     Exportar calificaciones a Excel
     GET: /api/exportar/excel/?estado=VALIDADA&dias=30
+
+    Workbook en modo write-only con filas en streaming
+    (src/formatos_exportacion.py); se arma en un temporal en disco y se
+    envía con FileResponse.
     """
     permission_classes = [IsAuthenticated, TieneRol]
     roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
 
     def get(self, request):
-        if not OPENPYXL_AVAILABLE:
-            return Response(
-                {"detail": "openpyxl no está instalado. Instala con: pip install openpyxl"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        # Obtener parámetros
-        estado = request.query_params.get('estado')
-
-        # Filtrar calificaciones
-        calificaciones = Calificacion.objects.all()
-        if estado:
-            calificaciones = calificaciones.filter(estado=estado)
-
-        # Crear workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Calificaciones"
-
-        # Estilos
-        header_fill = PatternFill(start_color="3b82f6", end_color="3b82f6", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-
-        # Encabezados
-        headers = ['RUT', 'Tipo Certificado', 'Período', 'Monto', 'Estado', 'Auditoría', 'Creado']
-        for col_num, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-            cell.border = border
-
-        # Datos
-        for row_num, cal in enumerate(calificaciones, 2):
-            auditoria = 'Sí' if cal.solicitar_auditoria else 'No'
-            row_data = [
-                cal.registro.rut if cal.registro else '',
-                'N/A',
-                'N/A',
-                'N/A',
-                cal.estado,
-                auditoria,
-                cal.fecha_creacion.strftime('%d/%m/%Y')
-            ]
-
-            for col_num, value in enumerate(row_data, 1):
-                cell = ws.cell(row=row_num, column=col_num)
-                cell.value = value
-                cell.border = border
-                cell.alignment = Alignment(horizontal="center")
-
-        # Ajustar ancho de columnas
-        for col in range(1, len(headers) + 1):
-            ws.column_dimensions[openpyxl.utils.get_column_letter(col)].width = 15
-
-        # Generar Excel
-        buffer = BytesIO()
-        wb.save(buffer)
-        buffer.seek(0)
-
-        # Retornar respuesta
-        return HttpResponse(
-            buffer,
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            headers={'Content-Disposition': 'attachment; filename="calificaciones.xlsx"'}
-        )
+        return _respuesta_archivo('xlsx', request)
 
 
 class ExportarCSVView(APIView):
     """
     Exportar calificaciones a CSV
-    GET: /api/exportar/csv/?estado=VALIDADA
+    GET: /api/exportar/csv/?estado=VALIDADA&dias=30
+
+    El CSV se genera en streaming por bloques de filas (src/streaming.py)
+    y se comprime al vuelo si el cliente envía Accept-Encoding: gzip.
     """
     permission_classes = [IsAuthenticated, TieneRol]
     roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
 
     def get(self, request):
-        estado = request.query_params.get('estado')
-
-        calificaciones = Calificacion.objects.all()
-        if estado:
-            calificaciones = calificaciones.filter(estado=estado)
-
-        # Preparar respuesta CSV
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="calificaciones.csv"'
-
-        writer = csv.writer(response)
-        # Encabezados
-        writer.writerow(['RUT', 'Tipo Certificado', 'Periodo', 'Monto', 'Estado', 'Auditoria', 'Creado'])
-
-        for cal in calificaciones:
-            auditoria = 'SI' if getattr(cal, 'solicitar_auditoria', False) else 'NO'
-            writer.writerow([
-                cal.registro.rut if getattr(cal, 'registro', None) else '',
-                'N/A',
-                'N/A',
-                'N/A',
-                cal.estado,
-                auditoria,
-                cal.fecha_creacion.strftime('%Y-%m-%d') if getattr(cal, 'fecha_creacion', None) else ''
-            ])
-
-        return response
+        try:
+            parametros = parametros_exportacion(request.query_params)
+        except ExportacionInvalida as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        bloques = bloques_csv_calificaciones(parametros)
+        return respuesta_streaming(bloques, 'text/csv; charset=utf-8', 'calificaciones.csv', request=request)
+
+
+class ExportarParquetView(APIView):
+    """
+    Exportar calificaciones a Apache Parquet
+    GET: /api/exportar/parquet/?estado=VALIDADA&dias=30
+
+    Columnas tipadas (monto decimal, fechas timestamp UTC) comprimidas con
+    zstd, escritas por row groups (src/columnar.py). Requiere pyarrow.
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
+
+    def get(self, request):
+        return _respuesta_archivo('parquet', request)
+
+
+class ExportarArrowView(APIView):
+    """
+    Exportar calificaciones a Arrow IPC (formato archivo, .arrow / Feather v2)
+    GET: /api/exportar/arrow/?estado=VALIDADA&dias=30
+
+    Mismo esquema que Parquet; se lee con pyarrow.ipc.open_file o
+    pandas.read_feather sin decodificar. Requiere pyarrow.
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
+
+    def get(self, request):
+        return _respuesta_archivo('arrow', request)
+
+
+# ===============================
+# EXPORTACIONES EN SEGUNDO PLANO
+# ===============================
+class TareasExportacionView(APIView):
+    """
+    Exportaciones generadas fuera del request
+    POST: /api/exportar/tareas/?formato=xlsx&estado=VALIDADA&dias=30
+          (formato: csv, xlsx, pdf, parquet o arrow; mismos filtros que las exportaciones directas)
+          -> 202 con la tarea creada, o 200 si una exportación idéntica
+             (mismos filtros y mismos datos) está en curso o ya generada
+    GET:  /api/exportar/tareas/  -> últimas tareas del usuario
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
+
+    def get(self, request):
+        tareas = TareaExportacion.objects.filter(solicitado_por=request.user)[:20]
+        return Response({
+            "tareas": [serializar_tarea_exportacion(t) for t in tareas]
+        }, status=status.HTTP_200_OK)
+
+    def post(self, request):
+        formato = request.query_params.get('formato') or request.data.get('formato') or 'csv'
+        try:
+            tarea, reutilizada = crear_o_reutilizar(request.user, formato, request.query_params)
+        except ExportacionInvalida as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not reutilizada:
+            ejecutar_en_segundo_plano(ejecutar_tarea_exportacion, tarea.id, nombre=f"exportacion-{tarea.id}")
+
+        Auditoria.objects.create(
+            usuario=request.user,
+            rol=rol_de_request(request) or 'DESCONOCIDO',
+            accion="CREATE",
+            modelo="TareaExportacion",
+            objeto_id=tarea.id,
+            descripcion=f"Exportación de calificaciones ({tarea.formato}) {'reutilizada' if reutilizada else 'solicitada'}",
+            metadatos={"parametros": tarea.parametros, "reutilizada": reutilizada}
+        )
+
+        return Response({
+            "detail": "Exportación reutilizada" if reutilizada else f"Exportación en segundo plano iniciada (tarea {tarea.id})",
+            "reutilizada": reutilizada,
+            "tarea": serializar_tarea_exportacion(tarea),
+        }, status=status.HTTP_200_OK if reutilizada else status.HTTP_202_ACCEPTED)
+
+
+def _obtener_tarea(pk):
+    try:
+        return TareaExportacion.objects.get(pk=pk)
+    except TareaExportacion.DoesNotExist:
+        return None
+
+
+class TareaExportacionDetailView(APIView):
+    """
+    Estado de una exportación
+    GET: /api/exportar/tareas/<id>/  (incluye "descarga" cuando está lista)
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
+
+    def get(self, request, pk):
+        tarea = _obtener_tarea(pk)
+        if tarea is None:
+            return Response({"detail": "Tarea de exportación no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(serializar_tarea_exportacion(tarea), status=status.HTTP_200_OK)
+
+
+class DescargarExportacionView(APIView):
+    """
+    Descarga del artefacto de una exportación completada
+    GET: /api/exportar/tareas/<id>/descargar/
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["AUDITOR", "ANALISTA", "TI"]
+
+    def get(self, request, pk):
+        tarea = _obtener_tarea(pk)
+        if tarea is None:
+            return Response({"detail": "Tarea de exportación no encontrada"}, status=status.HTTP_404_NOT_FOUND)
+        if tarea.estado != "COMPLETADA":
+            if tarea.estado == "EXPIRADA":
+                return Response({"detail": "La exportación expiró. Solicítela nuevamente"}, status=status.HTTP_410_GONE)
+            return Response(
+                {"detail": f"La exportación no está lista (estado {tarea.estado})"},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        ruta = os.path.join(settings.MEDIA_ROOT, tarea.archivo)
+        if (tarea.expira_en and tarea.expira_en <= timezone.now()) or not os.path.isfile(ruta):
+            return Response({"detail": "La exportación expiró. Solicítela nuevamente"}, status=status.HTTP_410_GONE)
+
+        extension, content_type, _, _, _ = FORMATOS[tarea.formato]
+        return FileResponse(
+            open(ruta, 'rb'),
+            as_attachment=True,
+            filename=f"calificaciones.{extension}",
+            content_type=content_type
+        )
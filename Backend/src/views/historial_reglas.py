@@ -4,8 +4,18 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.db import transaction
 
-from src.models import ReglaNegocio, HistorialReglaNegocio, Auditoria
+from src.models import ReglaNegocio, Auditoria
 from src.permissions import TieneRol
+from src.cache_reglas import incrementar_version_reglas
+from src.red_reglas import actualizar_regla
+from src.roles import rol_de_request
+from src.versiones_reglas import (
+    asegurar_snapshot,
+    comparar_versiones,
+    guardar_snapshot,
+    historial_completo,
+    snapshot_de_version,
+)
 
 
 class HistorialReglaView(APIView):
@@ -25,26 +35,8 @@ class HistorialReglaView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Obtener historial ordenado por versión descendente
-        historial = HistorialReglaNegocio.objects.filter(
-            regla_actual=regla
-        ).order_by('-version')
-
-        data = [
-            {
-                "id": h.id,
-                "nombre": h.nombre,
-                "descripcion": h.descripcion,
-                "condicion": h.condicion,
-                "accion": h.accion,
-                "version": h.version,
-                "estado": h.estado,
-                "modificado_por": h.modificado_por.username if h.modificado_por else "Sistema",
-                "fecha_snapshot": h.fecha_snapshot.strftime("%Y-%m-%d %H:%M:%S"),
-                "comentario": h.comentario,
-            }
-            for h in historial
-        ]
+        # Historial reconstruido (keyframes + deltas), por versión descendente
+        data = sorted(historial_completo(regla), key=lambda h: (h["version"], h["id"]), reverse=True)
 
         return Response({
             "regla_id": regla.id,
@@ -84,57 +76,36 @@ class RollbackReglaView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Buscar snapshot de esa versión
-        try:
-            snapshot = HistorialReglaNegocio.objects.get(
-                regla_actual=regla,
-                version=version_destino
-            )
-        except HistorialReglaNegocio.DoesNotExist:
+        # Buscar snapshot de esa versión (el último, si hay varios)
+        snapshot = snapshot_de_version(regla, version_destino)
+        if snapshot is None:
             return Response(
                 {"detail": f"No existe snapshot de versión {version_destino}"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Guardar snapshot del estado actual antes de rollback
-        HistorialReglaNegocio.objects.create(
-            regla_actual=regla,
-            nombre=regla.nombre,
-            descripcion=regla.descripcion,
-            condicion=regla.condicion,
-            accion=regla.accion,
-            version=regla.version,
-            estado=regla.estado,
-            modificado_por=request.user,
-            comentario=f"Pre-rollback a v{version_destino}"
-        )
+        # Historial previo a la compresión: puede faltar el snapshot del estado actual
+        asegurar_snapshot(regla, request.user, f"Pre-rollback a v{version_destino}")
 
         # Restaurar datos del snapshot
-        regla.nombre = snapshot.nombre
-        regla.descripcion = snapshot.descripcion
-        regla.condicion = snapshot.condicion
-        regla.accion = snapshot.accion
-        regla.estado = snapshot.estado
+        regla.nombre = snapshot["nombre"]
+        regla.descripcion = snapshot["descripcion"]
+        regla.condicion = snapshot["condicion"]
+        regla.accion = snapshot["accion"]
+        regla.estado = snapshot["estado"]
         regla.version += 1  # Nueva versión tras rollback
         regla.save()
+        # Red de reglas de este proceso: solo se recompila esta regla
+        transaction.on_commit(lambda: actualizar_regla(regla))
+        incrementar_version_reglas()
 
-        # Crear nuevo snapshot del estado restaurado
-        HistorialReglaNegocio.objects.create(
-            regla_actual=regla,
-            nombre=regla.nombre,
-            descripcion=regla.descripcion,
-            condicion=regla.condicion,
-            accion=regla.accion,
-            version=regla.version,
-            estado=regla.estado,
-            modificado_por=request.user,
-            comentario=f"Rollback desde v{version_destino}: {comentario}"
-        )
+        # Nuevo snapshot del estado restaurado (delta contra el anterior)
+        guardar_snapshot(regla, request.user, f"Rollback desde v{version_destino}: {comentario}")
 
         # Auditoría del rollback
         Auditoria.objects.create(
             usuario=request.user,
-            rol=getattr(request.user.perfil, 'rol', 'ADMIN'),
+            rol=rol_de_request(request) or 'ADMIN',
             accion="UPDATE",
             modelo="ReglaNegocio",
             objeto_id=regla.id,
@@ -150,7 +121,7 @@ class RollbackReglaView(APIView):
 
 class CompararVersionesView(APIView):
     """
-    Comparar dos versiones de una regla (diff básico)
+    Comparar dos versiones de una regla (diff por líneas con resaltado por palabras)
     """
     permission_classes = [IsAuthenticated, TieneRol]
     roles_permitidos = ["TI", "ADMIN", "AUDITOR"]
@@ -158,7 +129,8 @@ class CompararVersionesView(APIView):
     def get(self, request, pk):
         """
         Comparar dos versiones
-        Query params: ?v1=1&v2=2
+        Query params: ?v1=1&v2=2 (v1 o v2 pueden ser "actual")
+                      &completo=1 para incluir también los textos completos
         """
         try:
             regla = ReglaNegocio.objects.get(pk=pk)
@@ -176,42 +148,18 @@ class CompararVersionesView(APIView):
                 {"detail": "Debe especificar v1 y v2 como query params"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if not all(v == "actual" or v.isdigit() for v in (v1, v2)):
+            return Response(
+                {"detail": "v1 y v2 deben ser un número de versión o 'actual'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        try:
-            version1 = HistorialReglaNegocio.objects.get(regla_actual=regla, version=v1)
-            version2 = HistorialReglaNegocio.objects.get(regla_actual=regla, version=v2)
-        except HistorialReglaNegocio.DoesNotExist:
+        completo = request.query_params.get("completo") in ("1", "true")
+        diff = comparar_versiones(regla, v1, v2, completo=completo)
+        if diff is None:
             return Response(
                 {"detail": "Una o ambas versiones no existen en el historial"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Comparación simple campo por campo
-        diff = {
-            "regla_id": regla.id,
-            "version_1": {
-                "version": version1.version,
-                "nombre": version1.nombre,
-                "descripcion": version1.descripcion,
-                "condicion": version1.condicion,
-                "accion": version1.accion,
-                "estado": version1.estado,
-            },
-            "version_2": {
-                "version": version2.version,
-                "nombre": version2.nombre,
-                "descripcion": version2.descripcion,
-                "condicion": version2.condicion,
-                "accion": version2.accion,
-                "estado": version2.estado,
-            },
-            "cambios": {
-                "nombre": version1.nombre != version2.nombre,
-                "descripcion": version1.descripcion != version2.descripcion,
-                "condicion": version1.condicion != version2.condicion,
-                "accion": version1.accion != version2.accion,
-                "estado": version1.estado != version2.estado,
-            }
-        }
-
         return Response(diff)
@@ -7,23 +7,24 @@ from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from django.http import JsonResponse
 from django.utils import timezone
+import jwt
+from src.blacklist_tokens import (
+    REDIS_AVAILABLE,
+    esta_revocado,
+    estadisticas,
+    revocado_formato_anterior,
+    revocar,
+)
 from src.models import Auditoria
-import redis
-import json
-
-# Conexión a Redis para blacklist de tokens
-try:
-    r = redis.Redis(host='localhost', port=6379, db=1, decode_responses=True)
-    r.ping()
-    REDIS_AVAILABLE = True
-except:
-    REDIS_AVAILABLE = False
+from src.tokens import access_token_actualizado
 
 
 class LogoutView(APIView):
     """
-    Logout que añade el refresh token a la blacklist
+    Logout que añade el refresh token (y el access token en uso) a la blacklist
     """
     permission_classes = [IsAuthenticated]
 
@@ -41,7 +42,9 @@ class LogoutView(APIView):
 
             token = RefreshToken(refresh_token)
             # Agregar a blacklist
-            self._blacklist_token(refresh_token, token.lifetime)
+            self._blacklist_token(token)
+            if request.auth is not None:
+                self._blacklist_token(request.auth)
 
             # Registrar logout en auditoría
             Auditoria.objects.create(
@@ -63,11 +66,10 @@ class LogoutView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    def _blacklist_token(self, token, lifetime):
+    def _blacklist_token(self, token):
         """Blacklist el token en Redis"""
-        if REDIS_AVAILABLE:
-            # Guardar token en blacklist con expiración
-            r.setex(f"blacklist:{token}", int(lifetime.total_seconds()), "1")
+        # jti en el set de su tramo de vencimiento (src/blacklist_tokens.py)
+        revocar(token[api_settings.JTI_CLAIM], token['exp'])
 
     def _obtener_ip(self, request):
         """Obtener IP del cliente"""
@@ -81,7 +83,7 @@ class RefreshTokenView(APIView):
     """
     Refresh token con rotación automática
     - Valida el refresh token actual
-    - Genera nuevo access token
+    - Genera nuevo access token (claims de rol releídos de la base de datos)
     - Genera nuevo refresh token (rotación)
     - Blacklist el refresh token anterior
     """
@@ -100,22 +102,27 @@ class RefreshTokenView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Verificar si el token está en blacklist
-        if REDIS_AVAILABLE and self._esta_en_blacklist(refresh):
-            return Response(
-                {"detail": "Token revocado. Inicia sesión nuevamente"},
-                status=status.HTTP_401_UNAUTHORIZED
-            )
-
         try:
             token = RefreshToken(refresh)
 
-            # Blacklist el refresh token anterior
-            self._blacklist_token(refresh, token.lifetime)
+            # Blacklist el refresh token anterior. El SADD en Redis es la
+            # verificación: si el jti ya estaba, el token ya se rotó (en
+            # este u otro worker) y se rechaza. Sin filtro de Bloom, que
+            # puede estar desactualizado en este proceso.
+            if REDIS_AVAILABLE and not self._blacklist_token(token, refresh):
+                return Response(
+                    {"detail": "Token revocado. Inicia sesión nuevamente"},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+
+            # Rotación: mismo usuario, nuevo jti y vencimiento
+            token.set_jti()
+            token.set_exp()
+            token.set_iat()
 
             # Generar nuevos tokens
             return Response({
-                "access": str(token.access_token),
+                "access": str(access_token_actualizado(token)),
                 "refresh": str(token),
             }, status=status.HTTP_200_OK)
 
@@ -135,22 +142,24 @@ class RefreshTokenView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-    def _esta_en_blacklist(self, token):
-        """Verificar si token está en blacklist"""
-        if REDIS_AVAILABLE:
-            return r.exists(f"blacklist:{token}") > 0
-        return False
-
-    def _blacklist_token(self, token, lifetime):
-        """Blacklist el token en Redis"""
-        if REDIS_AVAILABLE:
-            r.setex(f"blacklist:{token}", int(lifetime.total_seconds()), "1")
+    def _blacklist_token(self, token, refresh):
+        """
+        Blacklist el token en Redis de forma atómica.
+        Retorna False si ya estaba revocado.
+        """
+        if revocado_formato_anterior(refresh):
+            return False
+        return revocar(token[api_settings.JTI_CLAIM], token['exp'])
 
 
 class TokenBlacklistMiddleware:
     """
     Middleware para validar que los tokens no estén en blacklist
     Se puede usar en APIView con @api_view o como middleware
+
+    Solo lee jti y exp del payload (la firma la verifica después la
+    autenticación de DRF); el filtro de Bloom local evita ir a Redis en
+    los tokens no revocados.
     """
     def __init__(self, get_response=None):
         self.get_response = get_response
@@ -160,8 +169,13 @@ class TokenBlacklistMiddleware:
         auth_header = request.META.get('HTTP_AUTHORIZATION', '')
         if auth_header.startswith('Bearer '):
             token = auth_header.split(' ')[1]
-            if REDIS_AVAILABLE and r.exists(f"blacklist:{token}"):
-                return Response(
+            try:
+                payload = jwt.decode(token, options={"verify_signature": False, "verify_exp": False})
+            except jwt.PyJWTError:
+                payload = {}     # token mal formado: lo rechaza la autenticación
+            if esta_revocado(payload.get(api_settings.JTI_CLAIM), payload.get('exp')):
+                # Fuera de DRF: Response no tiene renderer aquí
+                return JsonResponse(
                     {"detail": "Token revocado"},
                     status=status.HTTP_401_UNAUTHORIZED
                 )
@@ -191,12 +205,9 @@ class TokenStatsView(APIView):
                 status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-        # Contar tokens en blacklist
-        pattern = "blacklist:*"
-        blacklist_count = len(r.keys(pattern))
-
+        # Contador mantenido al revocar y al vencer (sin recorrer las claves)
         return Response({
             "redis_available": True,
-            "tokens_blacklist_count": blacklist_count,
+            **estadisticas(),
             "timestamp": timezone.now().isoformat(),
         })
@@ -17,6 +17,7 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from src.models import PerfilUsuario, CorreoAdicional, SolicitudCambioRol, Auditoria
 from src.permissions import TieneRol
+from src.roles import rol_de_request
 
 
 class PerfilUsuarioView(APIView):
@@ -189,7 +190,7 @@ class CorreoAdicionalView(APIView):
         # Auditar
         Auditoria.objects.create(
             usuario=request.user,
-            rol=request.user.perfil.rol,
+            rol=rol_de_request(request),
             accion="CREATE",
             modelo="CorreoAdicional",
             objeto_id=correo.id,
@@ -228,7 +229,7 @@ class CorreoAdicionalView(APIView):
         # Auditar
         Auditoria.objects.create(
             usuario=request.user,
-            rol=request.user.perfil.rol,
+            rol=rol_de_request(request),
             accion="DELETE",
             modelo="CorreoAdicional",
             objeto_id=correo_id,
@@ -581,7 +582,7 @@ class GestionSolicitudesRolView(APIView):
             # Auditar
             Auditoria.objects.create(
                 usuario=request.user,
-                rol=request.user.perfil.rol,
+                rol=rol_de_request(request),
                 accion="RESOLUCION",
                 modelo="SolicitudCambioRol",
                 objeto_id=solicitud.id,
@@ -608,7 +609,7 @@ class GestionSolicitudesRolView(APIView):
             # Auditar
             Auditoria.objects.create(
                 usuario=request.user,
-                rol=request.user.perfil.rol,
+                rol=rol_de_request(request),
                 accion="RESOLUCION",
                 modelo="SolicitudCambioRol",
                 objeto_id=solicitud.id,
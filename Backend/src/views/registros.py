@@ -5,6 +5,7 @@ from src.models import Registro
 from src.serializers import RegistroSerializer
 from src.permissions import PermisoRegistro
 from src.rbac import ROLES
+from src.roles import rol_de_request
 
 
 class RegistroViewSet(viewsets.ModelViewSet):
@@ -13,8 +14,7 @@ class RegistroViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        perfil = getattr(user, "perfil", None)
-        rol = getattr(perfil, "rol", None)
+        rol = rol_de_request(self.request)
 
         if user.is_superuser:
             return Registro.objects.all().order_by("-fecha")
@@ -28,8 +28,7 @@ class RegistroViewSet(viewsets.ModelViewSet):
         return Registro.objects.none()
 
     def perform_create(self, serializer):
-        perfil = getattr(self.request.user, "perfil", None)
-        rol = getattr(perfil, "rol", None)
+        rol = rol_de_request(self.request)
 
         # ❌ CORREDOR NO puede crear
         if rol == ROLES["CORREDOR"]:
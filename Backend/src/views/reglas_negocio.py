@@ -4,8 +4,23 @@ from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.db import transaction
 
-from src.models import ReglaNegocio, HistorialReglaNegocio, Auditoria
+from src.models import ReglaNegocio, Auditoria, SimulacionRegla
+from src.motor_reglas import ReglaInvalida, validar_regla
+from src.cache_reglas import incrementar_version_reglas
+from src.red_reglas import actualizar_regla, quitar_regla
+from src.versiones_reglas import asegurar_snapshot, guardar_snapshot
+from src.simulacion_reglas import (
+    PROCESOS_DEFECTO,
+    SimulacionInvalida,
+    crear_simulacion,
+    ejecutar_simulacion,
+    procesos_efectivos,
+    serializar_simulacion,
+    simular_regla,
+)
+from src.tareas import ejecutar_en_segundo_plano
 from src.permissions import TieneRol
+from src.roles import rol_de_request
 
 
 class ReglasNegocioView(APIView):
@@ -46,6 +61,14 @@ class ReglasNegocioView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            validar_regla(condicion, accion)
+        except ReglaInvalida as exc:
+            return Response(
+                {"detail": f"Regla inválida: {exc}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         regla = ReglaNegocio.objects.create(
             nombre=nombre,
             descripcion=descripcion,
@@ -54,24 +77,16 @@ class ReglasNegocioView(APIView):
             estado=estado,
             creado_por=request.user,
         )
+        actualizar_regla(regla)
+        incrementar_version_reglas()
 
         # Crear primer snapshot en historial
-        HistorialReglaNegocio.objects.create(
-            regla_actual=regla,
-            nombre=regla.nombre,
-            descripcion=regla.descripcion,
-            condicion=regla.condicion,
-            accion=regla.accion,
-            version=regla.version,
-            estado=regla.estado,
-            modificado_por=request.user,
-            comentario="Versión inicial"
-        )
+        guardar_snapshot(regla, request.user, "Versión inicial")
 
         # Auditoría de creación
         Auditoria.objects.create(
             usuario=request.user,
-            rol=getattr(request.user.perfil, 'rol', 'ADMIN'),
+            rol=rol_de_request(request) or 'ADMIN',
             accion="CREATE",
             modelo="ReglaNegocio",
             objeto_id=regla.id,
@@ -122,18 +137,20 @@ class ReglaNegocioDetailView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Guardar snapshot del estado anterior
-        HistorialReglaNegocio.objects.create(
-            regla_actual=regla,
-            nombre=regla.nombre,
-            descripcion=regla.descripcion,
-            condicion=regla.condicion,
-            accion=regla.accion,
-            version=regla.version,
-            estado=regla.estado,
-            modificado_por=request.user,
-            comentario=request.data.get("comentario", "Actualización")
-        )
+        if "condicion" in request.data or "accion" in request.data:
+            try:
+                validar_regla(
+                    request.data.get("condicion", regla.condicion),
+                    request.data.get("accion", regla.accion)
+                )
+            except ReglaInvalida as exc:
+                return Response(
+                    {"detail": f"Regla inválida: {exc}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        # Historial previo a la compresión: puede faltar el snapshot de la versión actual
+        asegurar_snapshot(regla, request.user, "Estado previo")
 
         # Actualizar campos
         regla.nombre = request.data.get("nombre", regla.nombre)
@@ -147,11 +164,18 @@ class ReglaNegocioDetailView(APIView):
             regla.version += 1
 
         regla.save()
+        # Red de reglas de este proceso: solo se recompila esta regla;
+        # los demás procesos recargan al ver la nueva versión global
+        transaction.on_commit(lambda: actualizar_regla(regla))
+        incrementar_version_reglas()
+
+        # Snapshot de la versión resultante (delta contra la anterior)
+        guardar_snapshot(regla, request.user, request.data.get("comentario", "Actualización"))
 
         # Auditoría de actualización
         Auditoria.objects.create(
             usuario=request.user,
-            rol=getattr(request.user.perfil, 'rol', 'ADMIN'),
+            rol=rol_de_request(request) or 'ADMIN',
             accion="UPDATE",
             modelo="ReglaNegocio",
             objeto_id=regla.id,
@@ -174,14 +198,17 @@ class ReglaNegocioDetailView(APIView):
             # Auditoría antes de eliminar
             Auditoria.objects.create(
                 usuario=request.user,
-                rol=getattr(request.user.perfil, 'rol', 'ADMIN'),
+                rol=rol_de_request(request) or 'ADMIN',
                 accion="DELETE",
                 modelo="ReglaNegocio",
                 objeto_id=regla.id,
                 descripcion=f"Eliminada regla '{nombre}' v{version}"
             )
 
+            regla_id = regla.id
             regla.delete()
+            quitar_regla(regla_id)
+            incrementar_version_reglas()
 
             return Response({
                 "detail": f"Regla '{nombre}' eliminada exitosamente"
@@ -191,3 +218,101 @@ class ReglaNegocioDetailView(APIView):
                 {"detail": "Regla no encontrada"},
                 status=status.HTTP_404_NOT_FOUND
             )
+
+
+class SimularReglaView(APIView):
+    """
+    Simulación ("dry run") de una regla sobre las calificaciones existentes.
+    No modifica calificaciones: solo cuenta coincidencias por estado y periodo.
+
+    Con un proceso responde en el request; con varios, la simulación corre
+    en segundo plano (202) y se consulta en /api/reglas-negocio/simulaciones/<id>/.
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["TI", "ADMIN"]
+
+    def post(self, request, pk=None):
+        """
+        Body: { "condicion": "monto > 1000000", "muestra": 0.1, "procesos": 4, "estado": "PENDIENTE" }
+        Con pk, condicion es opcional (por defecto la versión actual) y se
+        compara contra la versión actual de la regla.
+        """
+        regla = None
+        if pk is not None:
+            try:
+                regla = ReglaNegocio.objects.get(pk=pk)
+            except ReglaNegocio.DoesNotExist:
+                return Response(
+                    {"detail": "Regla no encontrada"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        condicion = request.data.get("condicion") or (regla.condicion if regla else None)
+        if not condicion:
+            return Response(
+                {"detail": "Debe especificar la condición a simular"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            muestra = float(request.data.get("muestra", 1))
+            procesos = int(request.data.get("procesos", PROCESOS_DEFECTO))
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "muestra y procesos deben ser numéricos"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        en_segundo_plano = procesos_efectivos(procesos) > 1
+        try:
+            if en_segundo_plano:
+                simulacion = crear_simulacion(
+                    request.user,
+                    condicion,
+                    regla=regla,
+                    muestra=muestra,
+                    procesos=procesos,
+                    estado=request.data.get("estado"),
+                )
+            else:
+                resultado = simular_regla(
+                    condicion,
+                    regla=regla,
+                    muestra=muestra,
+                    procesos=procesos,
+                    estado=request.data.get("estado"),
+                )
+        except ReglaInvalida as exc:
+            return Response(
+                {"detail": f"Regla inválida: {exc}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except SimulacionInvalida as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not en_segundo_plano:
+            return Response(resultado)
+
+        ejecutar_en_segundo_plano(ejecutar_simulacion, simulacion.id, nombre=f"simulacion-regla-{simulacion.id}")
+        return Response({
+            "detail": f"Simulación iniciada en segundo plano ({simulacion.id})",
+            "simulacion": serializar_simulacion(simulacion)
+        }, status=status.HTTP_202_ACCEPTED)
+
+
+class SimulacionReglaDetailView(APIView):
+    """
+    Estado y resultado de una simulación en segundo plano
+    """
+    permission_classes = [IsAuthenticated, TieneRol]
+    roles_permitidos = ["TI", "ADMIN"]
+
+    def get(self, request, pk):
+        try:
+            simulacion = SimulacionRegla.objects.get(pk=pk)
+        except SimulacionRegla.DoesNotExist:
+            return Response(
+                {"detail": "Simulación no encontrada"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response(serializar_simulacion(simulacion))
@@ -9,6 +9,7 @@ from django.db.models import Count, Q
 from datetime import datetime, timedelta
 from src.models import Auditoria, Calificacion
 from src.permissions import TieneRol
+from src.utils_auditoria import filtro_dia
 
 
 class ReporteAuditoriaView(APIView):
@@ -62,8 +63,7 @@ class ReporteAuditoriaView(APIView):
         tendencia_7dias = []
         for i in range(7, 0, -1):
             fecha = datetime.now() - timedelta(days=i)
-            fecha_dia_siguiente = fecha + timedelta(days=1)
-            count = auditorias.filter(fecha__date=fecha.date()).count()
+            count = auditorias.filter(**filtro_dia(fecha.date())).count()
             tendencia_7dias.append({
                 'fecha': fecha.strftime('%d/%m'),
                 'total': count
@@ -6,6 +6,7 @@ from django.shortcuts import get_object_or_404
 
 from src.models import Calificacion, Auditoria
 from src.permissions import TieneRol
+from src.roles import rol_de_request, rol_de_usuario
 
 
 # =========================
@@ -16,8 +17,7 @@ def obtener_rol(user):
         return "DESCONOCIDO"
     if user.is_superuser:
         return "ADMIN"
-    perfil = getattr(user, "perfil", None)
-    return perfil.rol if perfil else "SIN_ROL"
+    return rol_de_usuario(user) or "SIN_ROL"
 
 
 # =========================================================
@@ -123,8 +123,7 @@ class EnviarValidacionView(APIView):
     def patch(self, request, calificacion_id):
         calificacion = get_object_or_404(Calificacion, id=calificacion_id)
 
-        perfil = getattr(request.user, "perfil", None)
-        rol = getattr(perfil, "rol", None)
+        rol = rol_de_request(request)
 
         if rol != "TI" and calificacion.creado_por != request.user:
             raise PermissionDenied("Solo el creador puede enviar su calificación.")
@@ -322,7 +322,7 @@ export default function AdministracionNuam() {
     setLoading(true);
     try {
       const res = await fetch(
-        `http://127.0.0.1:8000/api/reglas-negocio/${reglaId}/comparar/?v1=${v1}&v2=${v2}`,
+        `http://127.0.0.1:8000/api/reglas-negocio/${reglaId}/comparar/?v1=${v1}&v2=${v2}&completo=1`,
         { headers: { Authorization: `Bearer ${token}` } }
       );
       